@@ -0,0 +1,229 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+import pandas as pd
+from config.settings import PERF_BENCHMARK_CONFIG
+from src.data_collection.synthetic_corpus import SyntheticCorpusGenerator
+from src.semantic_analysis.semantic_scoring import SemanticScorer
+from src.semantic_analysis.vector_clustering import VectorClusterer
+from src.modeling.market_impact_predictor import MarketImpactPredictor
+from src.brand_safety.toxicity_analyzer import ToxicityAnalyzer
+from src.utils.export import ExportManager
+from src.visualization.pulse_dashboard import PulseDashboard
+from src.visualization.semantic_workspace import SemanticWorkspace
+
+def per_row_text_features(predictor, df):
+    """Reference: the predictor's text features computed with one `.apply` per feature, as before vectorization"""
+    
+    patterns = predictor.text_patterns
+    df['financial_words'] = df['body'].apply(lambda x: len(re.findall(patterns['financial_words'], str(x).lower())))
+    df['urgency_words'] = df['body'].apply(lambda x: len(re.findall(patterns['urgency_words'], str(x).lower())))
+    df['caps_ratio'] = df['body'].apply(lambda x: sum(1 for c in str(x) if c.isupper()) / (len(str(x)) + 1))
+    df['exclamation_count'] = df['body'].apply(lambda x: str(x).count('!'))
+    return df
+
+class BenchmarkSuite:
+    """Time every pipeline stage on synthetic corpora of increasing size"""
+    
+    def __init__(self, seed=42):
+        self.generator = SyntheticCorpusGenerator(seed=seed)
+        self.scorer = SemanticScorer()
+        self.clusterer = VectorClusterer()
+        self.predictor = MarketImpactPredictor()
+        self.toxicity = ToxicityAnalyzer()
+        self.export_manager = ExportManager()
+        self.pulse = PulseDashboard()
+        self.workspace = SemanticWorkspace()
+        self.state_dir = tempfile.TemporaryDirectory()
+        cluster_state = os.path.join(self.state_dir.name, 'cluster_state.npz')
+        
+        # stage name -> (input name, function returning its output)
+        self.stages = {
+            'semantic_scoring.process_batch': ('comments', lambda df: self.scorer.process_batch(df['body'].tolist())),
+            'toxicity.process_dataframe': ('comments', lambda df: self.toxicity.process_dataframe(df.copy())),
+            'clustering.find_lookalikes': ('scored', lambda df: self.clusterer.find_lookalikes(df.copy())),
+            'clustering.perform_clustering': ('scored', lambda df: self.clusterer.perform_clustering(df.copy())),
+            'clustering.perform_clustering_incremental': ('scored', lambda df: self.clusterer.perform_clustering(df.copy(), incremental=True, state_path=cluster_state)),
+            'predictor.engineer_features': ('lookalikes', lambda df: self.predictor.engineer_features(df.copy())),
+            'predictor.engineer_features_per_row': ('lookalikes', lambda df: per_row_text_features(self.predictor, df.copy())),
+            'predictor.train': ('lookalikes', lambda df: self.predictor.train(df.copy())),
+            'predictor.predict': ('lookalikes', lambda df: self.predictor.predict(df.copy())),
+            'export.prepare_betting_odds_export': ('predicted', self.export_manager.prepare_betting_odds_export),
+            'dashboard.multimodal_preview': ('predicted', self.workspace.create_multimodal_preview),
+            'dashboard.predictive_odds_ticker': ('predicted', self.pulse.create_predictive_odds_ticker),
+            'dashboard.ici_meter': ('predicted', self.pulse.create_ici_meter),
+            'dashboard.slang_acceleration': ('predicted', lambda df: self.workspace.create_slang_acceleration_charts(df, self.slang_acceleration))
+        }
+    
+    def prepare_inputs(self, n_rows):
+        """Build each stage's input once, outside the timed region"""
+        
+        comments = pd.concat(self.generator.iter_reddit_comments(n_rows), ignore_index=True)
+        comments['lookalike_score'] = 0.0
+        
+        with contextlib.redirect_stdout(io.StringIO()):
+            scored = comments.join(self.scorer.process_batch(comments['body'].tolist()))
+            lookalikes = self.clusterer.find_lookalikes(scored.copy())
+            self.predictor.train(lookalikes.copy())
+            predicted = self.predictor.calculate_impact_probability(self.predictor.predict(lookalikes.copy()))
+        
+        trends = self.generator.trends_data()
+        self.slang_acceleration = (
+            trends.groupby('term', as_index=False)['acceleration'].mean()
+            .rename(columns={'acceleration': 'avg_acceleration'})
+            .sort_values('avg_acceleration', ascending=False)
+        )
+        
+        return {'comments': comments, 'scored': scored, 'lookalikes': lookalikes, 'predicted': predicted}
+    
+    def measure(self, func, data, repeat=1, memory=True):
+        """Best-of-`repeat` wall time, then one traced run for peak Python heap usage"""
+        
+        timings = []
+        for _ in range(repeat):
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                func(data)
+                timings.append(time.perf_counter() - start)
+        
+        peak_mb = None
+        if memory:
+            tracemalloc.start()
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    func(data)
+                peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            finally:
+                tracemalloc.stop()
+        
+        return min(timings), peak_mb
+    
+    def run(self, sizes=None, stages=None, repeat=None, memory=True):
+        sizes = sizes or PERF_BENCHMARK_CONFIG['sizes']
+        repeat = repeat or PERF_BENCHMARK_CONFIG['repeat']
+        selected = [name for name in self.stages if not stages or any(s in name for s in stages)]
+        
+        results = []
+        for n_rows in sizes:
+            print(f"\nPreparing {n_rows} rows...")
+            inputs = self.prepare_inputs(n_rows)
+            
+            for name in selected:
+                input_name, func = self.stages[name]
+                seconds, peak_mb = self.measure(func, inputs[input_name], repeat, memory)
+                results.append({
+                    'stage': name,
+                    'rows': n_rows,
+                    'seconds': round(seconds, 6),
+                    'rows_per_sec': round(n_rows / seconds, 1) if seconds > 0 else None,
+                    'peak_mb': round(peak_mb, 2) if peak_mb is not None else None
+                })
+                peak = f"{peak_mb:10.1f} MB" if peak_mb is not None else ''
+                print(f"  {name:40s} {n_rows:>9d} rows {seconds:9.3f}s {n_rows / seconds:14,.0f} rows/s {peak}")
+        
+        return {
+            'commit': git_commit(),
+            'timestamp': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'results': results
+        }
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def save_results(report, path=None):
+    path = path or os.path.join(PERF_BENCHMARK_CONFIG['results_dir'], f"{report['commit']}.json")
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    
+    print(f"\nBenchmark results saved to {path}")
+    return path
+
+def compare_results(baseline, current, threshold=None):
+    """Throughput change per (stage, rows) present in both reports; flags drops beyond `threshold`"""
+    
+    threshold = PERF_BENCHMARK_CONFIG['regression_threshold'] if threshold is None else threshold
+    before = {(r['stage'], r['rows']): r for r in baseline['results']}
+    
+    rows = []
+    for result in current['results']:
+        previous = before.get((result['stage'], result['rows']))
+        if previous is None or not previous['rows_per_sec'] or not result['rows_per_sec']:
+            continue
+        change = result['rows_per_sec'] / previous['rows_per_sec'] - 1
+        rows.append({
+            'stage': result['stage'],
+            'rows': result['rows'],
+            'baseline_rows_per_sec': previous['rows_per_sec'],
+            'rows_per_sec': result['rows_per_sec'],
+            'change': change,
+            'regression': change < -threshold
+        })
+    
+    return pd.DataFrame(rows, columns=['stage', 'rows', 'baseline_rows_per_sec', 'rows_per_sec', 'change', 'regression'])
+
+def reference_speedups(report, suffix='_per_row'):
+    """Speedup of each stage over its per-row reference stage (`<stage>_per_row`) at every size both ran"""
+    
+    timings = {(r['stage'], r['rows']): r['seconds'] for r in report['results']}
+    rows = []
+    for (stage, n_rows), seconds in timings.items():
+        reference = timings.get((stage + suffix, n_rows))
+        if reference is not None and seconds > 0:
+            rows.append({'stage': stage, 'rows': n_rows, 'reference_seconds': reference, 'seconds': seconds, 'speedup': reference / seconds})
+    
+    return pd.DataFrame(rows, columns=['stage', 'rows', 'reference_seconds', 'seconds', 'speedup'])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Per-stage throughput and memory benchmarks')
+    parser.add_argument('--sizes', type=int, nargs='+', help='row counts (default: 10k, 100k, 1M)')
+    parser.add_argument('--stages', nargs='+', help='only run stages whose name contains one of these')
+    parser.add_argument('--repeat', type=int, help='timed runs per stage; the best is reported')
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc peak-memory run')
+    parser.add_argument('--output', help='results JSON path (default: results dir / <commit>.json)')
+    parser.add_argument('--compare', help='baseline results JSON to compare against')
+    parser.add_argument('--threshold', type=float, help='allowed fractional throughput drop')
+    args = parser.parse_args(argv)
+    
+    report = BenchmarkSuite().run(args.sizes, args.stages, args.repeat, memory=not args.no_memory)
+    save_results(report, args.output)
+    
+    speedups = reference_speedups(report)
+    if len(speedups):
+        print("\nSpeedup over per-row reference implementations:")
+        print(speedups.to_string(index=False))
+    
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        comparison = compare_results(baseline, report, args.threshold)
+        print(f"\nComparison against {baseline['commit']}:")
+        print(comparison.to_string(index=False))
+        if comparison['regression'].any():
+            print("\nThroughput regression detected")
+            return 1
+    
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
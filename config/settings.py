@@ -11,20 +11,75 @@ BIGQUERY_CONFIG = {
     "dataset_id": DATASET_ID,
     "location": "US",
     "reddit_table": "fh-bigquery.reddit_comments",
-    "batch_size": 50000
+    "full_scan_year": 2024,
+    "batch_size": 50000,
+    "filter_terms": ["hodl", "diamond hands", "to the moon", "buy the dip", "ape", "stonk", "skibidi", "rizz", "sigma", "based"]
+}
+
+# Comment-level intent markers (1 if any marker occurs in the lowercased text)
+INTENT_MARKERS = {
+    "financial_intent": ["buy", "invest", "hold", "long", "bullish", "calls"],
+    "ironic_marker": ["lol", "lmao", "haha", "jk", "joking", "ironic"]
+}
+
+# Incremental Extraction (high-water mark on created_utc)
+INCREMENTAL_CONFIG = {
+    "state_path": "data/pipeline_state.json",
+    "watermark_key": "reddit_comments.created_utc",
+    "initial_watermark": 1704067200,
+    "comment_key": "comment_id",
+    "staging_suffix": "_staging"
 }
 
 # Vertex AI Configuration
 VERTEX_AI_CONFIG = {
     "model_name": "gemini-1.5-pro",
     "location": LOCATION,
-    "batch_size": 100
+    "batch_size": 100,
+    "max_concurrent_batches": 8,
+    "requests_per_minute": 300,
+    "prompt_version": "scores-v1",
+    "cache_path": "data/gemini_cache.sqlite",
+    "cache_ttl_seconds": 30 * 24 * 3600,
+    "cache_max_entries": 500000
+}
+
+# Google Trends Collection
+TRENDS_CONFIG = {
+    "anchor_term": "stock market",
+    "terms_per_payload": 5,
+    "geo": "US",
+    "hl": "en-US",
+    "tz": 360,
+    "max_workers": 4,
+    "requests_per_minute": 30,
+    "max_retries": 3,
+    "backoff_seconds": 2.0,
+    "cache_dir": "data/trends_cache",
+    "cache_ttl_seconds": 6 * 3600,
+    "state_path": "data/trends_state.parquet",
+    "velocity_window": 7
 }
 
 # API Endpoints
 TIKTOK_API_BASE = "https://open.tiktokapis.com/v2"
 KNOWYOURMEME_URL = "https://knowyourmeme.com"
 
+# TikTok Research API Collection
+TIKTOK_CONFIG = {
+    "max_connections": 64,
+    "max_concurrent_requests": 32,
+    "max_concurrent_per_hashtag": 2,
+    "date_windows": 4,
+    "lookback_days": 28,
+    "page_size": 100,
+    "max_pages": 10,
+    "max_retries": 4,
+    "backoff_seconds": 0.5,
+    "timeout_seconds": 30,
+    "video_fields": "id,create_time,like_count,comment_count,share_count,view_count,hashtag_names"
+}
+
 # Analysis Parameters
 SEMANTIC_THRESHOLDS = {
     "high_ici": 0.8,
@@ -34,6 +89,54 @@ SEMANTIC_THRESHOLDS = {
     "lookalike_threshold": 0.7
 }
 
+# Visual Metaphors (keyword -> trend category and Google Shopping relevance)
+VISUAL_METAPHORS = {
+    "rocket": {"trend_category": "price_surge", "google_shopping_relevance": 0.6},
+    "moon": {"trend_category": "extreme_growth", "google_shopping_relevance": 0.4},
+    "diamond": {"trend_category": "holding_strength", "google_shopping_relevance": 0.7},
+    "ape": {"trend_category": "community_action", "google_shopping_relevance": 0.3},
+    "hands": {"trend_category": "holding_commitment", "google_shopping_relevance": 0.5},
+    "brain": {"trend_category": "intelligence_signal", "google_shopping_relevance": 0.4},
+    "stonk": {"trend_category": "stock_reference", "google_shopping_relevance": 0.8},
+    "chart": {"trend_category": "technical_analysis", "google_shopping_relevance": 0.9}
+}
+
+# Near-Duplicate Collapsing (MinHash/LSH over character shingles)
+DEDUP_CONFIG = {
+    "enabled": True,
+    "shingle_size": 5,
+    "num_perm": 64,
+    "bands": 16,
+    "similarity_threshold": 0.8,
+    "seed": 42
+}
+
+# Tiered Scoring (heuristic first, Gemini for ambiguous texts)
+TIERED_SCORING_CONFIG = {
+    "mst_margin": 0.1,
+    "ici_band": (0.3, 0.8),
+    "escalate_without_keywords": True,
+    "max_escalation_rate": 0.1
+}
+
+# Incremental Clustering
+CLUSTERING_CONFIG = {
+    "n_clusters": 6,
+    "batch_size": 1024,
+    "random_state": 42,
+    "state_path": "data/cluster_state.npz"
+}
+
+# Historical Benchmark Library
+BENCHMARK_CONFIG = {
+    "library_path": "data/historical_benchmarks.csv",
+    "index_path": "data/benchmark_index.npz",
+    "top_k": 3,
+    "ann_min_size": 50000,
+    "ann_lists": 256,
+    "ann_probes": 8
+}
+
 # Meme Terms to Track
 MEME_TERMS = [
     "hodl", "diamond hands", "to the moon", "stonks", 
@@ -55,6 +158,54 @@ FEATURE_COLUMNS = [
     "text_length"
 ]
 
+# Predictor Artifacts
+MODEL_CONFIG = {
+    "artifact_dir": "models/market_impact",
+    "keep_versions": 5,
+    "test_fraction": 0.2,
+    "split_key": "comment_id",
+    "sgd_epochs": 1,
+    "sgd_alpha": 1e-6,
+    "sgd_eta0": 0.01
+}
+
+# Impact Probability Horizons
+# impact_prob_<hours>h = readiness * 100 * (ici_base + ici_weight * ICI) * (lookalike_base + lookalike_weight * similarity)
+IMPACT_HORIZONS = [
+    {"hours": 24, "ici_base": 0.6, "ici_weight": 0.4, "lookalike_base": 0.7, "lookalike_weight": 0.3},
+    {"hours": 48, "ici_base": 0.7, "ici_weight": 0.3, "lookalike_base": 0.8, "lookalike_weight": 0.2},
+    {"hours": 72, "ici_base": 0.8, "ici_weight": 0.2, "lookalike_base": 0.9, "lookalike_weight": 0.1}
+]
+
+# Pipeline Configuration
+PIPELINE_CONFIG = {
+    "chunk_size": 10000,
+    "spill_dir": None,
+    "metrics_dir": "metrics",
+    "semantic_scoring": "heuristic",
+    "predictor_mode": "train",
+    "save_model": True,
+    "incremental_training": False
+}
+
+# Synthetic Load-Test Corpus
+SYNTHETIC_CONFIG = {
+    "seed": 42,
+    "reddit_rows": 1000000,
+    "chunk_size": 250000,
+    "days": 90,
+    "end_date": "2024-06-30",
+    "output_dir": "data/synthetic"
+}
+
+# Performance Benchmarks
+PERF_BENCHMARK_CONFIG = {
+    "sizes": [10000, 100000, 1000000],
+    "repeat": 1,
+    "results_dir": "benchmarks/results",
+    "regression_threshold": 0.10
+}
+
 # Export Configuration
 EXPORT_CONFIG = {
     "sheets_format": "csv",
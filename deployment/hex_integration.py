@@ -1,66 +1,318 @@
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from config.settings import PIPELINE_CONFIG, DEDUP_CONFIG
 from src.data_collection.bigquery_reddit import RedditDataCollector
 from src.data_collection.google_trends import GoogleTrendsCollector
 from src.data_collection.tiktok_api import TikTokDataCollector
 from src.semantic_analysis.semantic_scoring import SemanticScorer
+from src.semantic_analysis.tiered_scoring import TieredScorer
+from src.semantic_analysis.deduplication import NearDuplicateCollapser
 from src.semantic_analysis.vector_clustering import VectorClusterer
+from src.semantic_analysis.text_features import TextFeatureExtractor
 from src.modeling.market_impact_predictor import MarketImpactPredictor
 from src.brand_safety.toxicity_analyzer import ToxicityAnalyzer
 from src.utils.storage import StorageManager
 from src.utils.export import ExportManager
+from src.utils.instrumentation import PipelineInstrumentation
 
 class HexIntegration:
-    def __init__(self):
-        self.reddit_collector = RedditDataCollector()
-        self.trends_collector = GoogleTrendsCollector()
-        self.tiktok_collector = TikTokDataCollector()
-        self.semantic_scorer = SemanticScorer()
+    def __init__(self, reddit_collector=None, trends_collector=None, tiktok_collector=None, storage_manager=None, semantic_scorer=None):
+        self.reddit_collector = reddit_collector or RedditDataCollector()
+        self.trends_collector = trends_collector or GoogleTrendsCollector()
+        self.tiktok_collector = tiktok_collector or TikTokDataCollector()
+        if semantic_scorer is None:
+            semantic_scorer = TieredScorer() if PIPELINE_CONFIG['semantic_scoring'] == 'tiered' else SemanticScorer()
+        self.semantic_scorer = semantic_scorer
+        self.deduplicator = NearDuplicateCollapser() if DEDUP_CONFIG['enabled'] else None
         self.clusterer = VectorClusterer()
         self.predictor = MarketImpactPredictor()
         self.toxicity_analyzer = ToxicityAnalyzer()
-        self.storage_manager = StorageManager()
+        self.storage_manager = storage_manager or StorageManager()
         self.export_manager = ExportManager()
+        self.feature_extractor = TextFeatureExtractor.for_components(
+            self.semantic_scorer, self.clusterer, self.predictor, self.toxicity_analyzer
+        )
+        self.instrumentation = PipelineInstrumentation()
         
-    def run_full_pipeline(self):
+    def run_full_pipeline(self, streaming=False, chunk_size=None):
         """Execute complete meme-to-market analysis pipeline"""
         
+        self.instrumentation = PipelineInstrumentation().activate()
+        try:
+            if streaming:
+                return self.run_streaming_pipeline(chunk_size)
+            return self._run_in_memory()
+        finally:
+            self.instrumentation.deactivate()
+            self.write_run_metrics()
+    
+    def write_run_metrics(self, metrics_dir=None):
+        """Write the run's JSON report and Prometheus textfile next to previous runs"""
+        
+        metrics_dir = metrics_dir or PIPELINE_CONFIG['metrics_dir']
+        json_path = self.instrumentation.write_json(os.path.join(metrics_dir, f'run_{self.instrumentation.run_id}.json'))
+        self.instrumentation.write_prometheus(os.path.join(metrics_dir, 'pipeline_metrics.prom'))
+        
+        print(f"Run metrics written to {json_path}")
+        return json_path
+    
+    def _run_in_memory(self):
+        stage = self.instrumentation.stage
+        
         print("Starting Meme-to-Market Impact Forecaster Pipeline...")
         
         # Step 1: Data Collection
         print("\n[1/6] Collecting data from all sources...")
-        reddit_df = self.reddit_collector.extract_reddit_comments()
-        trends_df = self.trends_collector.collect_trends_data()
-        tiktok_df = self.tiktok_collector.fetch_trending_hashtags()
+        with stage('collect.reddit') as record:
+            reddit_df = self.reddit_collector.extract_reddit_comments()
+            record.rows_out = len(reddit_df)
+        with stage('collect.trends') as record:
+            trends_df = self.trends_collector.collect_trends_data()
+            record.rows_out = len(trends_df)
+        with stage('collect.tiktok') as record:
+            tiktok_df = self.tiktok_collector.fetch_trending_hashtags()
+            record.rows_out = len(tiktok_df)
         
         # Step 2: Semantic Analysis
         print("\n[2/6] Running semantic analysis...")
-        semantic_results = self.semantic_scorer.process_batch(reddit_df['body'].tolist()[:1000])
-        reddit_df = reddit_df.head(len(semantic_results))
-        reddit_df = reddit_df.join(semantic_results)
+        with stage('semantic_analysis', rows_in=len(reddit_df)) as record:
+            reddit_df, text_features = self.score_semantics(reddit_df)
+            record.rows_out = len(reddit_df)
         
         # Step 3: Vector Clustering
         print("\n[3/6] Performing vector clustering...")
-        reddit_df = self.clusterer.find_lookalikes(reddit_df)
+        with stage('vector_clustering', rows_in=len(reddit_df)) as record:
+            feature_matrix = self.clusterer.build_feature_matrix(reddit_df, features=text_features)
+            reddit_df = self.clusterer.find_lookalikes(reddit_df, feature_matrix=feature_matrix)
+            record.rows_out = len(reddit_df)
         
         # Step 4: Market Impact Prediction
         print("\n[4/6] Training market impact predictor...")
-        metrics = self.predictor.train(reddit_df)
-        reddit_df = self.predictor.predict(reddit_df)
-        reddit_df = self.predictor.calculate_impact_probability(reddit_df)
+        with stage('market_impact', rows_in=len(reddit_df)) as record:
+            metrics = self.prepare_predictor(lambda: self.predictor.train(reddit_df, features=text_features))
+            reddit_df = self.predictor.predict(reddit_df, features=text_features)
+            reddit_df = self.predictor.calculate_impact_probability(reddit_df)
+            record.rows_out = len(reddit_df)
         
         # Step 5: Brand Safety Analysis
         print("\n[5/6] Analyzing brand safety...")
-        reddit_df = self.toxicity_analyzer.process_dataframe(reddit_df)
-        alerts = self.toxicity_analyzer.generate_alerts(reddit_df)
+        with stage('brand_safety', rows_in=len(reddit_df)) as record:
+            reddit_df = self.toxicity_analyzer.process_dataframe(reddit_df, features=text_features)
+            alerts = self.toxicity_analyzer.generate_alerts(reddit_df)
+            record.rows_out = len(alerts)
         
         # Step 6: Export Results
         print("\n[6/6] Exporting results...")
-        self.storage_manager.export_to_gcs(reddit_df, 'final_predictions.json')
-        export_df = self.export_manager.prepare_betting_odds_export(reddit_df)
-        self.export_manager.export_to_csv(export_df, 'betting_odds_export.csv')
+        with stage('export', rows_in=len(reddit_df)) as record:
+            self.storage_manager.export_to_gcs(reddit_df, 'final_predictions.json')
+            export_df = self.export_manager.prepare_betting_odds_export(reddit_df)
+            self.export_manager.export_to_csv(export_df, 'betting_odds_export.csv')
+            record.rows_out = len(export_df)
         
         print("\nPipeline Complete!")
         
         return reddit_df, trends_df, tiktok_df, alerts, metrics
+    
+    def run_streaming_pipeline(self, chunk_size=None):
+        """Execute the pipeline over fixed-size chunks with bounded memory
+        
+        Scored chunks are spilled to disk while the compact training columns are kept, the
+        predictor is trained once on all rows, then chunks stream through prediction, brand
+        safety and export. Returns the number of processed rows in place of the full frame.
+        """
+        
+        chunk_size = chunk_size or PIPELINE_CONFIG['chunk_size']
+        stage = self.instrumentation.stage
+        
+        print(f"Starting Meme-to-Market Impact Forecaster Pipeline (streaming, chunk size {chunk_size})...")
+        
+        # Step 1: Data Collection
+        print("\n[1/6] Collecting data from all sources...")
+        reddit_chunks = self._timed_chunks(
+            self.reddit_collector.iter_reddit_comments(batch_size=chunk_size), 'collect.reddit'
+        )
+        with stage('collect.trends') as record:
+            trends_df = self.trends_collector.collect_trends_data()
+            record.rows_out = len(trends_df)
+        with stage('collect.tiktok') as record:
+            tiktok_df = self.tiktok_collector.fetch_trending_hashtags()
+            record.rows_out = len(tiktok_df)
+        
+        with tempfile.TemporaryDirectory(dir=PIPELINE_CONFIG['spill_dir']) as spill_dir:
+            # Steps 2-3: Semantic Analysis and Vector Clustering
+            print("\n[2/6] Running semantic analysis...")
+            print("\n[3/6] Performing vector clustering...")
+            scored = self._stream_lookalikes(self._stream_semantic_scores(reddit_chunks))
+            incremental = PIPELINE_CONFIG['incremental_training']
+            spilled, training_frame, score_max = self._spill_scored_chunks(scored, spill_dir, keep_training_frame=not incremental)
+            
+            # Step 4: Market Impact Prediction
+            print("\n[4/6] Training market impact predictor...")
+            with stage('market_impact.train') as record:
+                if incremental:
+                    metrics = self.prepare_predictor(lambda: self.predictor.train_stream(
+                        lambda: self._load_spilled_chunks(spilled), score_max
+                    ))
+                else:
+                    metrics = self.prepare_predictor(lambda: self.predictor.fit(
+                        training_frame[self.predictor.feature_columns].fillna(0),
+                        self.predictor.calculate_market_readiness(training_frame, score_max)
+                    ))
+                    record.rows_in = record.rows_out = len(training_frame)
+            del training_frame
+            
+            # Step 5: Brand Safety Analysis
+            print("\n[5/6] Analyzing brand safety...")
+            predicted = self._stream_predictions(self._load_spilled_chunks(spilled), score_max)
+            analyzed = self._stream_toxicity(predicted)
+            
+            # Step 6: Export Results
+            print("\n[6/6] Exporting results...")
+            rows_processed, alerts = self._export_stream(analyzed)
+        
+        print(f"\nPipeline Complete! Processed {rows_processed} comments")
+        
+        return rows_processed, trends_df, tiktok_df, alerts, metrics
+    
+    def _timed_chunks(self, chunks, name):
+        """Attribute the time spent producing each chunk (e.g. downloading it) to stage `name`"""
+        
+        chunks = iter(chunks)
+        while True:
+            with self.instrumentation.stage(name) as record:
+                chunk = next(chunks, None)
+                record.rows_out = 0 if chunk is None else len(chunk)
+            if chunk is None:
+                return
+            yield chunk
+    
+    def prepare_predictor(self, train):
+        """Train (and save an artifact) or, with `predictor_mode='load'`, reuse the latest saved artifact"""
+        
+        if PIPELINE_CONFIG['predictor_mode'] == 'load':
+            return self.predictor.load()
+        
+        metrics = train()
+        if PIPELINE_CONFIG['save_model']:
+            self.predictor.save()
+        return metrics
+    
+    def score_semantics(self, df):
+        """Semantic scores computed once per (near-)duplicate group of this batch, fanned out with the group id and size"""
+        
+        # grouping ignores case, punctuation and emoji, so character statistics come from each row's own text
+        features = self.feature_extractor.extract(df['body'], index=df.index)
+        
+        if self.deduplicator is None:
+            representatives = inverse = np.arange(len(df))
+            counts = np.ones(len(df), dtype=np.int64)
+        else:
+            representatives, inverse, counts = self.deduplicator.groups(df['body'].tolist())
+            print(f"Scoring {len(representatives)} unique texts for {len(df)} comments")
+        
+        semantic_results = self.semantic_scorer.process_batch(
+            df['body'].iloc[representatives].tolist(), features=features.iloc[representatives]
+        )
+        semantic_results = NearDuplicateCollapser.expand(semantic_results, inverse, df.index)
+        semantic_results['duplicate_group'] = inverse
+        semantic_results['duplicate_count'] = counts[inverse]
+        
+        return df.join(semantic_results), features
+    
+    def _stream_semantic_scores(self, chunks):
+        for chunk in chunks:
+            with self.instrumentation.stage('semantic_analysis', rows_in=len(chunk)) as record:
+                chunk, features = self.score_semantics(chunk)
+                record.rows_out = len(chunk)
+            yield chunk, features
+    
+    def _stream_lookalikes(self, chunks):
+        for chunk, features in chunks:
+            with self.instrumentation.stage('vector_clustering', rows_in=len(chunk)) as record:
+                feature_matrix = self.clusterer.build_feature_matrix(chunk, features=features)
+                chunk = self.clusterer.find_lookalikes(chunk, feature_matrix=feature_matrix)
+                record.rows_out = len(chunk)
+            yield chunk, features
+    
+    def _spill_scored_chunks(self, chunks, spill_dir, keep_training_frame=True):
+        """Write scored chunks to disk, keeping only the columns training needs in memory (or nothing, for streaming training)"""
+        
+        readiness_inputs = ['seriousness_threshold', 'irony_collapse_index', 'lookalike_similarity', 'score']
+        training_columns = list(dict.fromkeys(self.predictor.feature_columns + readiness_inputs))
+        
+        spilled = []
+        training_parts = []
+        score_max = None
+        
+        for i, (chunk, features) in enumerate(chunks):
+            with self.instrumentation.stage('market_impact.features', rows_in=len(chunk)) as record:
+                chunk = self.predictor.engineer_features(chunk, features=features)
+                record.rows_out = len(chunk)
+            
+            chunk_max = chunk['score'].max()
+            if score_max is None or chunk_max > score_max:
+                score_max = chunk_max
+            if keep_training_frame:
+                training_parts.append(chunk[[c for c in training_columns if c in chunk.columns]])
+            
+            with self.instrumentation.stage('spill', rows_in=len(chunk)) as record:
+                chunk_path = os.path.join(spill_dir, f'chunk_{i:05d}.pkl')
+                features_path = os.path.join(spill_dir, f'features_{i:05d}.pkl')
+                chunk.to_pickle(chunk_path)
+                features.to_pickle(features_path)
+                spilled.append((chunk_path, features_path))
+                record.rows_out = len(chunk)
+            
+            print(f"  Scored chunk {i + 1}: {len(chunk)} comments")
+        
+        return spilled, pd.concat(training_parts) if training_parts else None, score_max
+    
+    def _load_spilled_chunks(self, spilled):
+        for chunk_path, features_path in spilled:
+            with self.instrumentation.stage('spill.load') as record:
+                chunk, features = pd.read_pickle(chunk_path), pd.read_pickle(features_path)
+                record.rows_out = len(chunk)
+            yield chunk, features
+    
+    def _stream_predictions(self, chunks, score_max):
+        for chunk, features in chunks:
+            with self.instrumentation.stage('market_impact.predict', rows_in=len(chunk)) as record:
+                chunk = self.predictor.predict(chunk, features=features, score_max=score_max)
+                chunk = self.predictor.calculate_impact_probability(chunk)
+                record.rows_out = len(chunk)
+            yield chunk, features
+    
+    def _stream_toxicity(self, chunks):
+        for chunk, features in chunks:
+            with self.instrumentation.stage('brand_safety', rows_in=len(chunk)) as record:
+                chunk = self.toxicity_analyzer.process_dataframe(chunk, features=features)
+                record.rows_out = len(chunk)
+            yield chunk
+    
+    def _export_stream(self, chunks):
+        """Export chunk by chunk: one GCS part file per chunk and one appended betting-odds CSV"""
+        
+        rows_processed = 0
+        alerts = []
+        
+        for i, chunk in enumerate(chunks):
+            with self.instrumentation.stage('export', rows_in=len(chunk)) as record:
+                alerts.append(self.toxicity_analyzer.generate_alerts(chunk))
+                self.storage_manager.export_to_gcs(chunk, f'final_predictions_part{i:05d}.json')
+                export_df = self.export_manager.prepare_betting_odds_export(chunk)
+                self.export_manager.export_to_csv(export_df, 'betting_odds_export.csv', append=i > 0)
+                record.rows_out = len(export_df)
+            rows_processed += len(chunk)
+        
+        non_empty = [a for a in alerts if len(a) > 0]
+        if non_empty:
+            alerts = pd.concat(non_empty)
+        else:
+            alerts = alerts[0] if alerts else pd.DataFrame()
+        
+        return rows_processed, alerts
 
 if __name__ == "__main__":
     integration = HexIntegration()
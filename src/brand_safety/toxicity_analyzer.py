@@ -1,6 +1,9 @@
 import pandas as pd
+import numpy as np
 import re
 from config.settings import SEMANTIC_THRESHOLDS
+from src.semantic_analysis.keyword_engine import PatternCounter
+from src.semantic_analysis.text_features import pattern_column
 
 class ToxicityAnalyzer:
     def __init__(self):
@@ -11,6 +14,8 @@ class ToxicityAnalyzer:
             'manipulation': r'\b(pump|dump|coordinate|manipulate)\b'
         }
         self.weaponized_threshold = SEMANTIC_THRESHOLDS['toxicity_threshold']
+        self.text_patterns = self.toxic_patterns
+        self.pattern_counter = PatternCounter(self.toxic_patterns)
         
     def analyze_toxicity(self, text):
         """Analyze text for toxic content markers"""
@@ -24,14 +29,34 @@ class ToxicityAnalyzer:
         
         return total_toxicity, toxicity_scores
     
-    def process_dataframe(self, df):
+    def analyze_batch(self, texts, features=None):
+        """Analyze a batch of texts with one combined scan, one int column per category"""
+        
+        if features is not None:
+            counts = features[[pattern_column(category) for category in self.toxic_patterns]].to_numpy(dtype=np.int64)
+        else:
+            counts = self.pattern_counter.count(texts)
+        
+        results = pd.DataFrame(counts, columns=[f'toxicity_{category}' for category in self.toxic_patterns])
+        results['toxicity_score'] = counts.sum(axis=1)
+        results['is_weaponized'] = results['toxicity_score'] >= self.weaponized_threshold
+        
+        return results
+    
+    def process_dataframe(self, df, include_breakdown=False, features=None):
         """Process entire dataframe for toxicity"""
         
-        toxicity_results = df['body'].apply(self.analyze_toxicity)
-        df['toxicity_score'] = [r[0] for r in toxicity_results]
-        df['toxicity_breakdown'] = [r[1] for r in toxicity_results]
+        results = self.analyze_batch(df['body'].tolist(), features)
+        results.index = df.index
+        
+        for column in results.columns:
+            df[column] = results[column]
         
-        df['is_weaponized'] = df['toxicity_score'] >= self.weaponized_threshold
+        if include_breakdown:
+            category_columns = [f'toxicity_{category}' for category in self.toxic_patterns]
+            df['toxicity_breakdown'] = [
+                dict(zip(self.toxic_patterns, row)) for row in results[category_columns].values.tolist()
+            ]
         
         return df
     
@@ -1,21 +1,55 @@
+import sys
 from google.cloud import bigquery
 import pandas as pd
-from datetime import datetime
-from config.settings import PROJECT_ID, DATASET_ID, BIGQUERY_CONFIG, MEME_TERMS
+from datetime import datetime, timezone
+from config.settings import PROJECT_ID, DATASET_ID, BIGQUERY_CONFIG, INCREMENTAL_CONFIG, MEME_TERMS
+from src.data_collection.query_runner import BigQueryRunner, prefetch
+from src.utils.state import WatermarkStore
+from src.semantic_analysis.sql_rules import SQLRuleCompiler
+from src.utils.instrumentation import track_call
 
 class RedditDataCollector:
-    def __init__(self):
-        self.client = bigquery.Client(project=PROJECT_ID)
+    def __init__(self, client=None, query_runner=None, watermark_store=None):
+        if client is None and query_runner is None:
+            client = bigquery.Client(project=PROJECT_ID)
+        self.client = client
+        self.query_runner = query_runner or BigQueryRunner(client)
+        self.watermark_store = watermark_store or WatermarkStore(INCREMENTAL_CONFIG['state_path'])
         self.dataset_id = DATASET_ID
+        self.sql_rules = SQLRuleCompiler('bigquery')
         
-    def extract_reddit_comments(self, limit=50000):
-        """Extract meme-related Reddit comments with temporal patterns"""
+    def build_comment_query(self, limit=50000, since=None):
+        """SQL selecting meme-related Reddit comments with temporal patterns
+        
+        Both modes read the monthly `reddit_table` shards. A full query scans the tables of
+        `full_scan_year`; with `since` (epoch seconds) only tables from that month on are scanned,
+        rows start at `since` and the oldest rows are kept first so the watermark advances without gaps.
+        """
         
         meme_pattern = "|".join([f"'{term}'" for term in MEME_TERMS])
+        source = f"`{BIGQUERY_CONFIG['reddit_table']}.*`"
+        
+        if since is None:
+            year = BIGQUERY_CONFIG['full_scan_year']
+            window = f"""
+            _TABLE_SUFFIX BETWEEN '{year}_01' AND '{year}_12'
+            AND"""
+            order = "DESC"
+        else:
+            since = int(since)
+            suffix = datetime.fromtimestamp(since, tz=timezone.utc).strftime('%Y_%m')
+            window = f"""
+            _TABLE_SUFFIX >= '{suffix}'
+            AND created_utc >= {since}
+            AND"""
+            order = "ASC"
+        
+        markers = ",\n          ".join(self.sql_rules.marker_columns())
         
         query = f"""
         WITH meme_keywords AS (
           SELECT 
+            id,
             created_utc,
             body,
             score,
@@ -23,66 +57,163 @@ class RedditDataCollector:
             author,
             EXTRACT(DATE FROM TIMESTAMP_SECONDS(created_utc)) as date,
             EXTRACT(HOUR FROM TIMESTAMP_SECONDS(created_utc)) as hour
-          FROM `fh-bigquery.reddit_comments.2024_*`
-          WHERE 
-            (LOWER(body) LIKE '%hodl%' 
-            OR LOWER(body) LIKE '%diamond hands%'
-            OR LOWER(body) LIKE '%to the moon%'
-            OR LOWER(body) LIKE '%buy the dip%'
-            OR LOWER(body) LIKE '%ape%'
-            OR LOWER(body) LIKE '%stonk%'
-            OR LOWER(body) LIKE '%skibidi%'
-            OR LOWER(body) LIKE '%rizz%'
-            OR LOWER(body) LIKE '%sigma%'
-            OR LOWER(body) LIKE '%based%')
+          FROM {source}
+          WHERE {window}
+            {self.sql_rules.like_any(BIGQUERY_CONFIG['filter_terms'])}
             AND LENGTH(body) > 20
             AND LENGTH(body) < 500
+          {"" if since is None else "ORDER BY created_utc ASC"}
           LIMIT {limit}
         )
         SELECT 
+          id as comment_id,
+          created_utc,
           date,
           hour,
           subreddit,
           body,
           score,
-          CASE 
-            WHEN REGEXP_CONTAINS(LOWER(body), r'(buy|invest|hold|long|bullish|calls)') THEN 1
-            ELSE 0
-          END as financial_intent,
-          CASE 
-            WHEN REGEXP_CONTAINS(LOWER(body), r'(lol|lmao|haha|jk|joking|ironic)') THEN 1
-            ELSE 0
-          END as ironic_marker,
+          {markers},
           LENGTH(body) as text_length
         FROM meme_keywords
-        ORDER BY created_utc DESC
+        ORDER BY created_utc {order}
         """
         
+        return query
+    
+    def extract_reddit_comments(self, limit=50000):
+        """Extract meme-related Reddit comments with temporal patterns"""
+        
+        query = self.build_comment_query(limit)
+        
         print(f"Executing BigQuery extraction for Reddit meme data...")
-        df = self.client.query(query).to_dataframe()
+        df = self.query_runner.run(query)
         print(f"Extracted {len(df)} Reddit comments")
         print(f"Date range: {df['date'].min()} to {df['date'].max()}")
         print(f"Unique subreddits: {df['subreddit'].nunique()}")
         
         return df
     
-    def save_to_bigquery(self, df, table_name):
+    def iter_reddit_comments(self, limit=50000, batch_size=None, as_arrow=False, prefetch_depth=2):
+        """Stream the extraction in chunks of `batch_size` rows as results arrive
+        
+        Yields Arrow record batches when `as_arrow` is set, otherwise DataFrame chunks indexed
+        continuously across the stream. Up to `prefetch_depth` chunks are downloaded ahead of
+        the consumer on a background thread.
+        """
+        
+        batch_size = batch_size or BIGQUERY_CONFIG['batch_size']
+        query = self.build_comment_query(limit)
+        
+        print(f"Streaming BigQuery extraction for Reddit meme data in batches of {batch_size}...")
+        batches = self.query_runner.iter_batches(query, batch_size)
+        if prefetch_depth:
+            batches = prefetch(batches, prefetch_depth)
+        
+        rows = 0
+        for batch in batches:
+            if as_arrow:
+                yield batch
+            else:
+                chunk = batch.to_pandas()
+                chunk.index = pd.RangeIndex(rows, rows + len(chunk))
+                yield chunk
+            rows += batch.num_rows
+        
+        print(f"Streamed {rows} Reddit comments")
+    
+    def extract_semantic_scores(self, scorer, limit=50000):
+        """Score comments in the warehouse and fetch only the scored columns, not the raw text"""
+        
+        source = f"({self.build_comment_query(limit)})"
+        columns = ['comment_id', 'created_utc', 'date', 'hour', 'subreddit', 'score', 'text_length']
+        query = self.sql_rules.scoring_query(source, scorer, columns=columns)
+        
+        print(f"Executing BigQuery extraction with server-side semantic scoring...")
+        df = self.query_runner.run(query)
+        print(f"Scored {len(df)} Reddit comments in BigQuery")
+        
+        return df
+    
+    def extract_new_reddit_comments(self, limit=50000):
+        """Extract only comments at or after the persisted created_utc watermark, deduplicated"""
+        
+        since = self.watermark_store.get(INCREMENTAL_CONFIG['watermark_key'], INCREMENTAL_CONFIG['initial_watermark'])
+        key = INCREMENTAL_CONFIG['comment_key']
+        
+        print(f"Executing incremental BigQuery extraction since {since}...")
+        df = self.query_runner.run(self.build_comment_query(limit, since=since))
+        
+        # the window starts at the watermark itself, so rows sharing its second are fetched again
+        df = df[df['created_utc'] >= since].drop_duplicates(subset=key).reset_index(drop=True)
+        print(f"Extracted {len(df)} new Reddit comments")
+        
+        return df
+    
+    def advance_watermark(self, df):
+        """Move the watermark to the newest created_utc in `df`; call only once `df` is persisted"""
+        
+        if len(df) == 0:
+            return self.watermark_store.get(INCREMENTAL_CONFIG['watermark_key'], INCREMENTAL_CONFIG['initial_watermark'])
+        
+        return self.watermark_store.set(INCREMENTAL_CONFIG['watermark_key'], int(df['created_utc'].max()))
+    
+    def build_merge_query(self, table_id, staging_id, key=None):
+        """MERGE statement inserting staged rows whose key is not yet in the target table"""
+        
+        key = key or INCREMENTAL_CONFIG['comment_key']
+        
+        return f"""
+        CREATE TABLE IF NOT EXISTS `{table_id}` LIKE `{staging_id}`;
+        MERGE `{table_id}` T
+        USING `{staging_id}` S
+        ON T.{key} = S.{key}
+        WHEN NOT MATCHED THEN INSERT ROW
+        """
+    
+    def merge_to_bigquery(self, df, table_name):
+        """Append new rows to a BigQuery table through a staging table, skipping keys already present"""
+        
+        table_id = f"{PROJECT_ID}.{DATASET_ID}.{table_name}"
+        staging_id = self.save_to_bigquery(df, f"{table_name}{INCREMENTAL_CONFIG['staging_suffix']}")
+        
+        with track_call('bigquery', 'merge'):
+            self.client.query(self.build_merge_query(table_id, staging_id)).result()
+        
+        print(f"Merged {len(df)} rows into {table_id}")
+        return table_id
+    
+    def run_incremental(self, table_name, limit=50000):
+        """Extract comments newer than the watermark, merge them, then advance the watermark"""
+        
+        df = self.extract_new_reddit_comments(limit)
+        if len(df) > 0:
+            self.merge_to_bigquery(df, table_name)
+        self.advance_watermark(df)
+        
+        return df
+    
+    def save_to_bigquery(self, df, table_name, write_disposition="WRITE_TRUNCATE"):
         """Save processed data to BigQuery"""
         table_id = f"{PROJECT_ID}.{DATASET_ID}.{table_name}"
         
         job_config = bigquery.LoadJobConfig(
-            write_disposition="WRITE_TRUNCATE",
+            write_disposition=write_disposition,
         )
         
-        job = self.client.load_table_from_dataframe(
-            df, table_id, job_config=job_config
-        )
-        job.result()
+        with track_call('bigquery', 'load'):
+            job = self.client.load_table_from_dataframe(
+                df, table_id, job_config=job_config
+            )
+            job.result()
         
         print(f"Data saved to {table_id}")
         return table_id
 
 if __name__ == "__main__":
     collector = RedditDataCollector()
-    reddit_df = collector.extract_reddit_comments()
-    collector.save_to_bigquery(reddit_df, "reddit_meme_raw")
+    if "--incremental" in sys.argv:
+        collector.run_incremental("reddit_meme_raw")
+    else:
+        reddit_df = collector.extract_reddit_comments()
+        collector.save_to_bigquery(reddit_df, "reddit_meme_raw")
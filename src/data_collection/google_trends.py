@@ -1,11 +1,109 @@
 from pytrends.request import TrendReq
+import os
+import threading
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from config.settings import MEME_TERMS
+from config.settings import MEME_TERMS, TRENDS_CONFIG
+from src.utils.cache import DiskCache
+from src.utils.throttling import RateLimiter, retry_with_backoff
+from src.utils.instrumentation import track_call
 
 class GoogleTrendsCollector:
-    def __init__(self):
-        self.pytrends = TrendReq(hl='en-US', tz=360)
+    def __init__(self, client_factory=None, cache=None, rate_limiter=None):
+        self.client_factory = client_factory or (lambda: TrendReq(hl=TRENDS_CONFIG['hl'], tz=TRENDS_CONFIG['tz']))
+        self.cache = cache or DiskCache(TRENDS_CONFIG['cache_dir'], TRENDS_CONFIG['cache_ttl_seconds'])
+        self.rate_limiter = rate_limiter or RateLimiter(TRENDS_CONFIG['requests_per_minute'], period=60)
+        self.anchor_term = TRENDS_CONFIG['anchor_term']
+        self._local = threading.local()
+        self._pytrends = None
+        self.last_search_delta = None
+        
+    @property
+    def pytrends(self):
+        """Client for the calling thread, created on first use (pytrends sessions are not thread-safe)"""
+        
+        if threading.current_thread() is threading.main_thread():
+            if self._pytrends is None:
+                self._pytrends = self.client_factory()
+            return self._pytrends
+        
+        if getattr(self._local, 'client', None) is None:
+            self._local.client = self.client_factory()
+        return self._local.client
+    
+    def _cache_key(self, term, timeframe, geo):
+        return ('interest_over_time', term, timeframe, geo, self.anchor_term)
+    
+    def fetch_interest(self, terms, timeframe='today 3-m', geo=None):
+        """Anchor-normalized search interest per term, from cache or from batched concurrent payloads
+        
+        Every payload carries the anchor term next to up to four others. Values are rescaled so
+        the anchor peaks at 100 in every payload, which puts terms from different payloads on
+        one scale. Returns {term: DataFrame(date, search_velocity)}.
+        """
+        
+        geo = geo or TRENDS_CONFIG['geo']
+        terms = list(dict.fromkeys(terms))
+        
+        interest = {}
+        missing = []
+        for term in terms:
+            cached = self.cache.get(self._cache_key(term, timeframe, geo))
+            if cached is None:
+                missing.append(term)
+            else:
+                interest[term] = cached
+        
+        others = [term for term in missing if term != self.anchor_term]
+        per_payload = TRENDS_CONFIG['terms_per_payload'] - 1
+        batches = [others[i:i + per_payload] for i in range(0, len(others), per_payload)]
+        if not batches and self.anchor_term in missing:
+            batches = [[]]
+        
+        if batches:
+            print(f"Fetching {len(missing)} terms in {len(batches)} payloads ({len(terms) - len(missing)} cached)")
+            with ThreadPoolExecutor(max_workers=TRENDS_CONFIG['max_workers']) as executor:
+                results = list(executor.map(lambda batch: self._fetch_batch(batch, timeframe, geo), batches))
+            
+            for fetched in results:
+                for term, series in fetched.items():
+                    if term in missing:
+                        interest[term] = self.cache.set(self._cache_key(term, timeframe, geo), series)
+        
+        return {term: interest[term] for term in terms if term in interest}
+    
+    def _fetch_batch(self, batch, timeframe, geo):
+        kw_list = [self.anchor_term] + batch
+        
+        def request():
+            self.rate_limiter.acquire()
+            with track_call('http', 'google_trends.interest_over_time'):
+                self.pytrends.build_payload(kw_list, timeframe=timeframe, geo=geo)
+                return self.pytrends.interest_over_time()
+        
+        try:
+            interest_over_time = retry_with_backoff(
+                request, TRENDS_CONFIG['max_retries'], TRENDS_CONFIG['backoff_seconds']
+            )
+        except Exception as e:
+            print(f"Error fetching trends for {', '.join(batch) or self.anchor_term}: {e}")
+            return {}
+        
+        if interest_over_time.empty:
+            return {}
+        
+        interest_over_time = interest_over_time.reset_index()
+        anchor_peak = interest_over_time[self.anchor_term].max()
+        scale = 100.0 / anchor_peak if anchor_peak > 0 else 1.0
+        
+        return {
+            term: pd.DataFrame({
+                'date': interest_over_time['date'],
+                'search_velocity': interest_over_time[term] * scale
+            })
+            for term in kw_list
+        }
         
     def collect_trends_data(self, terms=None, timeframe='today 3-m'):
         """Pull real-time search velocity for meme terms"""
@@ -13,52 +111,90 @@ class GoogleTrendsCollector:
         if terms is None:
             terms = MEME_TERMS
         
-        trends_data = []
+        interest = self.fetch_interest(terms, timeframe)
+        points = pd.concat([series.assign(term=term) for term, series in interest.items()], ignore_index=True)
         
-        for term in terms:
-            try:
-                self.pytrends.build_payload([term], timeframe=timeframe, geo='US')
-                interest_over_time = self.pytrends.interest_over_time()
-                
-                if not interest_over_time.empty:
-                    interest_over_time = interest_over_time.reset_index()
-                    interest_over_time['term'] = term
-                    interest_over_time['search_velocity'] = interest_over_time[term]
-                    
-                    interest_over_time['velocity_7d_avg'] = interest_over_time['search_velocity'].rolling(7).mean()
-                    interest_over_time['velocity_change'] = interest_over_time['search_velocity'].pct_change()
-                    interest_over_time['acceleration'] = interest_over_time['velocity_change'].diff()
-                    interest_over_time['momentum'] = interest_over_time['search_velocity'] * interest_over_time['acceleration']
-                    
-                    trends_data.append(interest_over_time[['date', 'term', 'search_velocity', 
-                                                             'velocity_7d_avg', 'velocity_change', 
-                                                             'acceleration', 'momentum']])
-            except Exception as e:
-                print(f"Error fetching trends for {term}: {e}")
-                continue
-        
-        trends_df = pd.concat(trends_data, ignore_index=True)
+        trends_df, self.last_search_delta = self.compute_velocity_metrics(points, summary=True)
         print(f"Collected trends data for {len(terms)} terms")
         print(f"Total data points: {len(trends_df)}")
         
         return trends_df
     
-    def calculate_search_delta(self, trends_df):
-        """Calculate search delta metrics"""
+    def compute_velocity_metrics(self, points, summary=False):
+        """Rolling velocity, change, acceleration and momentum for a long (date, term, search_velocity) frame
+        
+        All terms are computed together with grouped, vectorized operations; rows keep the
+        term order of `points` and are sorted by date within each term. Extra columns are kept.
+        With `summary=True` the per-term search delta comes from the same grouping and is
+        returned alongside.
+        """
+        
+        trends_df = points.copy()
+        trends_df['term_order'] = pd.factorize(trends_df['term'])[0]
+        trends_df = trends_df.sort_values(['term_order', 'date'], kind='stable').reset_index(drop=True)
+        by_term = trends_df.groupby('term_order', sort=False)
+        
+        trends_df['velocity_7d_avg'] = by_term['search_velocity'].rolling(TRENDS_CONFIG['velocity_window']).mean().reset_index(level=0, drop=True)
+        trends_df['velocity_change'] = by_term['search_velocity'].pct_change()
+        trends_df['acceleration'] = by_term['velocity_change'].diff()
+        trends_df['momentum'] = trends_df['search_velocity'] * trends_df['acceleration']
+        
+        metrics = ['date', 'term', 'search_velocity', 'velocity_7d_avg', 'velocity_change', 'acceleration', 'momentum']
+        trends = trends_df[metrics + [c for c in points.columns if c not in metrics]]
+        if summary:
+            return trends, self._search_delta(by_term)
+        return trends
+    
+    def update_velocity_metrics(self, new_points, state_path=None):
+        """Append new daily points to the persisted per-term tail and return metrics for the new rows only
+        
+        The state keeps the last `velocity_window` points of every term (at least the two that
+        change and acceleration need), which is all the rolling average, change and acceleration
+        of the next point depend on, so an update costs
+        O(new points) instead of recomputing the full window. Points not newer than a term's
+        last stored date are ignored.
+        """
         
-        summary = trends_df.groupby('term').agg({
-            'search_velocity': 'mean',
-            'acceleration': 'mean',
-            'momentum': 'mean'
-        }).reset_index()
+        state_path = state_path or TRENDS_CONFIG['state_path']
+        window = max(TRENDS_CONFIG['velocity_window'], 2)
+        columns = ['date', 'term', 'search_velocity']
+        
+        new_points = new_points[columns]
+        if os.path.exists(state_path):
+            state = pd.read_parquet(state_path)
+            cutoff = new_points['term'].map(state.groupby('term')['date'].max())
+            new_points = new_points[cutoff.isna() | (new_points['date'] > cutoff)]
+        else:
+            state = new_points.iloc[:0]
+        
+        combined = pd.concat([state.assign(is_new=False), new_points.assign(is_new=True)], ignore_index=True)
+        metrics = self.compute_velocity_metrics(combined)
+        
+        updated = metrics[columns].groupby('term', sort=False).tail(window)
+        directory = os.path.dirname(state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        updated.reset_index(drop=True).to_parquet(state_path)
+        
+        return metrics[metrics['is_new'].astype(bool)].drop(columns='is_new').reset_index(drop=True)
+    
+    def _search_delta(self, by_term):
+        summary = by_term.agg(
+            term=('term', 'first'),
+            search_velocity=('search_velocity', 'mean'),
+            acceleration=('acceleration', 'mean'),
+            momentum=('momentum', 'mean')
+        ).reset_index(drop=True)
         
         summary['search_delta'] = summary['acceleration'] / (summary['search_velocity'] + 1)
-        summary = summary.sort_values('momentum', ascending=False)
+        return summary.sort_values('momentum', ascending=False)
+    
+    def calculate_search_delta(self, trends_df):
+        """Calculate search delta metrics"""
         
-        return summary
+        return self._search_delta(trends_df.groupby('term', sort=False))
 
 if __name__ == "__main__":
     collector = GoogleTrendsCollector()
     trends_df = collector.collect_trends_data()
-    delta_summary = collector.calculate_search_delta(trends_df)
-    print(delta_summary)
+    print(collector.last_search_delta)
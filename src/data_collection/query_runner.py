@@ -0,0 +1,105 @@
+import queue
+import threading
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from src.utils.instrumentation import track_call
+
+class BigQueryRunner:
+    """Run SQL against BigQuery, either as one DataFrame or as a stream of Arrow record batches"""
+    
+    def __init__(self, client):
+        self.client = client
+    
+    def run(self, query):
+        with track_call('bigquery', 'query'):
+            return self.client.query(query).to_dataframe()
+    
+    def iter_batches(self, query, batch_size):
+        """Yield Arrow record batches as result pages arrive (Storage Read API when available)"""
+        
+        with track_call('bigquery', 'query'):
+            rows = self.client.query(query).result(page_size=batch_size)
+        yield from rebatch(self._read_pages(rows.to_arrow_iterable()), batch_size)
+    
+    def _read_pages(self, pages):
+        while True:
+            with track_call('bigquery', 'read_page'):
+                page = next(pages, None)
+            if page is None:
+                return
+            yield page
+
+class ParquetQueryRunner:
+    """Local stand-in for BigQueryRunner that serves a Parquet file whatever the query"""
+    
+    def __init__(self, path):
+        self.path = path
+        self.queries = []
+    
+    def run(self, query):
+        self.queries.append(query)
+        return pd.read_parquet(self.path)
+    
+    def iter_batches(self, query, batch_size):
+        self.queries.append(query)
+        yield from rebatch(pq.ParquetFile(self.path).iter_batches(batch_size=batch_size), batch_size)
+
+def rebatch(batches, batch_size):
+    """Regroup Arrow record batches into batches of exactly `batch_size` rows (the last may be shorter)"""
+    
+    pending = []
+    pending_rows = 0
+    for batch in batches:
+        pending.append(batch)
+        pending_rows += batch.num_rows
+        if pending_rows < batch_size:
+            continue
+        
+        table = pa.Table.from_batches(pending).combine_chunks()
+        start = 0
+        while pending_rows - start >= batch_size:
+            yield table.slice(start, batch_size).to_batches()[0]
+            start += batch_size
+        pending = table.slice(start).to_batches()
+        pending_rows -= start
+    
+    if pending_rows:
+        yield pa.Table.from_batches(pending).combine_chunks().to_batches()[0]
+
+def prefetch(iterator, depth=2):
+    """Pull items from `iterator` on a background thread so the next download overlaps processing"""
+    
+    buffer = queue.Queue(maxsize=max(1, depth))
+    done = object()
+    stop = threading.Event()
+    
+    def produce():
+        try:
+            for item in iterator:
+                if stop.is_set():
+                    return
+                buffer.put((item, None))
+            buffer.put((done, None))
+        except Exception as e:
+            buffer.put((done, e))
+    
+    worker = threading.Thread(target=produce, daemon=True)
+    worker.start()
+    
+    try:
+        while True:
+            item, error = buffer.get()
+            if error is not None:
+                raise error
+            if item is done:
+                return
+            yield item
+    finally:
+        # unblock the producer if the consumer stops early
+        stop.set()
+        while worker.is_alive():
+            try:
+                buffer.get_nowait()
+            except queue.Empty:
+                worker.join(0.01)
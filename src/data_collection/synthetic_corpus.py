@@ -0,0 +1,209 @@
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from config.settings import BIGQUERY_CONFIG, INTENT_MARKERS, MEME_TERMS, SYNTHETIC_CONFIG
+from src.semantic_analysis.keyword_engine import KeywordCounter
+
+class SyntheticCorpusGenerator:
+    """Seeded, vectorized generator of Reddit, Google Trends and TikTok frames for offline load tests
+    
+    Frames follow the schemas of `extract_reddit_comments`, `collect_trends_data` and
+    `fetch_trending_hashtags`. Every Reddit chunk draws from its own stream seeded by
+    (seed, chunk number), so output is identical for a given seed and chunk size.
+    """
+    
+    VOCABULARY = {
+        'filler': (0.55, [
+            'the', 'this', 'is', 'just', 'my', 'going', 'to', 'we', 'are', 'so', 'again', 'today', 'really',
+            'guys', 'market', 'price', 'chart', 'week', 'earnings', 'shares', 'honestly', 'wife', 'boyfriend',
+            'tendies', 'retail', 'fund', 'short', 'squeeze', 'ceo', 'news', 'now', 'think', 'never', 'always'
+        ]),
+        'financial': (0.15, [
+            'buy', 'invest', 'hold', 'long', 'bullish', 'calls', 'puts', 'position', 'portfolio', 'stake',
+            'buying', 'holding', 'investing'
+        ]),
+        'humor': (0.12, ['lol', 'lmao', 'haha', 'joke', 'jk', 'kidding', 'ironic', 'sarcasm', 'hahaha', 'joking']),
+        'meme': (0.12, MEME_TERMS + ['stonk', 'ape', 'moon', 'rocket', 'diamond', 'hands', 'yolo', 'wagmi']),
+        'toxic': (0.02, ['scam', 'pump', 'dump', 'fraud', 'rug pull', 'raid', 'target', 'fake', 'war', 'destroy']),
+        'emphasis': (0.04, ['!!', '!', '$GME', '$AMC', '$TSLA', '$BTC', '🚀', '💎🙌', '🦍'])
+    }
+    
+    SUBREDDITS = [
+        'wallstreetbets', 'memes', 'cryptocurrency', 'stocks', 'dankmemes', 'superstonk',
+        'investing', 'teenagers', 'options', 'pennystocks', 'bitcoin', 'gme'
+    ]
+    
+    # share of daily comments per UTC hour (US evenings peak)
+    HOURLY_WEIGHTS = np.array([
+        5, 4, 3, 2, 1.5, 1.2, 1, 1, 1.2, 1.5, 2, 2.5, 3, 3.5, 4, 4.5, 5, 5.5, 6, 6.5, 7, 7, 6.5, 6
+    ])
+    
+    MAX_FRAGMENTS = 14
+    
+    def __init__(self, seed=None, days=None, end_date=None):
+        self.seed = SYNTHETIC_CONFIG['seed'] if seed is None else seed
+        self.days = days or SYNTHETIC_CONFIG['days']
+        self.end_date = pd.Timestamp(end_date or SYNTHETIC_CONFIG['end_date'])
+        self.start_date = self.end_date - pd.Timedelta(days=self.days - 1)
+        
+        words = []
+        self._category_start = []
+        self._category_size = []
+        for _, category_words in self.VOCABULARY.values():
+            self._category_start.append(len(words))
+            self._category_size.append(len(category_words))
+            words.extend(category_words)
+        
+        # every word in plain and shouted form, each with a leading separator
+        self._fragments = np.array([f' {w}' for w in words] + [f' {w.upper()}' for w in words], dtype=object)
+        self._n_words = len(words)
+        self._category_start = np.array(self._category_start)
+        self._category_size = np.array(self._category_size)
+        self._category_weights = np.array([weight for weight, _ in self.VOCABULARY.values()])
+        self._filter_terms = np.array([f' {t}' for t in BIGQUERY_CONFIG['filter_terms']], dtype=object)
+        self._subreddit_weights = 1.0 / np.arange(1, len(self.SUBREDDITS) + 1) ** 1.1
+        self._marker_counter = KeywordCounter([kw for keywords in INTENT_MARKERS.values() for kw in keywords])
+    
+    def _rng(self, *stream):
+        return np.random.default_rng([self.seed, *stream])
+    
+    def _bodies(self, rng, n):
+        slots = self.MAX_FRAGMENTS
+        n_fragments = rng.integers(4, slots + 1, n)
+        
+        categories = rng.choice(len(self._category_weights), size=(n, slots), p=self._category_weights / self._category_weights.sum())
+        word_ids = self._category_start[categories] + (rng.random((n, slots)) * self._category_size[categories]).astype(np.int64)
+        word_ids += np.where(rng.random((n, slots)) < 0.08, self._n_words, 0)
+        fragments = self._fragments[word_ids]
+        fragments[np.arange(slots) >= n_fragments[:, None]] = ''
+        
+        # every comment carries one of the extraction filter terms, like the BigQuery WHERE clause
+        filter_slot = (rng.random(n) * n_fragments).astype(np.int64)
+        fragments[np.arange(n), filter_slot] = self._filter_terms[rng.integers(0, len(self._filter_terms), n)]
+        
+        bodies = fragments[:, 0]
+        for i in range(1, slots):
+            bodies = bodies + fragments[:, i]
+        bodies = pd.Series(bodies, dtype=object).str.slice(1)
+        
+        too_short = bodies.str.len() <= 20
+        bodies[too_short] = bodies[too_short] + ' to be honest with you'
+        
+        return bodies.str.slice(0, 499)
+    
+    def reddit_comments(self, n_rows, chunk_index=0, id_offset=0):
+        """One frame of Reddit-like comments with the `extract_reddit_comments` schema"""
+        
+        rng = self._rng(0, chunk_index)
+        
+        day = rng.integers(0, self.days, n_rows)
+        hour = rng.choice(24, size=n_rows, p=self.HOURLY_WEIGHTS / self.HOURLY_WEIGHTS.sum())
+        created_utc = (
+            int(self.start_date.timestamp()) + day * 86400 + hour * 3600 + rng.integers(0, 3600, n_rows)
+        )
+        
+        bodies = self._bodies(rng, n_rows)
+        markers = self._marker_counter.count(bodies.tolist()) > 0
+        
+        df = pd.DataFrame({
+            'comment_id': np.char.add('syn', (id_offset + np.arange(n_rows)).astype(str)),
+            'created_utc': created_utc,
+            'date': (created_utc // 86400).astype('datetime64[D]'),
+            'hour': hour,
+            'subreddit': np.array(self.SUBREDDITS)[
+                rng.choice(len(self.SUBREDDITS), size=n_rows, p=self._subreddit_weights / self._subreddit_weights.sum())
+            ],
+            'body': bodies.to_numpy(),
+            'score': np.floor(rng.pareto(1.3, n_rows) * 5).astype(np.int64) - rng.integers(0, 3, n_rows)
+        })
+        
+        column = 0
+        for name, keywords in INTENT_MARKERS.items():
+            df[name] = markers[:, column:column + len(keywords)].any(axis=1).astype(np.int64)
+            column += len(keywords)
+        df['text_length'] = df['body'].str.len()
+        
+        return df.sort_values('created_utc', ascending=False, kind='stable').reset_index(drop=True)
+    
+    def iter_reddit_comments(self, n_rows, chunk_size=None):
+        """Yield Reddit frames of at most `chunk_size` rows, `n_rows` in total"""
+        
+        chunk_size = chunk_size or SYNTHETIC_CONFIG['chunk_size']
+        for chunk_index, start in enumerate(range(0, n_rows, chunk_size)):
+            yield self.reddit_comments(min(chunk_size, n_rows - start), chunk_index, id_offset=start)
+    
+    def trends_data(self, terms=None):
+        """Daily search velocity with spikes per term, with the `collect_trends_data` schema"""
+        
+        from src.data_collection.google_trends import GoogleTrendsCollector
+        
+        terms = list(terms or MEME_TERMS)
+        rng = self._rng(1)
+        n_terms = len(terms)
+        
+        base = rng.uniform(5, 60, n_terms)[:, None]
+        walk = np.cumsum(rng.normal(0, 2.0, (n_terms, self.days)), axis=1)
+        spikes = (rng.random((n_terms, self.days)) < 0.03) * rng.uniform(20, 60, (n_terms, self.days))
+        velocity = np.clip(base + walk + spikes, 1, None)
+        velocity = np.round(velocity * 100 / velocity.max(axis=1, keepdims=True))
+        
+        points = pd.DataFrame({
+            'date': np.tile(pd.date_range(self.start_date, periods=self.days), n_terms),
+            'term': np.repeat(terms, self.days),
+            'search_velocity': velocity.ravel()
+        })
+        
+        return GoogleTrendsCollector(client_factory=lambda: None).compute_velocity_metrics(points)
+    
+    def tiktok_trends(self, hashtags=None):
+        """Hashtag-level TikTok frame with the `fetch_trending_hashtags` schema"""
+        
+        hashtags = list(hashtags or MEME_TERMS)
+        rng = self._rng(2)
+        n = len(hashtags)
+        
+        df = pd.DataFrame({
+            'hashtag': hashtags,
+            'view_count': np.round(rng.lognormal(16.5, 0.8, n)).astype(np.int64),
+            'video_count': rng.integers(3000, 30000, n),
+            'growth_rate': rng.uniform(0.1, 0.7, n),
+            'collection_timestamp': self.end_date.isoformat()
+        })
+        df['velocity_score'] = df['growth_rate'] * (df['view_count'] / df['view_count'].max())
+        df['viral_threshold'] = df['view_count'] > 10000000
+        
+        return df
+    
+    def write_parquet(self, output_dir=None, reddit_rows=None, chunk_size=None):
+        """Stream the Reddit corpus to Parquet chunk by chunk, plus the trends and TikTok frames"""
+        
+        output_dir = output_dir or SYNTHETIC_CONFIG['output_dir']
+        reddit_rows = reddit_rows or SYNTHETIC_CONFIG['reddit_rows']
+        os.makedirs(output_dir, exist_ok=True)
+        
+        reddit_path = os.path.join(output_dir, 'reddit_comments.parquet')
+        writer = None
+        try:
+            for chunk in self.iter_reddit_comments(reddit_rows, chunk_size):
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(reddit_path, table.schema)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+        
+        paths = {'reddit': reddit_path}
+        paths['trends'] = os.path.join(output_dir, 'google_trends.parquet')
+        self.trends_data().to_parquet(paths['trends'], index=False)
+        paths['tiktok'] = os.path.join(output_dir, 'tiktok_trends.parquet')
+        self.tiktok_trends().to_parquet(paths['tiktok'], index=False)
+        
+        print(f"Synthetic corpus written to {output_dir}: {reddit_rows} comments")
+        return paths
+
+if __name__ == "__main__":
+    generator = SyntheticCorpusGenerator()
+    generator.write_parquet()
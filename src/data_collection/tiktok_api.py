@@ -1,8 +1,12 @@
+import asyncio
+import aiohttp
 import requests
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
-from config.settings import TIKTOK_API_BASE, MEME_TERMS
+from datetime import datetime, timedelta, timezone
+from config.settings import TIKTOK_API_BASE, TIKTOK_CONFIG, MEME_TERMS
+from src.utils.throttling import backoff_delay, run_sync
+from src.utils.instrumentation import track_call
 
 class TikTokDataCollector:
     def __init__(self, client_key=None, client_secret=None):
@@ -53,6 +57,160 @@ class TikTokDataCollector:
         
         return pd.DataFrame(video_data)
 
+class TikTokAPIError(Exception):
+    """Raised when the Research API returns an error after all retries"""
+
+class RetryableResponse(TikTokAPIError):
+    """Throttled or server-error response that is worth retrying"""
+
+class AsyncTikTokCollector:
+    """Collect video metadata for many hashtags concurrently from the TikTok Research API
+    
+    One pooled aiohttp session serves every request. Each hashtag's lookback period is split
+    into date windows that paginate by cursor; in-flight requests are capped globally and per
+    hashtag, and failed requests are retried with jittered exponential backoff.
+    """
+    
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+    
+    def __init__(self, client_key=None, client_secret=None, access_token=None, api_base=None):
+        self.api_base = (api_base or TIKTOK_API_BASE).rstrip('/')
+        self.client_key = client_key
+        self.client_secret = client_secret
+        self.access_token = access_token
+        self.request_count = 0
+    
+    def collect_video_metadata(self, hashtags=None, end_date=None):
+        """Synchronous entry point; returns one DataFrame of videos for all hashtags"""
+        
+        return run_sync(self.fetch_videos(hashtags, end_date))
+    
+    async def fetch_videos(self, hashtags=None, end_date=None):
+        hashtags = list(hashtags or MEME_TERMS)
+        end_date = end_date or datetime.now(timezone.utc).date()
+        
+        connector = aiohttp.TCPConnector(limit=TIKTOK_CONFIG['max_connections'])
+        timeout = aiohttp.ClientTimeout(total=TIKTOK_CONFIG['timeout_seconds'])
+        global_limit = asyncio.Semaphore(TIKTOK_CONFIG['max_concurrent_requests'])
+        
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            if self.access_token is None:
+                await self._fetch_access_token(session)
+            
+            results = await asyncio.gather(*[
+                self._fetch_hashtag(session, global_limit, hashtag, end_date) for hashtag in hashtags
+            ])
+        
+        videos = [video for hashtag_videos in results for video in hashtag_videos]
+        df = self._to_frame(videos)
+        print(f"TikTok videos collected: {len(df)} across {len(hashtags)} hashtags ({self.request_count} requests)")
+        
+        return df
+    
+    async def _fetch_access_token(self, session):
+        data = {
+            'client_key': self.client_key,
+            'client_secret': self.client_secret,
+            'grant_type': 'client_credentials'
+        }
+        with track_call('http', 'tiktok.oauth_token'):
+            async with session.post(f"{self.api_base}/oauth/token/", data=data) as response:
+                response.raise_for_status()
+                self.access_token = (await response.json())['access_token']
+    
+    def _date_windows(self, end_date):
+        days = TIKTOK_CONFIG['lookback_days']
+        n_windows = max(1, min(TIKTOK_CONFIG['date_windows'], days))
+        bounds = np.linspace(0, days, n_windows + 1).round().astype(int)
+        
+        # each window covers [start, end] inclusive, walking back from end_date
+        return [
+            (end_date - timedelta(days=int(bounds[i + 1]) - 1), end_date - timedelta(days=int(bounds[i])))
+            for i in range(n_windows)
+        ]
+    
+    async def _fetch_hashtag(self, session, global_limit, hashtag, end_date):
+        hashtag_limit = asyncio.Semaphore(TIKTOK_CONFIG['max_concurrent_per_hashtag'])
+        windows = await asyncio.gather(*[
+            self._fetch_window(session, global_limit, hashtag_limit, hashtag, start, end)
+            for start, end in self._date_windows(end_date)
+        ])
+        
+        videos = []
+        for window_videos in windows:
+            for video in window_videos:
+                video['hashtag'] = hashtag
+                videos.append(video)
+        
+        return videos
+    
+    async def _fetch_window(self, session, global_limit, hashtag_limit, hashtag, start, end):
+        body = {
+            'query': {'and': [{'operation': 'IN', 'field_name': 'hashtag_name', 'field_values': [hashtag]}]},
+            'start_date': start.strftime('%Y%m%d'),
+            'end_date': end.strftime('%Y%m%d'),
+            'max_count': TIKTOK_CONFIG['page_size']
+        }
+        
+        videos = []
+        for _ in range(TIKTOK_CONFIG['max_pages']):
+            try:
+                data = await self._post(session, (hashtag_limit, global_limit), '/research/video/query/', body)
+            except (TikTokAPIError, aiohttp.ClientError) as e:
+                print(f"Error fetching TikTok videos for {hashtag} ({body['start_date']}-{body['end_date']}): {e}")
+                break
+            
+            videos.extend(data.get('videos', []))
+            if not data.get('has_more'):
+                break
+            body = dict(body, cursor=data['cursor'], search_id=data.get('search_id'))
+        
+        return videos
+    
+    async def _post(self, session, limits, path, body):
+        """POST with retries; each attempt holds the concurrency `limits` only while its request is in flight"""
+        
+        hashtag_limit, global_limit = limits
+        url = f"{self.api_base}{path}"
+        params = {'fields': TIKTOK_CONFIG['video_fields']}
+        headers = {'Authorization': f"Bearer {self.access_token}"}
+        
+        for attempt in range(TIKTOK_CONFIG['max_retries'] + 1):
+            self.request_count += 1
+            try:
+                async with hashtag_limit, global_limit:
+                    with track_call('http', 'tiktok.video_query'):
+                        async with session.post(url, params=params, json=body, headers=headers) as response:
+                            if response.status in self.RETRY_STATUSES:
+                                raise RetryableResponse(f"HTTP {response.status} from {path}")
+                            response.raise_for_status()
+                            payload = await response.json()
+                error = payload.get('error', {})
+                if error.get('code', 'ok') != 'ok':
+                    raise TikTokAPIError(f"{error.get('code')}: {error.get('message')}")
+                return payload.get('data', {})
+            except (RetryableResponse, aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                failure = e
+            
+            # back off without holding a slot, so healthy requests keep the concurrency budget
+            if attempt < TIKTOK_CONFIG['max_retries']:
+                await asyncio.sleep(backoff_delay(attempt, TIKTOK_CONFIG['backoff_seconds']))
+        
+        raise TikTokAPIError(f"Request to {path} failed after {TIKTOK_CONFIG['max_retries'] + 1} attempts: {failure}")
+    
+    def _to_frame(self, videos):
+        columns = ['video_id', 'hashtag', 'like_count', 'share_count', 'comment_count', 'view_count', 'create_time', 'engagement_rate']
+        if not videos:
+            return pd.DataFrame(columns=columns)
+        
+        df = pd.DataFrame(videos).rename(columns={'id': 'video_id'})
+        for column in ['like_count', 'share_count', 'comment_count', 'view_count']:
+            df[column] = pd.to_numeric(df.get(column, 0), errors='coerce').fillna(0).astype(np.int64)
+        df['create_time'] = pd.to_datetime(df['create_time'], unit='s', utc=True).dt.strftime('%Y-%m-%dT%H:%M:%S')
+        df['engagement_rate'] = (df['like_count'] + df['share_count'] + df['comment_count']) / df['view_count'].clip(lower=1)
+        
+        return df[columns]
+
 if __name__ == "__main__":
     collector = TikTokDataCollector()
     trends = collector.fetch_trending_hashtags()
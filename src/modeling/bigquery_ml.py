@@ -1,5 +1,6 @@
 from google.cloud import bigquery
 from config.settings import PROJECT_ID, DATASET_ID
+from src.utils.instrumentation import track_call
 
 class BigQueryMLModel:
     def __init__(self):
@@ -32,8 +33,9 @@ class BigQueryMLModel:
         """
         
         print("Creating BigQuery ML model...")
-        job = self.client.query(model_query)
-        job.result()
+        with track_call('bigquery', 'create_model'):
+            job = self.client.query(model_query)
+            job.result()
         print("BigQuery ML model created successfully")
         
     def evaluate_model(self):
@@ -49,7 +51,8 @@ class BigQueryMLModel:
           ML.EVALUATE(MODEL `{PROJECT_ID}.{DATASET_ID}.slang_acceleration_predictor`)
         """
         
-        results = self.client.query(eval_query).to_dataframe()
+        with track_call('bigquery', 'evaluate_model'):
+            results = self.client.query(eval_query).to_dataframe()
         print("\nBigQuery ML Model Evaluation:")
         print(results)
         
@@ -70,7 +73,8 @@ class BigQueryMLModel:
         ORDER BY predicted_market_impact_score DESC
         """
         
-        predictions = self.client.query(predict_query).to_dataframe()
+        with track_call('bigquery', 'predict'):
+            predictions = self.client.query(predict_query).to_dataframe()
         print(f"\nTop predictions generated: {len(predictions)}")
         
         return predictions
@@ -1,49 +1,95 @@
+import json
+import os
+import uuid
+from datetime import datetime
+import joblib
 import pandas as pd
 import numpy as np
+import sklearn
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
-from sklearn.linear_model import LinearRegression
+from sklearn.linear_model import LinearRegression, SGDRegressor
 from sklearn.metrics import mean_squared_error, r2_score, mean_absolute_error
-import re
-from config.settings import FEATURE_COLUMNS
+from config.settings import FEATURE_COLUMNS, IMPACT_HORIZONS, MODEL_CONFIG
+from src.semantic_analysis.keyword_engine import TextBatch
+from src.semantic_analysis.text_features import TextFeatureExtractor, pattern_column, regex_counts, uppercase_counts
+
+# bump when the artifact layout changes so older files are rejected instead of misread
+ARTIFACT_FORMAT = 1
+ENGINEERED_COLUMNS = ['financial_words', 'urgency_words', 'caps_ratio', 'exclamation_count']
 
 class MarketImpactPredictor:
     def __init__(self):
         self.model = LinearRegression()
         self.scaler = StandardScaler()
         self.feature_columns = FEATURE_COLUMNS
+        self.version = None
+        self.metrics = None
+        self._text_extractor = None
+        self.text_patterns = {
+            'financial_words': r'\b(buy|invest|hold|long|bullish|calls|puts|strike)\b',
+            'urgency_words': r'\b(now|today|asap|urgent|quick|fast)\b'
+        }
         
-    def engineer_features(self, df):
-        """Create prediction features"""
+    def engineer_features(self, df, features=None, score_max=None):
+        """Create prediction features; text features already on the frame (e.g. from `train`) are kept"""
         
-        df['financial_words'] = df['body'].apply(
-            lambda x: len(re.findall(r'\b(buy|invest|hold|long|bullish|calls|puts|strike)\b', str(x).lower()))
-        )
-        df['urgency_words'] = df['body'].apply(
-            lambda x: len(re.findall(r'\b(now|today|asap|urgent|quick|fast)\b', str(x).lower()))
-        )
-        df['caps_ratio'] = df['body'].apply(
-            lambda x: sum(1 for c in str(x) if c.isupper()) / (len(str(x)) + 1)
-        )
-        df['exclamation_count'] = df['body'].apply(lambda x: str(x).count('!'))
+        if not set(ENGINEERED_COLUMNS).issubset(df.columns):
+            self._add_text_features(df, features)
+        
+        df['market_readiness'] = self.calculate_market_readiness(df, score_max)
+        
+        return df
+    
+    def _add_text_features(self, df, features=None):
+        if features is None:
+            features = self.text_statistics(df['body'])
         
-        df['market_readiness'] = (
+        df['financial_words'] = features[pattern_column('financial_words')].to_numpy()
+        df['urgency_words'] = features[pattern_column('urgency_words')].to_numpy()
+        df['caps_ratio'] = features['uppercase_count'].to_numpy() / (features['char_length'].to_numpy() + 1)
+        df['exclamation_count'] = features['exclamation_count'].to_numpy()
+    
+    def text_statistics(self, body):
+        """Only the feature-table columns this model reads, computed with vectorized string kernels"""
+        
+        texts = [str(text) for text in body.tolist()]
+        batch = TextBatch(texts, lowercase=False)
+        
+        counts = regex_counts(texts, dict(self.text_patterns, exclamation_count='!'))
+        columns = {pattern_column(name): counts[name] for name in self.text_patterns}
+        columns['exclamation_count'] = counts['exclamation_count']
+        columns['uppercase_count'] = uppercase_counts(batch)
+        columns['char_length'] = batch.lengths
+        
+        return pd.DataFrame(columns, index=body.index)
+    
+    def calculate_market_readiness(self, df, score_max=None):
+        """Blend semantic, lookalike and engagement signals into the readiness target"""
+        
+        if score_max is None:
+            score_max = df['score'].max()
+        
+        return (
             df['seriousness_threshold'] * 0.3 +
             df['irony_collapse_index'] * 0.3 +
             df.get('lookalike_similarity', 0) * 0.2 +
-            (df['score'] / df['score'].max()) * 0.2
+            (df['score'] / score_max) * 0.2
         )
-        
-        return df
     
-    def train(self, df):
+    def train(self, df, features=None):
         """Train market impact prediction model"""
         
-        df = self.engineer_features(df)
+        df = self.engineer_features(df, features)
         
         X = df[self.feature_columns].fillna(0)
         y = df['market_readiness']
         
+        return self.fit(X, y)
+    
+    def fit(self, X, y):
+        """Fit scaler and model on prepared features and report hold-out metrics"""
+        
         X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
         
         X_train_scaled = self.scaler.fit_transform(X_train)
@@ -68,12 +114,174 @@ class MarketImpactPredictor:
         print(f"Testing R²: {metrics['test_r2']:.4f}")
         print(f"Testing MAE: {metrics['test_mae']:.4f}")
         
+        self.version = None
+        self.metrics = metrics
         return metrics
     
-    def predict(self, df):
+    def evaluation_mask(self, df):
+        """Deterministic hold-out split: hash of the comment id (or body) decides, independent of chunking"""
+        
+        key_column = MODEL_CONFIG['split_key'] if MODEL_CONFIG['split_key'] in df.columns else 'body'
+        hashes = pd.util.hash_pandas_object(df[key_column], index=False).to_numpy()
+        
+        return (hashes % 10_000) < int(MODEL_CONFIG['test_fraction'] * 10_000)
+    
+    def train_stream(self, chunk_source, score_max=None, epochs=None):
+        """Out-of-core training with StandardScaler and SGDRegressor partial fits
+        
+        `chunk_source` is a callable returning a fresh iterator of comment frames, or of
+        (frame, text features) pairs, so only one chunk is in memory at a time. The data is read
+        once to fit the scaler (and find `score_max` if not given), `epochs` times to fit the
+        regressor, and once to compute train and hold-out metrics with the final model.
+        """
+        
+        epochs = epochs or MODEL_CONFIG['sgd_epochs']
+        
+        # the scaler only needs X, which does not depend on score_max
+        scaler = StandardScaler()
+        observed_max = None
+        rows = train_rows = 0
+        for X, _, is_eval, chunk_max in self._iter_prepared(chunk_source, score_max):
+            rows += len(is_eval)
+            if (~is_eval).any():
+                scaler.partial_fit(X[~is_eval])
+                train_rows += int((~is_eval).sum())
+            observed_max = chunk_max if observed_max is None else max(observed_max, chunk_max)
+        score_max = observed_max if score_max is None else score_max
+        
+        if train_rows == 0:
+            raise ValueError(
+                f"No training rows among {rows} streamed rows; every row fell into the hold-out split "
+                f"(test_fraction={MODEL_CONFIG['test_fraction']}). Stream more data or lower test_fraction"
+            )
+        
+        model = SGDRegressor(alpha=MODEL_CONFIG['sgd_alpha'], eta0=MODEL_CONFIG['sgd_eta0'], random_state=42)
+        for _ in range(epochs):
+            for X, y, is_eval, _ in self._iter_prepared(chunk_source, score_max):
+                if (~is_eval).any():
+                    model.partial_fit(scaler.transform(X[~is_eval]), y[~is_eval])
+        
+        train_metrics, test_metrics = RunningRegressionMetrics(), RunningRegressionMetrics()
+        for X, y, is_eval, _ in self._iter_prepared(chunk_source, score_max):
+            predictions = model.predict(scaler.transform(X))
+            train_metrics.update(y[~is_eval], predictions[~is_eval])
+            test_metrics.update(y[is_eval], predictions[is_eval])
+        
+        self.model, self.scaler = model, scaler
+        train, test = train_metrics.result(), test_metrics.result()
+        metrics = {
+            'train_r2': train['r2'],
+            'test_r2': test['r2'],
+            'train_mse': train['mse'],
+            'test_mse': test['mse'],
+            'train_mae': train['mae'],
+            'test_mae': test['mae']
+        }
+        
+        print(f"Model Training Complete (streaming, {train_metrics.n} train / {test_metrics.n} hold-out rows)")
+        print(f"Training R²: {metrics['train_r2']:.4f}")
+        print(f"Testing R²: {metrics['test_r2']:.4f}")
+        print(f"Testing MAE: {metrics['test_mae']:.4f}")
+        
+        self.version = None
+        self.metrics = metrics
+        return metrics
+    
+    def _iter_prepared(self, chunk_source, score_max):
+        """(X, y, hold-out mask, max score) per chunk; y uses the chunk's own max when `score_max` is None"""
+        
+        for item in chunk_source():
+            chunk, features = item if isinstance(item, tuple) else (item, None)
+            if features is None and not set(ENGINEERED_COLUMNS).issubset(chunk.columns):
+                features = self.text_extractor.extract(chunk['body'], index=chunk.index)
+            
+            chunk = self.engineer_features(chunk.copy(), features, score_max)
+            X = chunk[self.feature_columns].fillna(0).astype(np.float64)
+            yield X, chunk['market_readiness'].to_numpy(dtype=np.float64), self.evaluation_mask(chunk), chunk['score'].max()
+    
+    @property
+    def text_extractor(self):
+        if self._text_extractor is None:
+            self._text_extractor = TextFeatureExtractor.for_components(self)
+        return self._text_extractor
+    
+    def save(self, artifact_dir=None):
+        """Write model, scaler and feature schema as a new versioned artifact and point `LATEST` at it"""
+        
+        artifact_dir = artifact_dir or MODEL_CONFIG['artifact_dir']
+        os.makedirs(artifact_dir, exist_ok=True)
+        
+        # microseconds keep versions from the same second in chronological (= name) order
+        version = f"{datetime.now().strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:6]}"
+        path = os.path.join(artifact_dir, f'market_impact_{version}.joblib')
+        joblib.dump({
+            'format': ARTIFACT_FORMAT,
+            'version': version,
+            'trained_at': datetime.now().isoformat(),
+            'sklearn_version': sklearn.__version__,
+            'feature_columns': list(self.feature_columns),
+            'metrics': self.metrics,
+            'model': self.model,
+            'scaler': self.scaler
+        }, path)
+        
+        tmp_path = os.path.join(artifact_dir, 'LATEST.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': version, 'path': os.path.basename(path)}, f)
+        os.replace(tmp_path, os.path.join(artifact_dir, 'LATEST'))
+        
+        self._prune_artifacts(artifact_dir, keep=os.path.basename(path))
+        self.version = version
+        print(f"Predictor artifact saved to {path}")
+        return path
+    
+    def _prune_artifacts(self, artifact_dir, keep):
+        artifacts = sorted(name for name in os.listdir(artifact_dir) if name.startswith('market_impact_') and name.endswith('.joblib'))
+        for name in artifacts[:-MODEL_CONFIG['keep_versions']]:
+            if name != keep:
+                os.remove(os.path.join(artifact_dir, name))
+    
+    def load(self, path=None):
+        """Load an artifact (the latest one by default) after checking it matches this build's feature schema"""
+        
+        if path is None:
+            artifact_dir = MODEL_CONFIG['artifact_dir']
+            latest_path = os.path.join(artifact_dir, 'LATEST')
+            if not os.path.exists(latest_path):
+                raise FileNotFoundError(f"No predictor artifact in {artifact_dir}; run training first")
+            with open(latest_path) as f:
+                path = os.path.join(artifact_dir, json.load(f)['path'])
+        
+        artifact = joblib.load(path)
+        if artifact.get('format') != ARTIFACT_FORMAT:
+            raise ValueError(f"Predictor artifact {path} has format {artifact.get('format')}, expected {ARTIFACT_FORMAT}")
+        if artifact['feature_columns'] != list(self.feature_columns):
+            raise ValueError(
+                f"Predictor artifact {path} was trained on {artifact['feature_columns']}, "
+                f"but this build uses {list(self.feature_columns)}"
+            )
+        if artifact['sklearn_version'] != sklearn.__version__:
+            print(f"Warning: artifact trained with scikit-learn {artifact['sklearn_version']}, running {sklearn.__version__}")
+        
+        self.model = artifact['model']
+        self.scaler = artifact['scaler']
+        self.version = artifact['version']
+        self.metrics = artifact['metrics']
+        print(f"Loaded predictor artifact {self.version}")
+        return self.metrics
+    
+    @classmethod
+    def from_artifact(cls, path=None):
+        """Predict-only predictor restored from a saved artifact"""
+        
+        predictor = cls()
+        predictor.load(path)
+        return predictor
+    
+    def predict(self, df, features=None, score_max=None):
         """Make predictions on new data"""
         
-        df = self.engineer_features(df)
+        df = self.engineer_features(df, features, score_max)
         X = df[self.feature_columns].fillna(0)
         X_scaled = self.scaler.transform(X)
         
@@ -81,32 +289,69 @@ class MarketImpactPredictor:
         
         return df
     
-    def calculate_impact_probability(self, df):
-        """Calculate 24/48/72 hour impact probabilities"""
+    def calculate_impact_probability(self, df, horizons=None):
+        """Calculate impact probabilities for every horizon (24/48/72h by default) in one pass"""
         
-        df['impact_prob_24h'] = df.apply(
-            lambda row: min(100, max(0, row['predicted_readiness'] * 100 * 
-                (0.6 + 0.4 * row['irony_collapse_index']) * 
-                (0.7 + 0.3 * row.get('lookalike_similarity', 0)))),
-            axis=1
-        )
+        horizons = horizons or IMPACT_HORIZONS
         
-        df['impact_prob_48h'] = df.apply(
-            lambda row: min(100, max(0, row['predicted_readiness'] * 100 * 
-                (0.7 + 0.3 * row['irony_collapse_index']) * 
-                (0.8 + 0.2 * row.get('lookalike_similarity', 0)))),
-            axis=1
-        )
+        readiness = df['predicted_readiness'].to_numpy(dtype=np.float64) * 100
+        ici = df['irony_collapse_index'].to_numpy(dtype=np.float64)
+        if 'lookalike_similarity' in df.columns:
+            lookalike = df['lookalike_similarity'].to_numpy(dtype=np.float64)
+        else:
+            lookalike = np.zeros(len(df))
         
-        df['impact_prob_72h'] = df.apply(
-            lambda row: min(100, max(0, row['predicted_readiness'] * 100 * 
-                (0.8 + 0.2 * row['irony_collapse_index']) * 
-                (0.9 + 0.1 * row.get('lookalike_similarity', 0)))),
-            axis=1
-        )
+        for horizon in horizons:
+            probability = (
+                readiness *
+                (horizon['ici_base'] + horizon['ici_weight'] * ici) *
+                (horizon['lookalike_base'] + horizon['lookalike_weight'] * lookalike)
+            )
+            df[f"impact_prob_{horizon['hours']}h"] = np.nan_to_num(np.clip(probability, 0, 100), nan=0.0)
         
         return df
 
+class RunningRegressionMetrics:
+    """R², MSE and MAE accumulated chunk by chunk (parallel mean/variance merge for the R² denominator)"""
+    
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.squared_error = 0.0
+        self.absolute_error = 0.0
+    
+    def update(self, y_true, y_pred):
+        y_true = np.asarray(y_true, dtype=np.float64)
+        n = len(y_true)
+        if n == 0:
+            return self
+        
+        errors = y_true - np.asarray(y_pred, dtype=np.float64)
+        self.squared_error += float(errors @ errors)
+        self.absolute_error += float(np.abs(errors).sum())
+        
+        mean = y_true.mean()
+        m2 = float(((y_true - mean) ** 2).sum())
+        total = self.n + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta ** 2 * self.n * n / total
+        self.n = total
+        
+        return self
+    
+    def result(self):
+        if self.n == 0:
+            return {'r2': float('nan'), 'mse': float('nan'), 'mae': float('nan')}
+        
+        return {
+            # constant targets follow r2_score: 1.0 for a perfect fit, otherwise 0.0
+            'r2': float(1 - self.squared_error / self.m2) if self.m2 > 0 else float(self.squared_error == 0),
+            'mse': self.squared_error / self.n,
+            'mae': self.absolute_error / self.n
+        }
+
 if __name__ == "__main__":
     predictor = MarketImpactPredictor()
     print("Market Impact Predictor initialized")
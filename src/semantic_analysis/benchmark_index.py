@@ -0,0 +1,179 @@
+import os
+import numpy as np
+import pandas as pd
+from sklearn.cluster import KMeans
+from config.settings import BENCHMARK_CONFIG
+
+class BenchmarkIndex:
+    """Pre-normalized embedding index over historical market-moving meme episodes"""
+    
+    def __init__(self, names, embeddings, market_impact, categories, centroids=None, list_ids=None):
+        self.names = np.asarray(names, dtype=str)
+        self.embeddings = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        self.market_impact = np.asarray(market_impact, dtype=np.float64)
+        self.categories = np.asarray(categories, dtype=str)
+        self.centroids = centroids
+        self.list_ids = list_ids
+    
+    def __len__(self):
+        return len(self.names)
+    
+    @property
+    def is_approximate(self):
+        return self.centroids is not None
+    
+    @staticmethod
+    def _normalize(vectors):
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (vectors / norms).astype(np.float32)
+    
+    @classmethod
+    def build(cls, benchmarks, featurize, ann=None):
+        """Embed a benchmark library (name, text, market_impact, category) with the given featurizer"""
+        
+        seriousness = benchmarks['seriousness_threshold'].to_numpy(dtype=np.float64) if 'seriousness_threshold' in benchmarks.columns else 0.9
+        ici = benchmarks['irony_collapse_index'].to_numpy(dtype=np.float64) if 'irony_collapse_index' in benchmarks.columns else 0.85
+        embeddings = featurize(benchmarks['text'].tolist(), seriousness, ici)
+        
+        index = cls(
+            benchmarks['name'].tolist(),
+            embeddings,
+            benchmarks['market_impact'].to_numpy(dtype=np.float64),
+            benchmarks['category'].fillna('').tolist() if 'category' in benchmarks.columns else [''] * len(benchmarks)
+        )
+        
+        if ann is None:
+            ann = len(index) >= BENCHMARK_CONFIG['ann_min_size']
+        if ann:
+            index.build_ann(BENCHMARK_CONFIG['ann_lists'])
+        
+        return index
+    
+    @staticmethod
+    def read_library(path):
+        """Read a benchmark library from CSV, JSON, JSON lines or Parquet"""
+        
+        extension = os.path.splitext(path)[1].lower()
+        if extension == '.csv':
+            return pd.read_csv(path)
+        if extension == '.jsonl':
+            return pd.read_json(path, lines=True)
+        if extension == '.json':
+            return pd.read_json(path)
+        if extension == '.parquet':
+            return pd.read_parquet(path)
+        
+        raise ValueError(f"Unsupported benchmark library format: {path}")
+    
+    def build_ann(self, n_lists):
+        """Partition the library into inverted lists around spherical k-means centroids"""
+        
+        n_lists = max(1, min(n_lists, len(self)))
+        kmeans = KMeans(n_clusters=n_lists, random_state=42, n_init=1)
+        kmeans.fit(self.embeddings)
+        
+        self.centroids = self._normalize(kmeans.cluster_centers_)
+        self.list_ids = (self.embeddings @ self.centroids.T).argmax(axis=1)
+        
+        return self
+    
+    def save(self, path):
+        """Persist the index so later runs skip featurizing and normalizing the library"""
+        
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        arrays = {
+            'names': self.names,
+            'embeddings': self.embeddings,
+            'market_impact': self.market_impact,
+            'categories': self.categories
+        }
+        if self.is_approximate:
+            arrays['centroids'] = self.centroids
+            arrays['list_ids'] = self.list_ids
+        
+        with open(path, 'wb') as f:
+            np.savez(f, **arrays)
+        
+        print(f"Benchmark index saved to {path} ({len(self)} episodes)")
+        return path
+    
+    @classmethod
+    def load(cls, path):
+        """Load an index written by `save`"""
+        
+        with np.load(path, allow_pickle=False) as data:
+            index = cls(data['names'], data['embeddings'], data['market_impact'], data['categories'])
+            if 'centroids' in data:
+                index.centroids = data['centroids']
+                index.list_ids = data['list_ids']
+        
+        return index
+    
+    def search(self, vectors, k=1, n_probe=None):
+        """Top-k benchmarks by cosine similarity; returns (indices, similarities), both (N, k)"""
+        
+        queries = self._normalize(np.asarray(vectors, dtype=np.float32))
+        k = min(k, len(self))
+        
+        if self.is_approximate:
+            return self._search_ann(queries, k, n_probe or BENCHMARK_CONFIG['ann_probes'])
+        
+        return self._search_exact(queries, k)
+    
+    def _search_exact(self, queries, k):
+        n = len(queries)
+        indices = np.empty((n, k), dtype=np.int64)
+        similarities = np.empty((n, k), dtype=np.float32)
+        
+        # bound the (chunk, library) similarity block to ~16M floats
+        chunk_size = max(1, 16_000_000 // max(1, len(self)))
+        for start in range(0, n, chunk_size):
+            sims = queries[start:start + chunk_size] @ self.embeddings.T
+            top = self._top_k(sims, k)
+            indices[start:start + chunk_size] = top
+            similarities[start:start + chunk_size] = np.take_along_axis(sims, top, axis=1)
+        
+        return indices, similarities
+    
+    def _search_ann(self, queries, k, n_probe):
+        n = len(queries)
+        n_probe = min(n_probe, len(self.centroids))
+        probes = self._top_k(queries @ self.centroids.T, n_probe)
+        
+        best_idx = np.full((n, k), -1, dtype=np.int64)
+        best_sim = np.full((n, k), -np.inf, dtype=np.float32)
+        
+        for list_id in range(len(self.centroids)):
+            rows = np.flatnonzero((probes == list_id).any(axis=1))
+            members = np.flatnonzero(self.list_ids == list_id)
+            if len(rows) == 0 or len(members) == 0:
+                continue
+            
+            candidate_idx = np.hstack([best_idx[rows], np.broadcast_to(members, (len(rows), len(members)))])
+            candidate_sim = np.hstack([best_sim[rows], queries[rows] @ self.embeddings[members].T])
+            top = self._top_k(candidate_sim, k)
+            best_idx[rows] = np.take_along_axis(candidate_idx, top, axis=1)
+            best_sim[rows] = np.take_along_axis(candidate_sim, top, axis=1)
+        
+        return best_idx, best_sim
+    
+    @staticmethod
+    def _top_k(sims, k):
+        """Column indices of the k largest values per row, best first (ties keep the lower index)"""
+        
+        if k == 1:
+            return sims.argmax(axis=1)[:, None]
+        
+        if k < sims.shape[1]:
+            part = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        else:
+            part = np.broadcast_to(np.arange(sims.shape[1]), sims.shape)
+        
+        part_sims = np.take_along_axis(sims, part, axis=1)
+        order = np.lexsort((part, -part_sims), axis=1)
+        
+        return np.take_along_axis(part, order, axis=1)
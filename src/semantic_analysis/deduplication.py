@@ -0,0 +1,148 @@
+import re
+import unicodedata
+import numpy as np
+import pandas as pd
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from config.settings import DEDUP_CONFIG
+from src.utils.instrumentation import track_count
+
+_PUNCTUATION = re.compile(r'[^\w\s]+')
+
+# rolling and multiply-shift hashing of byte shingles rely on unsigned wrap-around
+_SHINGLE_BASE = np.uint64(1099511628211)
+_BAND_MIX = np.uint64(0x9E3779B97F4A7C15)
+_BLOCK_SIZE = 1 << 18
+
+class NearDuplicateCollapser:
+    """Collapse exact and near-duplicate comments (normalized hashing, then MinHash/LSH) so each group is scored once"""
+    
+    def __init__(self, shingle_size=None, num_perm=None, bands=None, threshold=None, seed=None):
+        self.shingle_size = shingle_size or DEDUP_CONFIG['shingle_size']
+        self.num_perm = num_perm or DEDUP_CONFIG['num_perm']
+        self.bands = bands or DEDUP_CONFIG['bands']
+        self.threshold = DEDUP_CONFIG['similarity_threshold'] if threshold is None else threshold
+        if self.num_perm % self.bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        
+        rng = np.random.default_rng(DEDUP_CONFIG['seed'] if seed is None else seed)
+        self._mul = rng.integers(1, 2**32, self.num_perm, dtype=np.uint32) | np.uint32(1)
+        self._add = rng.integers(0, 2**32, self.num_perm, dtype=np.uint32)
+    
+    @staticmethod
+    def normalize(text):
+        """Case-folded NFKC text with punctuation and emoji dropped and whitespace collapsed"""
+        
+        return ' '.join(_PUNCTUATION.sub(' ', unicodedata.normalize('NFKC', str(text)).casefold()).split())
+    
+    def signatures(self, texts):
+        """(N, num_perm) MinHash signatures over byte shingles; rows shorter than one shingle are flagged in `has_shingles`"""
+        
+        encoded = [text.encode('utf-8') for text in texts]
+        n = len(encoded)
+        lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=n)
+        offsets = np.cumsum(lengths) - lengths
+        windows = np.maximum(lengths - self.shingle_size + 1, 0)
+        has_shingles = windows > 0
+        
+        signatures = np.full((n, self.num_perm), np.iinfo(np.uint32).max, dtype=np.uint32)
+        if not has_shingles.any():
+            return signatures, has_shingles
+        
+        corpus = np.frombuffer(b''.join(encoded), dtype=np.uint8).astype(np.uint64)
+        span = len(corpus) - self.shingle_size + 1
+        rolling = np.zeros(span, dtype=np.uint64)
+        for j in range(self.shingle_size):
+            rolling = rolling * _SHINGLE_BASE + corpus[j:j + span]
+        
+        # keep only windows that start and end inside the same text
+        first_window = np.cumsum(windows) - windows
+        starts = np.arange(windows.sum()) + np.repeat(offsets - first_window, windows)
+        shingles = ((rolling[starts] * _BAND_MIX) >> np.uint64(32)).astype(np.uint32)
+        
+        # one uint32 multiply-add per permutation, over blocks of whole texts small enough to stay in cache
+        rows = np.flatnonzero(has_shingles)
+        segment_starts = first_window[rows]
+        block_bounds = np.unique(np.append(np.searchsorted(segment_starts, np.arange(0, len(shingles), _BLOCK_SIZE)), len(rows)))
+        buffer = np.empty(len(shingles), dtype=np.uint32)
+        
+        for lo, hi in zip(block_bounds[:-1].tolist(), block_bounds[1:].tolist()):
+            start = segment_starts[lo]
+            stop = segment_starts[hi] if hi < len(rows) else len(shingles)
+            block, hashed = shingles[start:stop], buffer[:stop - start]
+            for p in range(self.num_perm):
+                np.multiply(block, self._mul[p], out=hashed)
+                hashed += self._add[p]
+                signatures[rows[lo:hi], p] = np.minimum.reduceat(hashed, segment_starts[lo:hi] - start)
+        
+        return signatures, has_shingles
+    
+    def group(self, texts):
+        """Representative (first occurrence) row position for every text"""
+        
+        if len(texts) == 0:
+            return np.empty(0, dtype=np.int64)
+        
+        codes, uniques = pd.factorize(pd.Series([self.normalize(text) for text in texts], dtype=object))
+        n_unique = len(uniques)
+        first_row = np.full(n_unique, len(codes), dtype=np.int64)
+        np.minimum.at(first_row, codes, np.arange(len(codes)))
+        
+        signatures, has_shingles = self.signatures(list(uniques))
+        rows_per_band = self.num_perm // self.bands
+        eligible = np.flatnonzero(has_shingles)
+        
+        sources, targets = [], []
+        for band in range(self.bands):
+            block = signatures[eligible, band * rows_per_band:(band + 1) * rows_per_band].astype(np.uint64)
+            keys = np.zeros(len(eligible), dtype=np.uint64)
+            for column in range(rows_per_band):
+                keys = (keys ^ block[:, column]) * _BAND_MIX
+            # factorize numbers buckets in order of first appearance, so each bucket's first member is its leader
+            bucket, _ = pd.factorize(keys)
+            leader_idx = np.flatnonzero(np.diff(np.maximum.accumulate(bucket), prepend=-1) > 0)
+            members, leaders = eligible, eligible[leader_idx[bucket]]
+            
+            candidates = members != leaders
+            members, leaders = members[candidates], leaders[candidates]
+            similarity = (signatures[members] == signatures[leaders]).mean(axis=1)
+            similar = similarity >= self.threshold
+            sources.append(members[similar])
+            targets.append(leaders[similar])
+        
+        sources = np.concatenate(sources) if sources else np.empty(0, dtype=np.int64)
+        targets = np.concatenate(targets) if targets else np.empty(0, dtype=np.int64)
+        graph = coo_matrix((np.ones(len(sources), dtype=np.int8), (sources, targets)), shape=(n_unique, n_unique))
+        _, component = connected_components(graph, directed=False)
+        
+        representative = np.full(component.max() + 1, len(codes), dtype=np.int64)
+        np.minimum.at(representative, component, first_row)
+        
+        return representative[component[codes]]
+    
+    def groups(self, texts):
+        """Sorted representative positions, each text's group among them and every group's size"""
+        
+        representatives, inverse = np.unique(self.group(texts), return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(representatives))
+        
+        track_count('dedup_rows_in', len(texts))
+        track_count('dedup_rows_collapsed', len(texts) - len(representatives))
+        return representatives, inverse, counts
+    
+    def collapse(self, df, text_column='body'):
+        """One row per duplicate group (with `duplicate_count`) and, per original row, its position in that frame"""
+        
+        representatives, inverse, counts = self.groups(df[text_column].tolist())
+        
+        unique_df = df.iloc[representatives].copy()
+        unique_df['duplicate_count'] = counts
+        return unique_df, inverse
+    
+    @staticmethod
+    def expand(frame, inverse, index):
+        """Fan per-group results back out to the original rows"""
+        
+        expanded = frame.iloc[inverse]
+        expanded.index = index
+        return expanded
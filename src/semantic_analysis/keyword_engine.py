@@ -0,0 +1,182 @@
+import ahocorasick
+import re
+import numpy as np
+from itertools import chain
+
+SEPARATOR = '\x00'
+
+class TextBatch:
+    """Separator-joined view of a batch of texts so every scan covers the whole batch in one pass"""
+    
+    def __init__(self, texts, lowercase=True):
+        texts = [str(text) for text in texts]
+        if lowercase:
+            texts = [text.lower() for text in texts]
+        
+        self.size = len(texts)
+        self.lengths = np.fromiter(map(len, texts), dtype=np.int64, count=self.size)
+        self.offsets = np.cumsum(self.lengths + 1) - (self.lengths + 1)
+        self.corpus = SEPARATOR.join(texts)
+    
+    def texts(self):
+        """Iterate over the (lowercased) texts of the batch"""
+        
+        for offset, length in zip(self.offsets.tolist(), self.lengths.tolist()):
+            yield self.corpus[offset:offset + length]
+    
+    def rows(self, positions):
+        """Map corpus positions back to row numbers"""
+        
+        return np.searchsorted(self.offsets, positions, side='right') - 1
+
+class KeywordCounter:
+    """Count substring occurrences of many keywords with `str.count` semantics in one automaton scan"""
+    
+    def __init__(self, keywords):
+        self.keywords = list(dict.fromkeys(keywords))
+        self.column_index = {kw: i for i, kw in enumerate(self.keywords)}
+        self._widths = np.array([len(kw) for kw in self.keywords], dtype=np.int64)
+        self._self_overlapping = np.flatnonzero([self._has_border(kw) for kw in self.keywords])
+        
+        self._automaton = ahocorasick.Automaton()
+        for i, kw in enumerate(self.keywords):
+            self._automaton.add_word(kw, i)
+        if self.keywords:
+            self._automaton.make_automaton()
+    
+    @staticmethod
+    def _has_border(keyword):
+        """True if a keyword can overlap itself (e.g. 'haha' in 'hahaha')"""
+        
+        return any(keyword[:k] == keyword[-k:] for k in range(1, len(keyword)))
+    
+    def count(self, texts):
+        """Return an (N, K) int64 matrix of keyword counts, columns ordered like `self.keywords`"""
+        
+        batch = texts if isinstance(texts, TextBatch) else TextBatch(texts)
+        counts = np.zeros((batch.size, len(self.keywords)), dtype=np.int64)
+        if batch.size == 0 or not self.keywords:
+            return counts
+        
+        hits = np.fromiter(chain.from_iterable(self._automaton.iter(batch.corpus)), dtype=np.int64).reshape(-1, 2)
+        if len(hits) == 0:
+            return counts
+        
+        keyword_ids = hits[:, 1]
+        positions = hits[:, 0] - self._widths[keyword_ids] + 1
+        keep = np.ones(len(hits), dtype=bool)
+        
+        # str.count never counts a keyword overlapping its previous occurrence; only runs of
+        # overlapping hits need the sequential check
+        for kw_id in self._self_overlapping:
+            idx = np.flatnonzero(keyword_ids == kw_id)
+            overlapping = np.flatnonzero(np.diff(positions[idx]) < self._widths[kw_id])
+            if len(overlapping) == 0:
+                continue
+            
+            next_free = -1
+            for j in idx[np.union1d(overlapping, overlapping + 1)].tolist():
+                if positions[j] < next_free:
+                    keep[j] = False
+                else:
+                    next_free = positions[j] + self._widths[kw_id]
+        
+        np.add.at(counts, (batch.rows(positions[keep]), keyword_ids[keep]), 1)
+        
+        return counts
+
+class PatternCounter:
+    """Count matches of several named regex patterns with `re.findall` semantics in one shared scan"""
+    
+    # \b(word|word|...)\b patterns go through one shared automaton; anything else falls back to re.findall
+    LITERAL_ALTERNATION = re.compile(r'^\\b\((?:\?:)?([^()\[\]\\|.*+?{}^$]+(?:\|[^()\[\]\\|.*+?{}^$]+)*)\)\\b$')
+    
+    def __init__(self, patterns):
+        self.names = list(patterns)
+        self.patterns = dict(patterns)
+        self._fallback = {}
+        
+        words = []
+        self._word_category = []
+        self._word_rank = []
+        for category_id, pattern in enumerate(self.patterns.values()):
+            literal = self.LITERAL_ALTERNATION.match(pattern)
+            if literal is None:
+                self._fallback[category_id] = re.compile(pattern)
+                continue
+            for rank, word in enumerate(literal.group(1).split('|')):
+                words.append(word)
+                self._word_category.append(category_id)
+                self._word_rank.append(rank)
+        
+        self._word_category = np.array(self._word_category, dtype=np.int64)
+        self._word_rank = np.array(self._word_rank, dtype=np.int64)
+        self._widths = np.array([len(word) for word in words], dtype=np.int64)
+        self._starts_with_word = np.array([_is_word_char(word[0]) for word in words], dtype=bool)
+        self._ends_with_word = np.array([_is_word_char(word[-1]) for word in words], dtype=bool)
+        
+        self._automaton = ahocorasick.Automaton()
+        for i, word in enumerate(words):
+            if word in self._automaton:
+                self._automaton.get(word).append(i)
+            else:
+                self._automaton.add_word(word, [i])
+        if words:
+            self._automaton.make_automaton()
+    
+    def count(self, texts):
+        """Return an (N, P) int64 matrix of match counts, columns ordered like `self.names`"""
+        
+        batch = texts if isinstance(texts, TextBatch) else TextBatch(texts)
+        counts = np.zeros((batch.size, len(self.names)), dtype=np.int64)
+        if batch.size == 0:
+            return counts
+        
+        if len(self._widths):
+            self._count_literals(batch, counts)
+        
+        for category_id, regex in self._fallback.items():
+            for row, text in enumerate(batch.texts()):
+                counts[row, category_id] = len(regex.findall(text))
+        
+        return counts
+    
+    def _count_literals(self, batch, counts):
+        corpus = batch.corpus
+        hits = [(end, i) for end, word_ids in self._automaton.iter(corpus) for i in word_ids]
+        if not hits:
+            return
+        
+        hits = np.array(hits, dtype=np.int64)
+        word_ids = hits[:, 1]
+        ends = hits[:, 0] + 1
+        starts = ends - self._widths[word_ids]
+        
+        # \b on both sides: the neighbouring character must differ in word-ness from the edge of the match
+        before = np.fromiter((_is_word_char(corpus[s - 1]) if s > 0 else False for s in starts.tolist()), dtype=bool, count=len(starts))
+        after = np.fromiter((_is_word_char(corpus[e]) if e < len(corpus) else False for e in ends.tolist()), dtype=bool, count=len(ends))
+        valid = (before != self._starts_with_word[word_ids]) & (after != self._ends_with_word[word_ids])
+        
+        categories = self._word_category[word_ids]
+        keep = np.zeros(len(hits), dtype=bool)
+        for category_id in np.unique(categories[valid]):
+            idx = np.flatnonzero(valid & (categories == category_id))
+            idx = idx[np.lexsort((self._word_rank[word_ids[idx]], starts[idx]))]
+            
+            # findall takes the leftmost match (first alternative on ties) and resumes after it
+            if np.all(starts[idx][1:] >= ends[idx][:-1]):
+                keep[idx] = True
+                continue
+            
+            next_free = -1
+            for j in idx.tolist():
+                if starts[j] >= next_free:
+                    keep[j] = True
+                    next_free = ends[j]
+        
+        np.add.at(counts, (batch.rows(starts[keep]), categories[keep]), 1)
+
+def _is_word_char(char):
+    """Mirror the re module's Unicode definition of \\w"""
+    
+    return char.isalnum() or char == '_'
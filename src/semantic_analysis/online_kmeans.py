@@ -0,0 +1,88 @@
+import os
+import numpy as np
+from sklearn.cluster import kmeans_plusplus
+
+class OnlineKMeans:
+    """Mini-batch k-means whose centroids and per-centroid counts persist between runs
+
+    Each centroid moves towards the mean of the points assigned to it with step size
+    n_batch / n_total, so a warm-started model keeps the learning rate it had when it was saved
+    and cluster ids stay stable across runs.
+    """
+    
+    def __init__(self, n_clusters, batch_size=1024, random_state=42, centroids=None, counts=None):
+        self.n_clusters = n_clusters
+        self.batch_size = batch_size
+        self.random_state = random_state
+        self.centroids = None if centroids is None else np.asarray(centroids, dtype=np.float64)
+        self.counts = None if counts is None else np.asarray(counts, dtype=np.float64)
+    
+    @property
+    def is_fitted(self):
+        return self.centroids is not None
+    
+    def _initialize(self, X):
+        if len(X) < self.n_clusters:
+            raise ValueError(f"Need at least {self.n_clusters} rows to initialize {self.n_clusters} clusters, got {len(X)}")
+        
+        self.centroids, _ = kmeans_plusplus(X, self.n_clusters, random_state=self.random_state)
+        self.counts = np.zeros(self.n_clusters, dtype=np.float64)
+    
+    def partial_fit(self, X):
+        """Update centroids with every mini-batch of X; initializes with k-means++ on the first call"""
+        
+        X = np.asarray(X, dtype=np.float64)
+        if len(X) == 0:
+            return self
+        if not self.is_fitted:
+            self._initialize(X)
+        
+        for start in range(0, len(X), self.batch_size):
+            batch = X[start:start + self.batch_size]
+            labels = self.predict(batch)
+            
+            batch_counts = np.bincount(labels, minlength=self.n_clusters).astype(np.float64)
+            sums = np.zeros_like(self.centroids)
+            np.add.at(sums, labels, batch)
+            
+            updated = batch_counts > 0
+            self.counts[updated] += batch_counts[updated]
+            self.centroids[updated] += (sums[updated] - batch_counts[updated, None] * self.centroids[updated]) / self.counts[updated, None]
+        
+        return self
+    
+    def predict(self, X):
+        """Nearest centroid per row in O(N·k), chunked to bound the distance block"""
+        
+        X = np.asarray(X, dtype=np.float64)
+        labels = np.empty(len(X), dtype=np.int64)
+        centroid_norms = (self.centroids ** 2).sum(axis=1)
+        
+        chunk_size = max(1, 4_000_000 // self.n_clusters)
+        for start in range(0, len(X), chunk_size):
+            chunk = X[start:start + chunk_size]
+            # ||x||^2 is constant per row and does not change the argmin
+            labels[start:start + chunk_size] = (centroid_norms - 2 * chunk @ self.centroids.T).argmin(axis=1)
+        
+        return labels
+    
+    def save(self, path):
+        """Write centroids and counts atomically so an interrupted run never leaves a partial state file"""
+        
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, centroids=self.centroids, counts=self.counts)
+        os.replace(tmp_path, path)
+        
+        return path
+    
+    @classmethod
+    def load(cls, path, batch_size=1024, random_state=42):
+        with np.load(path, allow_pickle=False) as data:
+            centroids, counts = data['centroids'], data['counts']
+        
+        return cls(len(centroids), batch_size, random_state, centroids, counts)
@@ -2,11 +2,15 @@ import pandas as pd
 import numpy as np
 import re
 from config.settings import SEMANTIC_THRESHOLDS
+from src.semantic_analysis.keyword_engine import KeywordCounter
+from src.semantic_analysis.text_features import keyword_column
 
 class SemanticScorer:
     def __init__(self):
         self.financial_keywords = ['buy', 'invest', 'hold', 'long', 'bullish', 'calls', 'puts', 'position', 'portfolio', 'stake']
         self.humor_keywords = ['lol', 'lmao', 'haha', 'joke', 'jk', 'kidding', 'ironic', 'sarcasm']
+        self.text_keywords = self.financial_keywords + self.humor_keywords
+        self.keyword_counter = KeywordCounter(self.text_keywords)
         
     def calculate_meme_seriousness_threshold(self, text):
         """Calculate ratio of financial vs humor keywords (0-1 scale)"""
@@ -29,7 +33,9 @@ class SemanticScorer:
             financial_count = sum(text_lower.count(kw) for kw in self.financial_keywords)
             humor_count = sum(text_lower.count(kw) for kw in self.humor_keywords)
         
-        if humor_count == 0 and financial_count > 0:
+        if financial_count + humor_count == 0:
+            return 0.5
+        elif humor_count == 0 and financial_count > 0:
             return 0.9
         elif humor_count > financial_count * 2:
             return 0.1
@@ -38,27 +44,48 @@ class SemanticScorer:
         else:
             return 0.3 + (financial_count / (financial_count + humor_count)) * 0.4
     
-    def process_batch(self, texts):
-        """Process batch of texts and return semantic scores"""
+    def count_keywords(self, texts, features=None):
+        """Count financial and humor keywords for every text in a single scan"""
         
-        results = []
+        if features is not None:
+            counts = features[[keyword_column(kw) for kw in self.text_keywords]].to_numpy(dtype=np.int64)
+        else:
+            counts = self.keyword_counter.count(texts)
+        n_financial = len(self.financial_keywords)
         
-        for text in texts:
-            text_lower = text.lower()
-            financial_count = sum(text_lower.count(kw) for kw in self.financial_keywords)
-            humor_count = sum(text_lower.count(kw) for kw in self.humor_keywords)
-            
-            mst = self.calculate_meme_seriousness_threshold(text)
-            ici = self.calculate_irony_collapse_index(text, financial_count, humor_count)
-            
-            results.append({
-                'seriousness_threshold': min(1.0, max(0.0, mst)),
-                'irony_collapse_index': min(1.0, max(0.0, ici)),
-                'financial_keywords_count': financial_count,
-                'humor_keywords_count': humor_count
-            })
+        return counts[:, :n_financial].sum(axis=1), counts[:, n_financial:].sum(axis=1)
+    
+    def score_counts(self, financial_count, humor_count):
+        """Vectorized MST and ICI from keyword count arrays"""
+        
+        financial_count = np.asarray(financial_count, dtype=np.int64)
+        humor_count = np.asarray(humor_count, dtype=np.int64)
+        total = financial_count + humor_count
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = np.where(total > 0, financial_count / total, 0.5)
+        
+        mst = ratio
+        ici = np.select(
+            [total == 0, (humor_count == 0) & (financial_count > 0), humor_count > financial_count * 2, financial_count > humor_count],
+            [0.5, 0.9, 0.1, 0.7 + ratio * 0.3],
+            default=0.3 + ratio * 0.4
+        )
+        
+        return np.clip(mst, 0.0, 1.0), np.clip(ici, 0.0, 1.0)
+    
+    def process_batch(self, texts, features=None):
+        """Process batch of texts and return semantic scores"""
+        
+        financial_count, humor_count = self.count_keywords(texts, features)
+        mst, ici = self.score_counts(financial_count, humor_count)
         
-        return pd.DataFrame(results)
+        return pd.DataFrame({
+            'seriousness_threshold': mst,
+            'irony_collapse_index': ici,
+            'financial_keywords_count': financial_count,
+            'humor_keywords_count': humor_count
+        })
 
 if __name__ == "__main__":
     scorer = SemanticScorer()
@@ -0,0 +1,156 @@
+import sqlite3
+import pandas as pd
+import numpy as np
+from config.settings import INTENT_MARKERS
+
+DIALECTS = {
+    'bigquery': {'float': 'FLOAT64', 'int': 'INT64', 'strpos': 'STRPOS({text}, {needle})'},
+    'duckdb': {'float': 'DOUBLE', 'int': 'BIGINT', 'strpos': 'strpos({text}, {needle})'},
+    'sqlite': {'float': 'REAL', 'int': 'INTEGER', 'strpos': 'INSTR({text}, {needle})'}
+}
+
+class SQLRuleCompiler:
+    """Generate SQL expressions for the Python keyword, marker and MST/ICI rules"""
+    
+    def __init__(self, dialect='bigquery', text_column='body'):
+        if dialect not in DIALECTS:
+            raise ValueError(f"Unsupported SQL dialect: {dialect}")
+        
+        self.dialect = dialect
+        self.types = DIALECTS[dialect]
+        self.text_column = text_column
+        self.text = f"LOWER({text_column})"
+    
+    def literal(self, value):
+        """Quote a string literal for the dialect"""
+        
+        if self.dialect == 'bigquery':
+            escaped = value.replace('\\', '\\\\').replace("'", "\\'")
+        else:
+            escaped = value.replace("'", "''")
+        return f"'{escaped}'"
+    
+    def keyword_count(self, keyword):
+        """Non-overlapping occurrences of `keyword`; REPLACE scans left to right exactly like str.count"""
+        
+        needle = self.literal(keyword)
+        removed = f"LENGTH({self.text}) - LENGTH(REPLACE({self.text}, {needle}, ''))"
+        return f"CAST(({removed}) / {len(keyword)} AS {self.types['int']})"
+    
+    def keyword_total(self, keywords):
+        return "(" + " + ".join(self.keyword_count(kw) for kw in keywords) + ")"
+    
+    def contains_any(self, keywords):
+        """1 if any keyword occurs in the text, else 0"""
+        
+        checks = " OR ".join(
+            self.types['strpos'].format(text=self.text, needle=self.literal(kw)) + " > 0" for kw in keywords
+        )
+        return f"CASE WHEN {checks} THEN 1 ELSE 0 END"
+    
+    def like_any(self, terms):
+        """Row filter matching any term as a substring"""
+        
+        return "(" + "\n            OR ".join(f"{self.text} LIKE {self.literal('%' + term + '%')}" for term in terms) + ")"
+    
+    def marker_columns(self, markers=None):
+        """Select-list entries for every intent marker"""
+        
+        markers = INTENT_MARKERS if markers is None else markers
+        return [f"{self.contains_any(keywords)} as {name}" for name, keywords in markers.items()]
+    
+    def count_columns(self, scorer):
+        return [
+            f"{self.keyword_total(scorer.financial_keywords)} as financial_keywords_count",
+            f"{self.keyword_total(scorer.humor_keywords)} as humor_keywords_count"
+        ]
+    
+    def score_columns(self, financial='financial_keywords_count', humor='humor_keywords_count'):
+        """MST and ICI from count columns, mirroring SemanticScorer.score_counts"""
+        
+        total = f"({financial} + {humor})"
+        ratio = f"(CAST({financial} AS {self.types['float']}) / {total})"
+        
+        seriousness = f"CASE WHEN {total} = 0 THEN 0.5 ELSE {ratio} END as seriousness_threshold"
+        irony = (
+            f"CASE WHEN {total} = 0 THEN 0.5 "
+            f"WHEN {humor} = 0 AND {financial} > 0 THEN 0.9 "
+            f"WHEN {humor} > {financial} * 2 THEN 0.1 "
+            f"WHEN {financial} > {humor} THEN 0.7 + {ratio} * 0.3 "
+            f"ELSE 0.3 + {ratio} * 0.4 END as irony_collapse_index"
+        )
+        return [seriousness, irony]
+    
+    def scoring_query(self, source, scorer, columns=(), markers=None):
+        """Score every row of `source` (a table name or parenthesised subquery) in the warehouse
+        
+        Only `columns` plus the marker, keyword-count and MST/ICI columns are returned, so the
+        raw text never has to leave the warehouse.
+        """
+        
+        passthrough = [f"{column}," for column in columns]
+        inner = passthrough + [f"{c}," for c in self.marker_columns(markers)] + [
+            ",\n            ".join(self.count_columns(scorer))
+        ]
+        inner_list = "\n            ".join(inner)
+        outer_list = ",\n          ".join(["*"] + self.score_columns())
+        
+        return f"""
+        WITH keyword_counts AS (
+          SELECT
+            {inner_list}
+          FROM {source}
+        )
+        SELECT
+          {outer_list}
+        FROM keyword_counts
+        """
+
+def python_markers(texts, markers=None):
+    """Reference implementation of the intent markers, for parity checks"""
+    
+    markers = INTENT_MARKERS if markers is None else markers
+    lowered = [str(text).lower() for text in texts]
+    return pd.DataFrame({
+        name: [int(any(kw in text for kw in keywords)) for text in lowered] for name, keywords in markers.items()
+    })
+
+def check_parity(texts, scorer, markers=None, connection=None):
+    """Run the compiled rules on a local SQL engine and compare them with the Python scorer
+    
+    Uses DuckDB when it is installed and sqlite3 otherwise. SQLite's LOWER only folds ASCII,
+    so parity there is only meaningful for ASCII text. Returns the mismatching rows (empty
+    when both sides agree).
+    """
+    
+    texts = [str(text) for text in texts]
+    frame = pd.DataFrame({'row_id': np.arange(len(texts)), 'body': texts})
+    
+    if connection is None:
+        try:
+            import duckdb
+            connection = duckdb.connect()
+        except ImportError:
+            connection = sqlite3.connect(':memory:')
+    
+    if isinstance(connection, sqlite3.Connection):
+        dialect = 'sqlite'
+        frame.to_sql('comments', connection, index=False)
+        run = lambda query: pd.read_sql_query(query, connection)
+    else:
+        dialect = 'duckdb'
+        connection.register('comments', frame)
+        run = lambda query: connection.execute(query).df()
+    
+    compiler = SQLRuleCompiler(dialect)
+    query = compiler.scoring_query('comments', scorer, columns=['row_id'], markers=markers) + " ORDER BY row_id"
+    sql_result = run(query).drop(columns='row_id')
+    
+    expected = scorer.process_batch(texts).join(python_markers(texts, markers))
+    sql_result = sql_result[expected.columns]
+    
+    mismatched = np.zeros(len(texts), dtype=bool)
+    for column in expected.columns:
+        mismatched |= ~np.isclose(sql_result[column].to_numpy(dtype=np.float64), expected[column].to_numpy(dtype=np.float64), rtol=0, atol=1e-12)
+    
+    return frame[mismatched].assign(**{f'sql_{c}': sql_result[c][mismatched] for c in expected.columns})
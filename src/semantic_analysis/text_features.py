@@ -0,0 +1,105 @@
+import re
+import numpy as np
+import pandas as pd
+from src.semantic_analysis.keyword_engine import KeywordCounter, PatternCounter, TextBatch
+
+def keyword_column(keyword):
+    """Feature-table column holding the substring count of a keyword"""
+    
+    return f'kw_{keyword}'
+
+def pattern_column(name):
+    """Feature-table column holding the match count of a named pattern"""
+    
+    return f'pat_{name}'
+
+def uppercase_counts(batch):
+    """Per-text count of characters with `str.isupper()`, from the batch's code points in one NumPy pass"""
+    
+    codepoints = np.frombuffer(batch.corpus.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+    positions = np.flatnonzero((codepoints >= 65) & (codepoints <= 90))
+    
+    # non-ASCII uppercase (É, Σ, ...) is decided once per distinct code point
+    non_ascii = np.flatnonzero(codepoints >= 128)
+    if len(non_ascii):
+        distinct = np.unique(codepoints[non_ascii])
+        upper = distinct[np.fromiter((chr(cp).isupper() for cp in distinct.tolist()), dtype=bool, count=len(distinct))]
+        if len(upper):
+            positions = np.sort(np.concatenate([positions, non_ascii[np.isin(codepoints[non_ascii], upper)]]))
+    
+    return np.searchsorted(positions, batch.offsets + batch.lengths) - np.searchsorted(positions, batch.offsets)
+
+def regex_counts(texts, patterns, ascii_rows=None):
+    """Per-text `len(re.findall(pattern, text.lower()))` for every named pattern, over a list of strings
+    
+    ASCII texts are lowered once and counted with Arrow's vectorized kernels. The rest fall back to `re`, since RE2's
+    ASCII-only `\\b` and Arrow's case mapping can disagree with Python on non-ASCII letters.
+    """
+    
+    if ascii_rows is None:
+        ascii_rows = np.fromiter(map(str.isascii, texts), dtype=bool, count=len(texts))
+    
+    counts = {name: np.zeros(len(texts), dtype=np.int64) for name in patterns}
+    if ascii_rows.any():
+        lowered = pd.Series([text for text, ascii in zip(texts, ascii_rows) if ascii], dtype='string[pyarrow]').str.lower()
+        for name, pattern in patterns.items():
+            counts[name][ascii_rows] = lowered.str.count(pattern).to_numpy(dtype=np.int64)
+    
+    rows = np.flatnonzero(~ascii_rows).tolist()
+    for name, pattern in patterns.items():
+        compiled = re.compile(pattern)
+        counts[name][rows] = [len(compiled.findall(texts[row].lower())) for row in rows]
+    
+    return counts
+
+class TextFeatureExtractor:
+    """Scan each comment a fixed number of times and expose a columnar feature table for all scorers"""
+    
+    def __init__(self, keywords=(), patterns=None):
+        self.keywords = list(dict.fromkeys(keywords))
+        self.patterns = dict(patterns or {})
+        self.keyword_counter = KeywordCounter(self.keywords + ['!', '$'])
+        self.pattern_counter = PatternCounter(self.patterns)
+    
+    @classmethod
+    def for_components(cls, *components):
+        """Collect `text_keywords` and `text_patterns` from every downstream consumer"""
+        
+        keywords = []
+        patterns = {}
+        for component in components:
+            keywords.extend(getattr(component, 'text_keywords', []))
+            for name, pattern in getattr(component, 'text_patterns', {}).items():
+                if patterns.get(name, pattern) != pattern:
+                    raise ValueError(f"Conflicting definitions for text pattern '{name}'")
+                patterns[name] = pattern
+        
+        return cls(keywords, patterns)
+    
+    def extract(self, texts, index=None):
+        """Build the feature table: keyword counts, pattern counts and character statistics"""
+        
+        texts = [str(text) for text in texts]
+        n = len(texts)
+        
+        lowered = TextBatch(texts)
+        original = TextBatch(texts, lowercase=False)
+        
+        keyword_counts = self.keyword_counter.count(lowered)
+        pattern_counts = self.pattern_counter.count(lowered)
+        
+        caps_runs = np.zeros(n, dtype=np.int64)
+        positions = [m.start() for m in re.finditer(r'[A-Z]{2,}', original.corpus)]
+        if positions:
+            np.add.at(caps_runs, original.rows(np.array(positions, dtype=np.int64)), 1)
+        
+        columns = {keyword_column(kw): keyword_counts[:, i] for i, kw in enumerate(self.keywords)}
+        columns.update({pattern_column(name): pattern_counts[:, i] for i, name in enumerate(self.pattern_counter.names)})
+        columns['exclamation_count'] = keyword_counts[:, self.keyword_counter.column_index['!']]
+        columns['dollar_count'] = keyword_counts[:, self.keyword_counter.column_index['$']]
+        columns['caps_run_count'] = caps_runs
+        columns['uppercase_count'] = uppercase_counts(original)
+        columns['word_count'] = np.fromiter((len(text.split()) for text in texts), dtype=np.int64, count=n)
+        columns['char_length'] = original.lengths
+        
+        return pd.DataFrame(columns, index=index)
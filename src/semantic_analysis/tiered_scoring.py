@@ -0,0 +1,88 @@
+import numpy as np
+from config.settings import TIERED_SCORING_CONFIG
+from src.semantic_analysis.semantic_scoring import SemanticScorer
+from src.utils.instrumentation import track_count
+
+class TieredScorer:
+    """Heuristic scores for every text; only ambiguous texts are escalated to Gemini"""
+    
+    def __init__(self, heuristic=None, llm=None, config=None):
+        self.heuristic = heuristic or SemanticScorer()
+        self._llm = llm
+        self.config = dict(TIERED_SCORING_CONFIG, **(config or {}))
+        self.text_keywords = self.heuristic.text_keywords
+        self.last_stats = None
+    
+    @property
+    def llm(self):
+        if self._llm is None:
+            from src.semantic_analysis.vertex_ai_gemini import GeminiAnalyzer
+            self._llm = GeminiAnalyzer()
+        return self._llm
+    
+    def uncertainty(self, results):
+        """Number of ambiguity rules each heuristic row trips (MST near 0.5, no keyword hits, ICI in the middle band)"""
+        
+        mst = results['seriousness_threshold'].to_numpy(dtype=np.float64)
+        ici = results['irony_collapse_index'].to_numpy(dtype=np.float64)
+        hits = (results['financial_keywords_count'] + results['humor_keywords_count']).to_numpy()
+        low, high = self.config['ici_band']
+        
+        rules = np.abs(mst - 0.5) <= self.config['mst_margin']
+        rules = rules.astype(np.int64) + ((low < ici) & (ici < high))
+        if self.config['escalate_without_keywords']:
+            rules += hits == 0
+        
+        return rules
+    
+    def select_escalations(self, results):
+        """Row positions to send to Gemini, capped at `max_escalation_rate` and most ambiguous first"""
+        
+        rules = self.uncertainty(results)
+        candidates = np.flatnonzero(rules > 0)
+        
+        budget = int(self.config['max_escalation_rate'] * len(results))
+        if len(candidates) > budget:
+            closeness = np.abs(results['seriousness_threshold'].to_numpy(dtype=np.float64)[candidates] - 0.5)
+            order = np.lexsort((candidates, closeness, -rules[candidates]))
+            candidates = np.sort(candidates[order[:budget]])
+        
+        return candidates, int((rules > 0).sum())
+    
+    def process_batch(self, texts, features=None):
+        """Same columns as `SemanticScorer.process_batch`, plus `escalated` and `score_source`"""
+        
+        texts = [str(text) for text in texts]
+        results = self.heuristic.process_batch(texts, features)
+        results['escalated'] = False
+        results['score_source'] = 'heuristic'
+        
+        escalate, uncertain = self.select_escalations(results)
+        failed = 0
+        if len(escalate):
+            llm_scores = self.llm.analyze_batch([texts[i] for i in escalate])
+            results.iloc[escalate, results.columns.get_loc('escalated')] = True
+            
+            # Gemini's neutral fallback rows carry no signal, so those texts keep their heuristic scores
+            answered = llm_scores['gemini_source'].to_numpy(dtype=object) != 'default'
+            failed = int((~answered).sum())
+            rows, llm_scores = escalate[answered], llm_scores[answered]
+            for column in ['seriousness_threshold', 'irony_collapse_index']:
+                results.iloc[rows, results.columns.get_loc(column)] = llm_scores[column].to_numpy()
+            results.iloc[rows, results.columns.get_loc('score_source')] = 'gemini_' + llm_scores['gemini_source'].to_numpy(dtype=object)
+        
+        self.last_stats = {
+            'texts': len(texts),
+            'uncertain': uncertain,
+            'escalated': len(escalate),
+            'llm_failed': failed,
+            'escalation_rate': len(escalate) / len(texts) if texts else 0.0
+        }
+        track_count('tiered_texts', len(texts))
+        track_count('tiered_uncertain', uncertain)
+        track_count('tiered_escalated', len(escalate))
+        track_count('tiered_llm_failed', failed)
+        print(f"Escalated {len(escalate)} of {len(texts)} texts to Gemini "
+              f"({self.last_stats['escalation_rate']:.1%}; {uncertain} ambiguous; {failed} kept heuristic scores)")
+        
+        return results
@@ -1,8 +1,12 @@
 import numpy as np
 import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.cluster import KMeans
+import os
 import re
+from config.settings import BENCHMARK_CONFIG, CLUSTERING_CONFIG
+from src.semantic_analysis.benchmark_index import BenchmarkIndex
+from src.semantic_analysis.online_kmeans import OnlineKMeans
+from src.semantic_analysis.text_features import TextFeatureExtractor, keyword_column
 
 class VectorClusterer:
     def __init__(self):
@@ -28,6 +32,12 @@ class VectorClusterer:
                 'category': 'cryptocurrency'
             }
         }
+        self.rate_keywords = ['buy', 'invest', 'hold', 'moon', 'diamond', 'hands', 'ape', 'stonk', 'rocket', 'gain', 'loss']
+        self.presence_keywords = ['crypto', 'stock', 'nft']
+        self.text_keywords = self.rate_keywords + self.presence_keywords
+        self.text_extractor = TextFeatureExtractor(self.text_keywords)
+        self.benchmark_index = None
+        self.cluster_model = None
         
     def create_feature_vector(self, text, seriousness=0.5, ici=0.5):
         """Create 20-dimensional feature vector"""
@@ -58,67 +68,180 @@ class VectorClusterer:
         
         return np.array(features, dtype=np.float32)
     
-    def find_lookalikes(self, df):
-        """Find historical lookalikes for current memes"""
+    def featurize(self, texts, seriousness=0.5, ici=0.5, features=None):
+        """Build the (N, 20) float32 feature matrix for a batch of texts in one pass"""
+        
+        if features is None:
+            features = self.text_extractor.extract(texts)
+        
+        def count(keyword):
+            return features[keyword_column(keyword)].to_numpy(dtype=np.int64)
+        
+        denominator = features['char_length'].to_numpy(dtype=np.int64) + 1
+        
+        matrix = np.empty((len(features), 20), dtype=np.float64)
+        matrix[:, 0] = seriousness
+        matrix[:, 1] = ici
+        for i, keyword in enumerate(self.rate_keywords[:8]):
+            matrix[:, 2 + i] = count(keyword) / denominator
+        matrix[:, 10] = features['word_count'].to_numpy(dtype=np.int64) / 100
+        matrix[:, 11] = features['caps_run_count'].to_numpy(dtype=np.int64) / denominator
+        matrix[:, 12] = features['exclamation_count'].to_numpy(dtype=np.int64) / denominator
+        matrix[:, 13] = features['dollar_count'].to_numpy(dtype=np.int64) / denominator
+        for i, keyword in enumerate(self.presence_keywords):
+            matrix[:, 14 + i] = count(keyword) > 0
+        for i, keyword in enumerate(self.rate_keywords[8:]):
+            matrix[:, 17 + i] = count(keyword) / denominator
+        
+        return matrix.astype(np.float32)
+    
+    def build_feature_matrix(self, df, features=None):
+        """Feature matrix for a dataframe from its body, seriousness and ICI columns"""
         
-        benchmark_embeddings = []
-        benchmark_labels = []
+        seriousness = df['seriousness_threshold'].to_numpy(dtype=np.float64) if 'seriousness_threshold' in df.columns else 0.5
+        ici = df['irony_collapse_index'].to_numpy(dtype=np.float64) if 'irony_collapse_index' in df.columns else 0.5
         
-        for name, data in self.historical_benchmarks.items():
-            vector = self.create_feature_vector(data['text'], 0.9, 0.85)
-            benchmark_embeddings.append(vector)
-            benchmark_labels.append(name)
+        return self.featurize(df['body'].tolist(), seriousness, ici, features)
+    
+    def load_benchmark_index(self, library_path=None, index_path=None, rebuild=False, ann=None):
+        """Load the persisted benchmark index, rebuilding it when the library file is newer"""
+        
+        library_path = library_path or BENCHMARK_CONFIG['library_path']
+        index_path = index_path or BENCHMARK_CONFIG['index_path']
+        library_exists = os.path.exists(library_path)
+        
+        index_is_fresh = os.path.exists(index_path) and (
+            not library_exists or os.path.getmtime(index_path) >= os.path.getmtime(library_path)
+        )
+        
+        if index_is_fresh and not rebuild:
+            self.benchmark_index = BenchmarkIndex.load(index_path)
+        elif library_exists:
+            library = BenchmarkIndex.read_library(library_path)
+            self.benchmark_index = BenchmarkIndex.build(library, self.featurize, ann=ann)
+            self.benchmark_index.save(index_path)
+        else:
+            library = pd.DataFrame([
+                {'name': name, **data} for name, data in self.historical_benchmarks.items()
+            ])
+            self.benchmark_index = BenchmarkIndex.build(library, self.featurize, ann=ann)
+        
+        print(f"Benchmark index ready: {len(self.benchmark_index)} historical episodes")
+        return self.benchmark_index
+    
+    def get_benchmark_index(self):
+        """Benchmark index, loaded on first use"""
         
-        benchmark_embeddings = np.array(benchmark_embeddings)
+        if self.benchmark_index is None:
+            self.load_benchmark_index()
         
-        current_embeddings = []
-        for _, row in df.iterrows():
-            vector = self.create_feature_vector(
-                row['body'],
-                row.get('seriousness_threshold', 0.5),
-                row.get('irony_collapse_index', 0.5)
-            )
-            current_embeddings.append(vector)
+        return self.benchmark_index
+    
+    def find_top_lookalikes(self, df, k=None, feature_matrix=None):
+        """Top-k historical lookalikes per meme as a long frame (one row per meme and rank)"""
+        
+        k = k or BENCHMARK_CONFIG['top_k']
+        index = self.get_benchmark_index()
+        
+        if feature_matrix is None:
+            feature_matrix = self.build_feature_matrix(df)
+        
+        indices, similarities = index.search(feature_matrix, k=k)
+        found = indices >= 0
+        rows, ranks = np.nonzero(found)
+        matched = indices[found]
+        similarity = similarities[found].astype(np.float64)
+        
+        return pd.DataFrame({
+            'meme_index': df.index.to_numpy()[rows],
+            'rank': ranks + 1,
+            'lookalike': index.names[matched],
+            'category': index.categories[matched],
+            'similarity': similarity,
+            'estimated_market_impact': similarity * index.market_impact[matched]
+        })
+    
+    def find_lookalikes(self, df, feature_matrix=None):
+        """Find historical lookalikes for current memes"""
+        
+        index = self.get_benchmark_index()
         
-        current_embeddings = np.array(current_embeddings)
+        if feature_matrix is None:
+            feature_matrix = self.build_feature_matrix(df)
         
-        similarity_matrix = cosine_similarity(current_embeddings, benchmark_embeddings)
+        indices, similarities = index.search(feature_matrix, k=1)
+        
+        # ANN probes can land only on empty lists; search those rows across every list instead
+        unmatched = np.flatnonzero(indices[:, 0] < 0)
+        if len(unmatched):
+            indices[unmatched], similarities[unmatched] = index.search(
+                np.asarray(feature_matrix)[unmatched], k=1, n_probe=len(index.centroids)
+            )
         
-        df['best_lookalike'] = ''
-        df['lookalike_similarity'] = 0.0
-        df['estimated_market_impact'] = 0.0
+        best_match_idx = indices[:, 0]
+        similarity_score = similarities[:, 0].astype(np.float64)
         
-        for i in range(len(similarity_matrix)):
-            best_match_idx = np.argmax(similarity_matrix[i])
-            similarity_score = similarity_matrix[i][best_match_idx]
-            
-            matched_benchmark = benchmark_labels[best_match_idx]
-            impact = self.historical_benchmarks[matched_benchmark]['market_impact']
-            
-            df.loc[df.index[i], 'best_lookalike'] = matched_benchmark
-            df.loc[df.index[i], 'lookalike_similarity'] = similarity_score
-            df.loc[df.index[i], 'estimated_market_impact'] = similarity_score * impact
+        df['best_lookalike'] = index.names.astype(object).take(best_match_idx)
+        df['lookalike_similarity'] = similarity_score
+        df['estimated_market_impact'] = similarity_score * index.market_impact.take(best_match_idx)
         
         return df
     
-    def perform_clustering(self, df, n_clusters=6):
-        """Perform K-means clustering"""
-        
-        vectors = []
-        for _, row in df.iterrows():
-            vector = self.create_feature_vector(
-                row['body'],
-                row.get('seriousness_threshold', 0.5),
-                row.get('irony_collapse_index', 0.5)
-            )
-            vectors.append(vector)
+    def perform_clustering(self, df, n_clusters=6, feature_matrix=None, incremental=False, state_path=None):
+        """Perform K-means clustering
+        
+        With `incremental=True` the persisted mini-batch model is warm-started, updated with this
+        frame only and saved again, so repeated runs keep consistent cluster ids.
+        """
+        
+        if feature_matrix is None:
+            feature_matrix = self.build_feature_matrix(df)
         
-        vectors = np.array(vectors)
+        if incremental:
+            df['cluster'] = self.update_clusters(feature_matrix, n_clusters, state_path)
+            return df
         
         kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-        df['cluster'] = kmeans.fit_predict(vectors)
+        df['cluster'] = kmeans.fit_predict(feature_matrix)
         
         return df
+    
+    def load_cluster_model(self, n_clusters=None, state_path=None):
+        """Persisted online k-means model, or an untrained one when no state exists yet"""
+        
+        n_clusters = n_clusters or CLUSTERING_CONFIG['n_clusters']
+        state_path = state_path or CLUSTERING_CONFIG['state_path']
+        
+        if os.path.exists(state_path):
+            model = OnlineKMeans.load(state_path, CLUSTERING_CONFIG['batch_size'], CLUSTERING_CONFIG['random_state'])
+            if model.n_clusters != n_clusters:
+                raise ValueError(f"Cluster state at {state_path} has {model.n_clusters} clusters, expected {n_clusters}")
+            print(f"Warm-starting {n_clusters} clusters from {state_path} ({int(model.counts.sum())} comments seen)")
+        else:
+            model = OnlineKMeans(n_clusters, CLUSTERING_CONFIG['batch_size'], CLUSTERING_CONFIG['random_state'])
+        
+        self.cluster_model = model
+        return model
+    
+    def update_clusters(self, feature_matrix, n_clusters=None, state_path=None):
+        """Train the online model on new rows, persist it and return their cluster ids"""
+        
+        state_path = state_path or CLUSTERING_CONFIG['state_path']
+        if self.cluster_model is None:
+            self.load_cluster_model(n_clusters, state_path)
+        
+        self.cluster_model.partial_fit(feature_matrix)
+        self.cluster_model.save(state_path)
+        
+        return self.cluster_model.predict(feature_matrix)
+    
+    def assign_clusters(self, feature_matrix, state_path=None):
+        """Cluster ids from the persisted centroids without updating them"""
+        
+        if self.cluster_model is None:
+            self.load_cluster_model(state_path=state_path)
+        
+        return self.cluster_model.predict(feature_matrix)
 
 if __name__ == "__main__":
     clusterer = VectorClusterer()
@@ -1,18 +1,47 @@
 import vertexai
 from vertexai.generative_models import GenerativeModel
+import asyncio
+import hashlib
 import json
 import re
-from config.settings import PROJECT_ID, LOCATION, VERTEX_AI_CONFIG
+import unicodedata
+import pandas as pd
+from config.settings import PROJECT_ID, LOCATION, VERTEX_AI_CONFIG, VISUAL_METAPHORS
+from src.semantic_analysis.visual_metaphors import VisualMetaphorDetector
+from src.utils.cache import SQLiteResultCache
+from src.utils.instrumentation import track_call, track_count
+from src.utils.throttling import RateLimiter, run_sync
+
+DEFAULT_SCORES = {'seriousness_threshold': 0.5, 'irony_collapse_index': 0.5}
+
+def normalize_text(text):
+    """Canonical form for cache keys: NFKC, case-folded, whitespace collapsed"""
+    
+    return ' '.join(unicodedata.normalize('NFKC', str(text)).casefold().split())
 
 class GeminiAnalyzer:
-    def __init__(self):
-        vertexai.init(project=PROJECT_ID, location=LOCATION)
-        self.model = GenerativeModel(VERTEX_AI_CONFIG['model_name'])
+    def __init__(self, model=None, rate_limiter=None, cache=None, model_name=None):
+        self.model_name = model_name or VERTEX_AI_CONFIG['model_name']
+        if model is None:
+            vertexai.init(project=PROJECT_ID, location=LOCATION)
+            model = GenerativeModel(self.model_name)
+        self.model = model
+        self.rate_limiter = rate_limiter or RateLimiter(VERTEX_AI_CONFIG['requests_per_minute'], period=60)
+        self.cache = cache if cache is not None else SQLiteResultCache(
+            VERTEX_AI_CONFIG['cache_path'], VERTEX_AI_CONFIG['cache_ttl_seconds'], VERTEX_AI_CONFIG['cache_max_entries']
+        )
+        self.visual_metaphors = VisualMetaphorDetector()
+    
+    def cache_key(self, text):
+        """Hash of the normalized text, prompt version and model, so prompt or model changes never reuse stale scores"""
         
-    def analyze_semantic_scores(self, text):
-        """Use Gemini to calculate semantic scores"""
+        raw = '\x00'.join([VERTEX_AI_CONFIG['prompt_version'], self.model_name, normalize_text(text)])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
         
-        prompt = f"""Analyze this meme-related text and provide ONLY a JSON response with two numerical scores:
+    def build_prompt(self, text):
+        """Single-text scoring prompt"""
+        
+        return f"""Analyze this meme-related text and provide ONLY a JSON response with two numerical scores:
 
 Text: "{text}"
 
@@ -27,64 +56,210 @@ Scoring criteria:
 - irony_collapse_index: Degree to which ironic language has shifted to sincere belief. 0 = pure irony, 1 = sincere action.
 
 Provide ONLY the JSON, no other text."""
-
+    
+    def parse_single_response(self, result_text):
+        """Scores from a single-text response, or None when no JSON object can be read"""
+        
+        json_match = re.search(r'\{[^}]+\}', result_text)
+        if json_match:
+            result = json.loads(json_match.group())
+            return {
+                'seriousness_threshold': float(result.get('seriousness_threshold', 0.5)),
+                'irony_collapse_index': float(result.get('irony_collapse_index', 0.5))
+            }
+        return None
+    
+    def analyze_semantic_scores(self, text):
+        """Use Gemini to calculate semantic scores"""
+        
+        key = self.cache_key(text)
+        cached = self.cache.get(key)
+        if cached is not None:
+            track_count('gemini_cache_hits')
+            return cached
+        track_count('gemini_cache_misses')
+        
         try:
-            response = self.model.generate_content(prompt)
-            result_text = response.text.strip()
-            
-            json_match = re.search(r'\{[^}]+\}', result_text)
-            if json_match:
-                result = json.loads(json_match.group())
-                return {
-                    'seriousness_threshold': float(result.get('seriousness_threshold', 0.5)),
-                    'irony_collapse_index': float(result.get('irony_collapse_index', 0.5))
-                }
+            self.rate_limiter.acquire()
+            with track_call('vertex_ai', 'generate_content'):
+                response = self.model.generate_content(self.build_prompt(text))
+            scores = self.parse_single_response(response.text.strip())
+            if scores is not None:
+                return self.cache.set(key, scores)
         except Exception as e:
             print(f"Gemini analysis error: {e}")
         
-        return {'seriousness_threshold': 0.5, 'irony_collapse_index': 0.5}
+        return dict(DEFAULT_SCORES)
     
-    def analyze_visual_metaphor(self, text_description):
-        """Identify visual metaphors and Google Shopping correlation"""
+    def build_batch_prompt(self, items):
+        """One prompt scoring many texts; `items` is a list of (item_id, text)"""
         
-        visual_metaphors = {
-            'rocket': {'trend_category': 'price_surge', 'google_shopping_relevance': 0.6},
-            'moon': {'trend_category': 'extreme_growth', 'google_shopping_relevance': 0.4},
-            'diamond': {'trend_category': 'holding_strength', 'google_shopping_relevance': 0.7},
-            'ape': {'trend_category': 'community_action', 'google_shopping_relevance': 0.3},
-            'hands': {'trend_category': 'holding_commitment', 'google_shopping_relevance': 0.5},
-            'brain': {'trend_category': 'intelligence_signal', 'google_shopping_relevance': 0.4},
-            'stonk': {'trend_category': 'stock_reference', 'google_shopping_relevance': 0.8},
-            'chart': {'trend_category': 'technical_analysis', 'google_shopping_relevance': 0.9}
-        }
+        payload = json.dumps([{'id': item_id, 'text': text} for item_id, text in items], ensure_ascii=False)
+        
+        return f"""Analyze each meme-related text below and provide ONLY a JSON array with one object per item:
+
+Items:
+{payload}
+
+Return JSON format:
+[
+  {{"id": <item id>, "seriousness_threshold": <float 0-1>, "irony_collapse_index": <float 0-1>}}
+]
+
+Scoring criteria:
+- seriousness_threshold: Ratio of financial action words (buy, invest, hold) vs humor words (lol, lmao). Higher = more serious financial intent.
+- irony_collapse_index: Degree to which ironic language has shifted to sincere belief. 0 = pure irony, 1 = sincere action.
+
+Score every item exactly once, keep the given ids, and provide ONLY the JSON array, no other text."""
+    
+    def parse_batch_response(self, result_text, item_ids):
+        """Scores keyed by item id, tolerating code fences, prose and truncated or malformed entries
         
-        text_lower = text_description.lower()
-        detected_metaphors = []
+        Items that are missing or unreadable are simply absent from the result.
+        """
         
-        for metaphor, properties in visual_metaphors.items():
-            if metaphor in text_lower:
-                detected_metaphors.append({
-                    'metaphor': metaphor,
-                    'trend_category': properties['trend_category'],
-                    'shopping_relevance': properties['google_shopping_relevance']
-                })
+        wanted = {str(item_id): item_id for item_id in item_ids}
+        text = re.sub(r'```(?:json)?', '', result_text)
+        
+        entries = None
+        start, end = text.find('['), text.rfind(']')
+        if start != -1 and end > start:
+            try:
+                entries = json.loads(text[start:end + 1])
+            except ValueError:
+                entries = None
+        if not isinstance(entries, list):
+            entries = []
+            for match in re.finditer(r'\{[^{}]*\}', text):
+                try:
+                    entries.append(json.loads(match.group()))
+                except ValueError:
+                    continue
         
-        if detected_metaphors:
-            avg_shopping_relevance = np.mean([m['shopping_relevance'] for m in detected_metaphors])
-            primary_metaphor = max(detected_metaphors, key=lambda x: x['shopping_relevance'])
-        else:
-            avg_shopping_relevance = 0.0
-            primary_metaphor = None
+        scores = {}
+        for entry in entries:
+            if not isinstance(entry, dict) or str(entry.get('id')) not in wanted:
+                continue
+            try:
+                seriousness = float(entry['seriousness_threshold'])
+                irony = float(entry['irony_collapse_index'])
+            except (KeyError, TypeError, ValueError):
+                continue
+            scores[wanted[str(entry['id'])]] = {
+                'seriousness_threshold': min(1.0, max(0.0, seriousness)),
+                'irony_collapse_index': min(1.0, max(0.0, irony))
+            }
+        
+        return scores
+    
+    def analyze_batch(self, texts, batch_size=None, max_concurrency=None):
+        """Score many texts with packed prompts; returns a DataFrame aligned with `texts`"""
+        
+        return run_sync(self.analyze_batch_async(texts, batch_size, max_concurrency))
+    
+    async def analyze_batch_async(self, texts, batch_size=None, max_concurrency=None):
+        """Packed prompts run concurrently under a semaphore and the shared rate limit
+        
+        Texts that normalize to the same cache key are sent once, and keys already in the cache
+        are not sent at all. Items a batch response leaves out or garbles are retried with the
+        single-text prompt; items that still fail get neutral 0.5 scores and are not cached. The
+        `gemini_source` column records which path produced each row (cache, batch, single or default).
+        """
+        
+        texts = [str(text) for text in texts]
+        batch_size = batch_size or VERTEX_AI_CONFIG['batch_size']
+        semaphore = asyncio.Semaphore(max_concurrency or VERTEX_AI_CONFIG['max_concurrent_batches'])
+        
+        keys = [self.cache_key(text) for text in texts]
+        unique = {}
+        for key, text in zip(keys, texts):
+            unique.setdefault(key, text)
+        
+        scores = {key: dict(value, gemini_source='cache') for key, value in self.cache.get_many(list(unique)).items()}
+        pending = [key for key in unique if key not in scores]
+        track_count('gemini_duplicates_removed', len(texts) - len(unique))
+        track_count('gemini_cache_hits', len(unique) - len(pending))
+        track_count('gemini_cache_misses', len(pending))
+        
+        batches = [pending[start:start + batch_size] for start in range(0, len(pending), batch_size)]
+        batch_results = await asyncio.gather(*[self._score_batch(semaphore, ids, unique) for ids in batches])
+        
+        for result in batch_results:
+            scores.update(result)
+        
+        missing = [key for key in pending if key not in scores]
+        if missing:
+            print(f"Retrying {len(missing)} of {len(pending)} texts individually")
+            singles = await asyncio.gather(*[self._score_single(semaphore, unique[key]) for key in missing])
+            for key, single in zip(missing, singles):
+                if single is not None:
+                    scores[key] = dict(single, gemini_source='single')
+        
+        fresh = {key: {name: scores[key][name] for name in DEFAULT_SCORES} for key in pending if key in scores}
+        if fresh:
+            self.cache.set_many(fresh)
+        
+        rows = [scores.get(key, dict(DEFAULT_SCORES, gemini_source='default')) for key in keys]
+        return pd.DataFrame(rows, columns=['seriousness_threshold', 'irony_collapse_index', 'gemini_source'])
+    
+    async def _generate(self, semaphore, prompt):
+        async with semaphore:
+            wait = self.rate_limiter.reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            
+            with track_call('vertex_ai', 'generate_content'):
+                if hasattr(self.model, 'generate_content_async'):
+                    response = await self.model.generate_content_async(prompt)
+                else:
+                    response = await asyncio.to_thread(self.model.generate_content, prompt)
+        
+        return response.text.strip()
+    
+    async def _score_batch(self, semaphore, keys, texts):
+        # the prompt numbers items by position; results are mapped back to cache keys
+        try:
+            result_text = await self._generate(semaphore, self.build_batch_prompt([(i, texts[key]) for i, key in enumerate(keys)]))
+        except Exception as e:
+            print(f"Gemini batch error ({len(keys)} items): {e}")
+            return {}
+        
+        parsed = self.parse_batch_response(result_text, range(len(keys)))
+        return {keys[i]: dict(s, gemini_source='batch') for i, s in parsed.items()}
+    
+    async def _score_single(self, semaphore, text):
+        try:
+            return self.parse_single_response(await self._generate(semaphore, self.build_prompt(text)))
+        except Exception as e:
+            print(f"Gemini analysis error: {e}")
+            return None
+    
+    def analyze_visual_metaphor(self, text_description):
+        """Identify visual metaphors and Google Shopping correlation"""
+        
+        present = self.visual_metaphors.presence([text_description])[0]
+        detected = self.visual_metaphors.detect([text_description]).iloc[0]
         
         return {
-            'detected_metaphors': detected_metaphors,
-            'primary_visual_metaphor': primary_metaphor['metaphor'] if primary_metaphor else 'none',
-            'google_shopping_correlation': avg_shopping_relevance,
-            'metaphor_count': len(detected_metaphors)
+            'detected_metaphors': [
+                {
+                    'metaphor': metaphor,
+                    'trend_category': VISUAL_METAPHORS[metaphor]['trend_category'],
+                    'shopping_relevance': VISUAL_METAPHORS[metaphor]['google_shopping_relevance']
+                }
+                for metaphor, found in zip(self.visual_metaphors.metaphors, present) if found
+            ],
+            'primary_visual_metaphor': detected['primary_visual_metaphor'],
+            'google_shopping_correlation': float(detected['google_shopping_correlation']),
+            'metaphor_count': int(detected['metaphor_count'])
         }
+    
+    def analyze_visual_metaphors(self, df, text_column='body'):
+        """Columnar visual-metaphor detection for a whole DataFrame of texts"""
+        
+        return self.visual_metaphors.detect(df[text_column], index=df.index)
 
 if __name__ == "__main__":
-    import numpy as np
     analyzer = GeminiAnalyzer()
     test_text = "Buy HODL diamond hands to the moon with rockets!"
     scores = analyzer.analyze_semantic_scores(test_text)
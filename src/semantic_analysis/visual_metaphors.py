@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+from config.settings import VISUAL_METAPHORS
+from src.semantic_analysis.keyword_engine import KeywordCounter
+from src.semantic_analysis.text_features import keyword_column
+
+class VisualMetaphorDetector:
+    """Detect every configured visual metaphor in one automaton scan per batch and return columnar results"""
+    
+    def __init__(self, metaphors=None):
+        metaphors = VISUAL_METAPHORS if metaphors is None else metaphors
+        self.metaphors = list(metaphors)
+        self.trend_categories = np.array([metaphors[m]['trend_category'] for m in self.metaphors], dtype=object)
+        self.relevance = np.array([metaphors[m]['google_shopping_relevance'] for m in self.metaphors], dtype=np.float64)
+        self.text_keywords = self.metaphors
+        self.keyword_counter = KeywordCounter(self.metaphors)
+    
+    def presence(self, texts, features=None):
+        """(N, M) boolean matrix: metaphor j occurs (as a substring, case-insensitive) in text i"""
+        
+        if features is not None:
+            counts = features[[keyword_column(m) for m in self.metaphors]].to_numpy(dtype=np.int64)
+        else:
+            counts = self.keyword_counter.count(texts)
+        return counts > 0
+    
+    def detect(self, texts, index=None, features=None):
+        """Primary metaphor (highest shopping relevance, first in config order on ties), mean relevance and count per text"""
+        
+        present = self.presence(texts, features)
+        count = present.sum(axis=1)
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            correlation = np.where(count > 0, (present @ self.relevance) / count, 0.0)
+        
+        # texts without metaphors point at the trailing 'none' slot
+        slot = np.full(len(count), len(self.metaphors), dtype=np.int64)
+        if self.metaphors:
+            primary = np.where(present, self.relevance, -np.inf).argmax(axis=1)
+            slot = np.where(count > 0, primary, slot)
+        
+        return pd.DataFrame({
+            'primary_visual_metaphor': np.array(self.metaphors + ['none'], dtype=object)[slot],
+            'primary_trend_category': np.append(self.trend_categories, 'none')[slot],
+            'google_shopping_correlation': correlation,
+            'metaphor_count': count.astype(np.int64)
+        }, index=index)
+    
+    def annotate(self, df, text_column='body', features=None):
+        """Join the detection columns onto a DataFrame of texts"""
+        
+        return df.join(self.detect(df[text_column], index=df.index, features=features))
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+class DiskCache:
+    """On-disk key/value cache with per-entry TTL; expired entries are evicted when read or swept"""
+    
+    def __init__(self, cache_dir, ttl_seconds):
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+    
+    def _path(self, key):
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f'{digest}.pkl')
+    
+    def get(self, key):
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        
+        with open(path, 'rb') as f:
+            stored_at, value = pickle.load(f)
+        
+        if time.time() - stored_at > self.ttl_seconds:
+            os.remove(path)
+            return None
+        
+        return value
+    
+    def set(self, key, value):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((time.time(), value), f)
+        os.replace(tmp_path, path)
+        
+        return value
+    
+    def evict_expired(self):
+        """Remove every expired entry; returns the number removed"""
+        
+        if not os.path.isdir(self.cache_dir):
+            return 0
+        
+        removed = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.pkl'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            with open(path, 'rb') as f:
+                stored_at, _ = pickle.load(f)
+            if time.time() - stored_at > self.ttl_seconds:
+                os.remove(path)
+                removed += 1
+        
+        return removed
+
+class SQLiteResultCache:
+    """Persistent JSON result cache in one SQLite file, bounded by TTL and least-recently-used eviction"""
+    
+    def __init__(self, path, ttl_seconds, max_entries):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._connection = None
+        self._lock = threading.Lock()
+    
+    @property
+    def connection(self):
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS results ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+            )
+            self._connection.execute('CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed_at)')
+        return self._connection
+    
+    def get_many(self, keys):
+        """Values for the keys present and unexpired; hits are marked as recently used"""
+        
+        keys = list(dict.fromkeys(keys))
+        now = time.time()
+        found = {}
+        
+        with self._lock:
+            # stay well under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self.connection.execute(
+                    f'SELECT key, value FROM results WHERE key IN ({placeholders}) AND stored_at >= ?',
+                    chunk + [now - self.ttl_seconds]
+                ).fetchall()
+                found.update((key, json.loads(value)) for key, value in rows)
+            
+            if found:
+                self.connection.executemany('UPDATE results SET accessed_at = ? WHERE key = ?', [(now, key) for key in found])
+                self.connection.commit()
+        
+        return found
+    
+    def get(self, key):
+        return self.get_many([key]).get(key)
+    
+    def set_many(self, items):
+        """Store a {key: JSON-serializable value} mapping, then trim to `max_entries`"""
+        
+        now = time.time()
+        with self._lock:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO results (key, value, stored_at, accessed_at) VALUES (?, ?, ?, ?)',
+                [(key, json.dumps(value), now, now) for key, value in items.items()]
+            )
+            self.connection.execute(
+                'DELETE FROM results WHERE key IN '
+                '(SELECT key FROM results ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            )
+            self.connection.commit()
+        
+        return items
+    
+    def set(self, key, value):
+        self.set_many({key: value})
+        return value
+    
+    def evict_expired(self):
+        """Remove every expired entry; returns the number removed"""
+        
+        with self._lock:
+            cursor = self.connection.execute('DELETE FROM results WHERE stored_at < ?', (time.time() - self.ttl_seconds,))
+            self.connection.commit()
+        
+        return cursor.rowcount
+    
+    def __len__(self):
+        with self._lock:
+            return self.connection.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+    
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
@@ -1,3 +1,4 @@
+import os
 import pandas as pd
 from datetime import datetime
 from config.settings import EXPORT_CONFIG
@@ -26,11 +27,12 @@ class ExportManager:
         sheets_df = pd.DataFrame(export_data)
         return sheets_df
     
-    def export_to_csv(self, df, filename):
+    def export_to_csv(self, df, filename, append=False):
         """Export dataframe to CSV for sheets import"""
         
+        os.makedirs(self.export_config['storage_path'], exist_ok=True)
         filepath = f"{self.export_config['storage_path']}{filename}"
-        df.to_csv(filepath, index=False)
+        df.to_csv(filepath, index=False, mode='a' if append else 'w', header=not append)
         
         print(f"Export file created: {filepath}")
         print(f"Total rows exported: {len(df)}")
@@ -0,0 +1,191 @@
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+_active = None
+
+def _peak_rss_bytes():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+class PipelineInstrumentation:
+    """Per-run stage timings, row counts, RSS growth, external-call statistics and event counters"""
+    
+    def __init__(self, run_id=None):
+        self.run_id = run_id or f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        self.started_at = datetime.now().isoformat()
+        self.stages = {}
+        self.calls = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+    
+    def activate(self):
+        """Make this the run that `track_call` records into"""
+        
+        global _active
+        _active = self
+        return self
+    
+    def deactivate(self):
+        global _active
+        if _active is self:
+            _active = None
+    
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        """Time a stage; set `rows_out` on the yielded record. Repeated stages (chunks) accumulate
+        
+        Times and row counts are summed over invocations; `peak_rss_delta_bytes` keeps the largest
+        single-invocation growth, since peaks from successive chunks do not add up.
+        """
+        
+        record = StageRecord(rows_in)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        rss_start = _peak_rss_bytes()
+        
+        try:
+            yield record
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            rss_delta = _peak_rss_bytes() - rss_start
+            
+            with self._lock:
+                stats = self.stages.setdefault(name, {
+                    'invocations': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0,
+                    'rows_in': 0, 'rows_out': 0, 'peak_rss_delta_bytes': 0
+                })
+                stats['invocations'] += 1
+                stats['wall_seconds'] += wall
+                stats['cpu_seconds'] += cpu
+                stats['rows_in'] += record.rows_in or 0
+                stats['rows_out'] += record.rows_out or 0
+                stats['peak_rss_delta_bytes'] = max(stats['peak_rss_delta_bytes'], rss_delta)
+    
+    def record_call(self, service, operation, seconds, ok=True):
+        with self._lock:
+            stats = self.calls.setdefault((service, operation), {
+                'count': 0, 'errors': 0, 'total_seconds': 0.0, 'max_seconds': 0.0
+            })
+            stats['count'] += 1
+            stats['errors'] += 0 if ok else 1
+            stats['total_seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+    
+    def increment(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+    
+    def report(self):
+        return {
+            'run_id': self.run_id,
+            'started_at': self.started_at,
+            'wall_seconds': time.perf_counter() - self._start,
+            'peak_rss_bytes': _peak_rss_bytes(),
+            'stages': {name: dict(stats) for name, stats in self.stages.items()},
+            'external_calls': [
+                dict(service=service, operation=operation, **stats)
+                for (service, operation), stats in self.calls.items()
+            ],
+            'counters': dict(self.counters)
+        }
+    
+    def write_json(self, path):
+        _ensure_parent(path)
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+        return path
+    
+    def prometheus_text(self, prefix='meme_pipeline'):
+        """Prometheus text exposition format, one gauge family per metric"""
+        
+        report = self.report()
+        run = f'run_id="{self.run_id}"'
+        families = [
+            ('run_wall_seconds', 'Wall-clock time of the pipeline run', [(run, report['wall_seconds'])]),
+            ('run_peak_rss_bytes', 'Peak resident set size of the process', [(run, report['peak_rss_bytes'])])
+        ]
+        
+        stage_metrics = [
+            ('stage_wall_seconds', 'wall_seconds', 'Wall-clock time per pipeline stage'),
+            ('stage_cpu_seconds', 'cpu_seconds', 'CPU time per pipeline stage'),
+            ('stage_rows_in', 'rows_in', 'Rows entering each stage'),
+            ('stage_rows_out', 'rows_out', 'Rows leaving each stage'),
+            ('stage_peak_rss_delta_bytes', 'peak_rss_delta_bytes', 'Largest growth of peak RSS during one invocation of each stage'),
+            ('stage_invocations', 'invocations', 'Times each stage ran (one per chunk when streaming)')
+        ]
+        for metric, key, help_text in stage_metrics:
+            samples = [(f'{run},stage="{name}"', stats[key]) for name, stats in report['stages'].items()]
+            families.append((metric, help_text, samples))
+        
+        call_metrics = [
+            ('external_calls_total', 'count', 'External service calls'),
+            ('external_call_errors_total', 'errors', 'External service calls that raised'),
+            ('external_call_seconds_sum', 'total_seconds', 'Total latency of external service calls'),
+            ('external_call_seconds_max', 'max_seconds', 'Slowest external service call')
+        ]
+        for metric, key, help_text in call_metrics:
+            samples = [
+                (f'{run},service="{call["service"]}",operation="{call["operation"]}"', call[key])
+                for call in report['external_calls']
+            ]
+            families.append((metric, help_text, samples))
+        
+        families.append((
+            'events_total', 'Event counters such as cache hits',
+            [(f'{run},event="{name}"', value) for name, value in report['counters'].items()]
+        ))
+        
+        lines = []
+        for metric, help_text, samples in families:
+            lines.append(f'# HELP {prefix}_{metric} {help_text}')
+            lines.append(f'# TYPE {prefix}_{metric} gauge')
+            lines.extend(f'{prefix}_{metric}{{{labels}}} {value}' for labels, value in samples)
+        
+        return '\n'.join(lines) + '\n'
+    
+    def write_prometheus(self, path):
+        _ensure_parent(path)
+        with open(path, 'w') as f:
+            f.write(self.prometheus_text())
+        return path
+
+class StageRecord:
+    def __init__(self, rows_in=None):
+        self.rows_in = rows_in
+        self.rows_out = None
+
+@contextmanager
+def track_call(service, operation):
+    """Time an external call (BigQuery, Vertex AI, GCS, HTTP) into the active run, if any"""
+    
+    instrumentation = _active
+    start = time.perf_counter()
+    ok = False
+    try:
+        yield
+        ok = True
+    finally:
+        if instrumentation is not None:
+            instrumentation.record_call(service, operation, time.perf_counter() - start, ok)
+
+def track_count(name, amount=1):
+    """Add to a named event counter (cache hits, deduplicated items) of the active run, if any"""
+    
+    instrumentation = _active
+    if instrumentation is not None and amount:
+        instrumentation.increment(name, amount)
+
+def _ensure_parent(path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
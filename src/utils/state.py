@@ -0,0 +1,35 @@
+import json
+import os
+
+class WatermarkStore:
+    """JSON-file store for per-source high-water marks, written atomically"""
+    
+    def __init__(self, path):
+        self.path = path
+    
+    def load(self):
+        if not os.path.exists(self.path):
+            return {}
+        
+        with open(self.path) as f:
+            return json.load(f)
+    
+    def get(self, key, default=None):
+        return self.load().get(key, default)
+    
+    def set(self, key, value):
+        """Persist a new watermark; a crash mid-write leaves the previous state intact"""
+        
+        state = self.load()
+        state[key] = value
+        
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, self.path)
+        
+        return value
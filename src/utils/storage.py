@@ -2,6 +2,7 @@ from google.cloud import storage
 import json
 import pandas as pd
 from config.settings import PROJECT_ID, BUCKET_NAME
+from src.utils.instrumentation import track_call
 
 class StorageManager:
     def __init__(self):
@@ -20,7 +21,8 @@ class StorageManager:
             else:
                 json_data = json.dumps(data, indent=2)
             
-            blob.upload_from_string(json_data, content_type='application/json')
+            with track_call('gcs', 'upload'):
+                blob.upload_from_string(json_data, content_type='application/json')
             
             print(f"Exported {filename} to gs://{self.bucket_name}/meme_market_outputs/")
             return True
@@ -28,13 +30,20 @@ class StorageManager:
             print(f"Export failed for {filename}: {str(e)}")
             return False
     
-    def export_visual_metadata(self, metadata_list):
-        """Export visual metadata for BigQuery integration"""
+    def export_visual_metadata(self, metadata):
+        """Export visual metadata for BigQuery integration (a list of records or a detection DataFrame)"""
         
         try:
             bucket = self.client.bucket(self.bucket_name)
             blob = bucket.blob('visual_metadata/meme_visual_analysis.json')
-            blob.upload_from_string(json.dumps(metadata_list, indent=2), content_type='application/json')
+            
+            if isinstance(metadata, pd.DataFrame):
+                json_data = metadata.to_json(orient='records')
+            else:
+                json_data = json.dumps(metadata, indent=2)
+            
+            with track_call('gcs', 'upload'):
+                blob.upload_from_string(json_data, content_type='application/json')
             
             print(f"Visual metadata uploaded to gs://{self.bucket_name}/visual_metadata/")
             return True
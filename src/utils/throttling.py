@@ -0,0 +1,55 @@
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+class RateLimiter:
+    """Thread-safe limiter spacing calls evenly so at most `max_calls` start per `period` seconds"""
+    
+    def __init__(self, max_calls, period=1.0):
+        self.interval = period / max_calls
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+    
+    def reserve(self):
+        """Claim the next free slot and return how long the caller must wait for it"""
+        
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        
+        return slot - now
+    
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+def backoff_delay(attempt, base_delay, jitter=0.5):
+    """Exponential backoff with proportional random jitter"""
+    
+    return base_delay * (2 ** attempt) * (1 + random.uniform(0, jitter))
+
+def retry_with_backoff(func, max_retries=3, base_delay=1.0, retry_on=(Exception,)):
+    """Call `func`, retrying failures with jittered exponential backoff"""
+    
+    for attempt in range(max_retries + 1):
+        try:
+            return func()
+        except retry_on:
+            if attempt == max_retries:
+                raise
+            time.sleep(backoff_delay(attempt, base_delay))
+
+def run_sync(coroutine):
+    """Run a coroutine from synchronous code, on a worker thread if this thread already has a running loop (Jupyter, Hex)"""
+    
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
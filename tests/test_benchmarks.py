@@ -0,0 +1,51 @@
+import unittest
+import pandas as pd
+from benchmarks.run_benchmarks import BenchmarkSuite, compare_results, per_row_text_features, reference_speedups
+
+class TestBenchmarks(unittest.TestCase):
+    
+    def test_suite_reports_throughput_and_memory(self):
+        report = BenchmarkSuite().run(sizes=[300], stages=['semantic_scoring', 'betting_odds'])
+        
+        self.assertEqual([r['stage'] for r in report['results']], [
+            'semantic_scoring.process_batch', 'export.prepare_betting_odds_export'
+        ])
+        for result in report['results']:
+            self.assertEqual(result['rows'], 300)
+            self.assertGreater(result['rows_per_sec'], 0)
+            self.assertGreater(result['peak_mb'], 0)
+        
+    def test_vectorized_engineer_features_matches_per_row_reference(self):
+        suite = BenchmarkSuite()
+        comments = suite.generator.reddit_comments(500)
+        comments = pd.concat([comments, pd.DataFrame({'body': ['éhold NOW!!', 'BUY İt 🚀', 'ＢＵＹ', None]})], ignore_index=True)
+        inputs = comments.assign(seriousness_threshold=0.5, irony_collapse_index=0.5, score=1)
+        
+        vectorized = suite.predictor.engineer_features(inputs.copy())
+        reference = per_row_text_features(suite.predictor, inputs.copy())
+        columns = ['financial_words', 'urgency_words', 'caps_ratio', 'exclamation_count']
+        pd.testing.assert_frame_equal(vectorized[columns], reference[columns])
+        
+        report = suite.run(sizes=[300], stages=['engineer_features'], repeat=1, memory=False)
+        self.assertEqual([r['stage'] for r in report['results']], [
+            'predictor.engineer_features', 'predictor.engineer_features_per_row'
+        ])
+        self.assertEqual(reference_speedups(report)['stage'].tolist(), ['predictor.engineer_features'])
+        
+    def test_compare_flags_throughput_regressions(self):
+        baseline = {'results': [
+            {'stage': 'a', 'rows': 10, 'rows_per_sec': 1000.0},
+            {'stage': 'b', 'rows': 10, 'rows_per_sec': 1000.0}
+        ]}
+        current = {'results': [
+            {'stage': 'a', 'rows': 10, 'rows_per_sec': 950.0},
+            {'stage': 'b', 'rows': 10, 'rows_per_sec': 500.0},
+            {'stage': 'c', 'rows': 10, 'rows_per_sec': 100.0}
+        ]}
+        comparison = compare_results(baseline, current, threshold=0.1)
+        
+        self.assertEqual(list(comparison['stage']), ['a', 'b'])
+        self.assertEqual(list(comparison['regression']), [False, True])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,93 @@
+import asyncio
+import os
+import tempfile
 import unittest
+from unittest import mock
+from aiohttp import web
 from src.data_collection.bigquery_reddit import RedditDataCollector
+from src.data_collection.query_runner import ParquetQueryRunner
+from src.utils.state import WatermarkStore
 from src.data_collection.google_trends import GoogleTrendsCollector
-from src.data_collection.tiktok_api import TikTokDataCollector
+from src.data_collection.tiktok_api import TikTokDataCollector, AsyncTikTokCollector
+from src.data_collection.synthetic_corpus import SyntheticCorpusGenerator
+from src.semantic_analysis.sql_rules import python_markers
+from src.utils.cache import DiskCache
+from src.utils.throttling import RateLimiter
+import pandas as pd
+import numpy as np
+
+class FakeTrendReq:
+    """Scales every payload so its largest value is 100, like Google Trends"""
+    
+    popularity = {'stock market': 50.0}
+    payloads = []
+    
+    def build_payload(self, kw_list, timeframe, geo):
+        self.kw_list = kw_list
+        self.payloads.append(list(kw_list))
+    
+    def interest_over_time(self):
+        base = np.linspace(1.0, 2.0, 10)
+        raw = {kw: base * self.popularity.setdefault(kw, float(len(kw))) for kw in self.kw_list}
+        peak = max(values.max() for values in raw.values())
+        index = pd.Index(pd.date_range('2024-03-01', periods=10), name='date')
+        return pd.DataFrame({kw: values * 100 / peak for kw, values in raw.items()}, index=index)
+
+class StubTikTokServer:
+    """Local Research API stand-in: three pages per window, one 429 per hashtag, in-flight tracking"""
+    
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.in_flight_by_hashtag = {}
+        self.max_in_flight_by_hashtag = {}
+        self.throttled = set()
+        self.requests = []
+        
+    async def token(self, request):
+        return web.json_response({'access_token': 'stub-token', 'expires_in': 7200})
+        
+    async def query(self, request):
+        body = await request.json()
+        hashtag = body['query']['and'][0]['field_values'][0]
+        self.requests.append(hashtag)
+        if hashtag not in self.throttled:
+            self.throttled.add(hashtag)
+            return web.json_response({}, status=429)
+        
+        self.in_flight += 1
+        self.in_flight_by_hashtag[hashtag] = self.in_flight_by_hashtag.get(hashtag, 0) + 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        self.max_in_flight_by_hashtag[hashtag] = max(self.max_in_flight_by_hashtag.get(hashtag, 0), self.in_flight_by_hashtag[hashtag])
+        await asyncio.sleep(0.005)
+        self.in_flight -= 1
+        self.in_flight_by_hashtag[hashtag] -= 1
+        
+        cursor = body.get('cursor', 0)
+        videos = [{
+            'id': f"{hashtag}_{body['start_date']}_{cursor + i}",
+            'create_time': 1709251200 + cursor + i,
+            'like_count': 10, 'comment_count': 5, 'share_count': 5, 'view_count': 100
+        } for i in range(2)]
+        return web.json_response({
+            'data': {'videos': videos, 'cursor': cursor + 2, 'has_more': cursor < 4, 'search_id': 's1'},
+            'error': {'code': 'ok', 'message': ''}
+        })
+        
+    async def collect(self, hashtags):
+        app = web.Application()
+        app.router.add_post('/v2/oauth/token/', self.token)
+        app.router.add_post('/v2/research/video/query/', self.query)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        try:
+            collector = AsyncTikTokCollector('key', 'secret', api_base=f'http://127.0.0.1:{port}/v2')
+            return await collector.fetch_videos(hashtags)
+        finally:
+            await runner.cleanup()
 
 class TestDataCollection(unittest.TestCase):
     
@@ -9,13 +95,164 @@ class TestDataCollection(unittest.TestCase):
         collector = RedditDataCollector()
         self.assertIsNotNone(collector.client)
         
+    def test_reddit_streaming_with_local_runner(self):
+        df = pd.DataFrame({
+            'subreddit': ['wallstreetbets', 'memes'] * 5,
+            'body': [f'comment {i} to the moon' for i in range(10)],
+            'score': list(range(10))
+        })
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'comments.parquet')
+            df.to_parquet(path, row_group_size=4)
+            runner = ParquetQueryRunner(path)
+            collector = RedditDataCollector(query_runner=runner)
+            
+            chunks = list(collector.iter_reddit_comments(batch_size=3))
+            batches = list(collector.iter_reddit_comments(batch_size=3, as_arrow=True, prefetch_depth=0))
+        
+        self.assertEqual([len(chunk) for chunk in chunks], [3, 3, 3, 1])
+        self.assertEqual([batch.num_rows for batch in batches], [3, 3, 3, 1])
+        pd.testing.assert_frame_equal(pd.concat(chunks), df)
+        self.assertIn('`fh-bigquery.reddit_comments.*`', runner.queries[0])
+        self.assertIn("_TABLE_SUFFIX BETWEEN '2024_01' AND '2024_12'", runner.queries[0])
+        
+        with mock.patch.dict('config.settings.BIGQUERY_CONFIG', {'reddit_table': 'my-project.reddit', 'full_scan_year': 2025}):
+            full_query = collector.build_comment_query()
+            incremental_query = collector.build_comment_query(since=1735689600)
+        for query in [full_query, incremental_query]:
+            self.assertIn('`my-project.reddit.*`', query)
+        self.assertIn("_TABLE_SUFFIX BETWEEN '2025_01' AND '2025_12'", full_query)
+        
+    def test_incremental_extraction_from_watermark(self):
+        df = pd.DataFrame({
+            'comment_id': ['a', 'b', 'b', 'c', 'd'],
+            'created_utc': [1709251000, 1709251200, 1709251200, 1709251300, 1709251400],
+            'body': ['old comment to the moon'] + ['new comment to the moon'] * 4
+        })
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'comments.parquet')
+            df.to_parquet(path)
+            runner = ParquetQueryRunner(path)
+            store = WatermarkStore(os.path.join(tmpdir, 'state', 'watermarks.json'))
+            store.set('reddit_comments.created_utc', 1709251200)
+            collector = RedditDataCollector(query_runner=runner, watermark_store=store)
+            
+            new_rows = collector.extract_new_reddit_comments()
+            watermark = collector.advance_watermark(new_rows)
+            collector.extract_new_reddit_comments()
+            persisted = WatermarkStore(store.path).get('reddit_comments.created_utc')
+        
+        self.assertEqual(new_rows['comment_id'].tolist(), ['b', 'c', 'd'])
+        self.assertEqual(watermark, 1709251400)
+        self.assertEqual(persisted, 1709251400)
+        self.assertIn("_TABLE_SUFFIX >= '2024_03'", runner.queries[0])
+        self.assertIn('created_utc >= 1709251200', runner.queries[0])
+        self.assertIn('created_utc >= 1709251400', runner.queries[1])
+        
     def test_trends_collector_initialization(self):
         collector = GoogleTrendsCollector()
         self.assertIsNotNone(collector.pytrends)
         
+    def test_trends_batched_normalized_and_cached(self):
+        terms = [f'term {"x" * i}' for i in range(9)]
+        FakeTrendReq.payloads = []
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = DiskCache(tmpdir, ttl_seconds=3600)
+            collector = GoogleTrendsCollector(client_factory=FakeTrendReq, cache=cache, rate_limiter=RateLimiter(1000))
+            trends_df = collector.collect_trends_data(terms)
+            payloads = list(FakeTrendReq.payloads)
+            
+            def offline():
+                raise AssertionError('network call on a cached run')
+            rerun = GoogleTrendsCollector(client_factory=offline, cache=cache).collect_trends_data(terms)
+        
+        self.assertEqual(len(payloads), 3)
+        self.assertTrue(all(p[0] == 'stock market' and len(p) <= 5 for p in payloads))
+        for term in terms:
+            velocity = trends_df.loc[trends_df['term'] == term, 'search_velocity'].to_numpy()
+            # anchor peaks at 2 * 50 = 100 raw, so normalized values equal raw popularity
+            np.testing.assert_allclose(velocity, np.linspace(1.0, 2.0, 10) * len(term))
+        pd.testing.assert_frame_equal(rerun, trends_df)
+        
+    def test_incremental_velocity_matches_full_window(self):
+        rng = np.random.default_rng(3)
+        dates = pd.date_range('2024-01-01', periods=40)
+        points = pd.concat([
+            pd.DataFrame({'date': dates, 'term': term, 'search_velocity': rng.integers(1, 100, len(dates)).astype(float)})
+            for term in ['hodl', 'rizz', 'sigma']
+        ], ignore_index=True)
+        collector = GoogleTrendsCollector(client_factory=FakeTrendReq)
+        
+        for window in [7, 3]:
+            with self.subTest(window=window), mock.patch.dict('config.settings.TRENDS_CONFIG', {'velocity_window': window}), \
+                    tempfile.TemporaryDirectory() as tmpdir:
+                full, summary = collector.compute_velocity_metrics(points, summary=True)
+                state_path = os.path.join(tmpdir, 'trends_state.parquet')
+                parts = [collector.update_velocity_metrics(points[points['date'] < dates[30]], state_path)]
+                for date in dates[30:]:
+                    parts.append(collector.update_velocity_metrics(points[points['date'] <= date], state_path))
+                state = pd.read_parquet(state_path)
+                
+                incremental = pd.concat(parts).sort_values(['term', 'date']).reset_index(drop=True)
+                expected = full.sort_values(['term', 'date']).reset_index(drop=True)
+                pd.testing.assert_frame_equal(incremental, expected, check_exact=False)
+                self.assertEqual(len(state), 3 * window)
+                self.assertEqual(full['velocity_7d_avg'].isna().sum(), 3 * (window - 1))
+                pd.testing.assert_frame_equal(summary, collector.calculate_search_delta(full))
+        
     def test_tiktok_collector_initialization(self):
         collector = TikTokDataCollector()
         self.assertIsNotNone(collector.api_base)
+        
+    def test_async_tiktok_collector_against_stub_server(self):
+        hashtags = [f'meme{i}' for i in range(20)]
+        server = StubTikTokServer()
+        limits = {'max_concurrent_requests': 8, 'max_concurrent_per_hashtag': 2, 'backoff_seconds': 0.001}
+        with mock.patch.dict('config.settings.TIKTOK_CONFIG', limits):
+            videos = asyncio.run(server.collect(hashtags))
+        
+        # 4 date windows x 3 pages x 2 videos per hashtag, despite one throttled request each
+        self.assertEqual(len(videos), len(hashtags) * 24)
+        self.assertEqual(videos['video_id'].nunique(), len(videos))
+        self.assertTrue((videos['engagement_rate'] == 0.2).all())
+        self.assertLessEqual(server.max_in_flight, 8)
+        self.assertLessEqual(max(server.max_in_flight_by_hashtag.values()), 2)
+        
+    def test_tiktok_backoff_releases_concurrency_slots(self):
+        server = StubTikTokServer()
+        limits = {'max_concurrent_requests': 1, 'max_concurrent_per_hashtag': 1, 'date_windows': 1, 'backoff_seconds': 0.05}
+        with mock.patch.dict('config.settings.TIKTOK_CONFIG', limits):
+            videos = asyncio.run(server.collect(['hodl', 'rizz']))
+        
+        self.assertEqual(len(videos), 2 * 6)
+        # with a single global slot, the other hashtag is served while the throttled one backs off
+        self.assertEqual(server.requests[:2], ['hodl', 'rizz'])
+        
+    def test_synthetic_corpus_is_seeded_and_streams_to_parquet(self):
+        generator = SyntheticCorpusGenerator(seed=7)
+        comments = generator.reddit_comments(2000)
+        
+        pd.testing.assert_frame_equal(comments, SyntheticCorpusGenerator(seed=7).reddit_comments(2000))
+        self.assertEqual(list(comments.columns), [
+            'comment_id', 'created_utc', 'date', 'hour', 'subreddit', 'body', 'score',
+            'financial_intent', 'ironic_marker', 'text_length'
+        ])
+        self.assertTrue(comments['text_length'].between(21, 499).all())
+        self.assertTrue(comments['created_utc'].is_monotonic_decreasing)
+        pd.testing.assert_frame_equal(
+            comments[['financial_intent', 'ironic_marker']], python_markers(comments['body']), check_dtype=False
+        )
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            paths = generator.write_parquet(tmpdir, reddit_rows=2500, chunk_size=1000)
+            written = pd.read_parquet(paths['reddit'])
+            trends = pd.read_parquet(paths['trends'])
+            tiktok = pd.read_parquet(paths['tiktok'])
+        
+        self.assertEqual(len(written), 2500)
+        self.assertEqual(written['comment_id'].nunique(), 2500)
+        self.assertEqual(list(trends.columns[:3]), ['date', 'term', 'search_velocity'])
+        self.assertIn('viral_threshold', tiktok.columns)
 
 if __name__ == '__main__':
     unittest.main()
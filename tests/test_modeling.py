@@ -1,7 +1,14 @@
+import re
+import os
+import tempfile
 import unittest
-from src.modeling.market_impact_predictor import MarketImpactPredictor
+from unittest import mock
+from src.modeling.market_impact_predictor import MarketImpactPredictor, RunningRegressionMetrics
+from sklearn.linear_model import LinearRegression
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 from src.brand_safety.toxicity_analyzer import ToxicityAnalyzer
 import pandas as pd
+import numpy as np
 
 class TestModeling(unittest.TestCase):
     
@@ -13,12 +20,117 @@ class TestModeling(unittest.TestCase):
         self.assertIsNotNone(self.predictor.model)
         self.assertIsNotNone(self.predictor.scaler)
         
+    def test_impact_probability_custom_horizons(self):
+        df = pd.DataFrame({
+            'predicted_readiness': [0.9, 0.2, 1.5, -0.3],
+            'irony_collapse_index': [0.8, 0.3, 0.9, 0.5],
+            'lookalike_similarity': [0.7, 0.1, 0.9, 0.4]
+        })
+        horizons = [
+            {'hours': 6, 'ici_base': 0.4, 'ici_weight': 0.6, 'lookalike_base': 0.5, 'lookalike_weight': 0.5},
+            {'hours': 72, 'ici_base': 0.8, 'ici_weight': 0.2, 'lookalike_base': 0.9, 'lookalike_weight': 0.1}
+        ]
+        result = self.predictor.calculate_impact_probability(df, horizons=horizons)
+        
+        for _, row in result.iterrows():
+            expected = min(100, max(0, row['predicted_readiness'] * 100 *
+                (0.8 + 0.2 * row['irony_collapse_index']) *
+                (0.9 + 0.1 * row['lookalike_similarity'])))
+            self.assertEqual(row['impact_prob_72h'], expected)
+        self.assertTrue(result['impact_prob_6h'].between(0, 100).all())
+        self.assertNotIn('impact_prob_24h', result.columns)
+        
+    def test_artifact_round_trip_and_schema_check(self):
+        rng = np.random.default_rng(0)
+        X = pd.DataFrame(rng.random((200, len(self.predictor.feature_columns))), columns=self.predictor.feature_columns)
+        y = X.to_numpy() @ rng.random(len(self.predictor.feature_columns))
+        metrics = self.predictor.fit(X, y)
+        
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.dict('config.settings.MODEL_CONFIG', {'artifact_dir': tmp, 'keep_versions': 2}):
+            for _ in range(3):
+                self.predictor.save()
+            self.assertEqual(len([name for name in os.listdir(tmp) if name.endswith('.joblib')]), 2)
+            
+            loaded = MarketImpactPredictor.from_artifact()
+            self.assertEqual(loaded.version, self.predictor.version)
+            self.assertEqual(loaded.metrics, metrics)
+            np.testing.assert_array_equal(loaded.model.predict(loaded.scaler.transform(X)), self.predictor.model.predict(self.predictor.scaler.transform(X)))
+            
+            stale = MarketImpactPredictor()
+            stale.feature_columns = self.predictor.feature_columns[:-1]
+            with self.assertRaises(ValueError):
+                stale.load()
+        
+    def test_streaming_training_matches_in_memory_fit(self):
+        rng = np.random.default_rng(1)
+        n = 6000
+        df = pd.DataFrame(rng.random((n, len(self.predictor.feature_columns))), columns=self.predictor.feature_columns)
+        df['comment_id'] = [f't1_{i:06d}' for i in range(n)]
+        df['body'] = ''
+        df['score'] = rng.integers(0, 1000, n)
+        df['lookalike_similarity'] = rng.random(n)
+        chunks = [df.iloc[start:start + 1000] for start in range(0, n, 1000)]
+        
+        mask = self.predictor.evaluation_mask(df)
+        np.testing.assert_array_equal(np.concatenate([self.predictor.evaluation_mask(chunk) for chunk in chunks]), mask)
+        self.assertAlmostEqual(mask.mean(), 0.2, delta=0.03)
+        
+        metrics = self.predictor.train_stream(lambda: iter(chunks), epochs=2)
+        
+        readiness = self.predictor.calculate_market_readiness(df).to_numpy()
+        X = df[self.predictor.feature_columns].to_numpy()
+        reference = LinearRegression().fit(X[~mask], readiness[~mask])
+        self.assertGreater(metrics['test_r2'], r2_score(readiness[mask], reference.predict(X[mask])) - 0.01)
+        
+        predictions = self.predictor.model.predict(self.predictor.scaler.transform(df[self.predictor.feature_columns]))
+        self.assertAlmostEqual(metrics['test_r2'], r2_score(readiness[mask], predictions[mask]))
+        self.assertAlmostEqual(metrics['train_mse'], mean_squared_error(readiness[~mask], predictions[~mask]))
+        self.assertAlmostEqual(metrics['test_mae'], mean_absolute_error(readiness[mask], predictions[mask]))
+        
+        running = RunningRegressionMetrics()
+        for start in range(0, n, 700):
+            running.update(readiness[start:start + 700], predictions[start:start + 700])
+        self.assertAlmostEqual(running.result()['r2'], r2_score(readiness, predictions))
+        
+        with mock.patch.dict('config.settings.MODEL_CONFIG', {'test_fraction': 1.0}), self.assertRaisesRegex(ValueError, 'No training rows'):
+            MarketImpactPredictor().train_stream(lambda: iter(chunks[:1]))
+        
+    def test_vectorized_text_features_match_per_row_reference(self):
+        df = pd.DataFrame({'body': [
+            'BUY calls NOW!! strike today', 'hold 🚀🚀 LONG!', 'éhold holdé ǅbuy', 'BUY İt asap!',
+            'ÉCOLE Σίσυφος ＢＵＹ', '', None, 3.5, 'nothing here'
+        ]})
+        features = self.predictor.engineer_features(df.assign(seriousness_threshold=0.5, irony_collapse_index=0.5, score=1))
+        
+        patterns = self.predictor.text_patterns
+        for i, text in enumerate(str(x) for x in df['body']):
+            self.assertEqual(features['financial_words'][i], len(re.findall(patterns['financial_words'], text.lower())))
+            self.assertEqual(features['urgency_words'][i], len(re.findall(patterns['urgency_words'], text.lower())))
+            self.assertEqual(features['caps_ratio'][i], sum(1 for c in text if c.isupper()) / (len(text) + 1))
+            self.assertEqual(features['exclamation_count'][i], text.count('!'))
+    
     def test_toxicity_analysis(self):
         text = "pump and dump scam fraud"
         score, breakdown = self.toxicity.analyze_toxicity(text)
         
         self.assertGreater(score, 0)
         self.assertIn('misinformation', breakdown)
+        
+    def test_toxicity_batch_matches_per_text(self):
+        df = pd.DataFrame({'body': [
+            'pump and dump scam fraud',
+            'Rug pull! RAID the target, kill the war',
+            'warfare skill afraid pumpkin',
+            'normal discussion'
+        ]})
+        result = self.toxicity.process_dataframe(df, include_breakdown=True)
+        
+        for i, text in enumerate(df['body']):
+            score, breakdown = self.toxicity.analyze_toxicity(text)
+            self.assertEqual(result['toxicity_score'][i], score)
+            self.assertEqual(result['toxicity_breakdown'][i], breakdown)
+            for category, count in breakdown.items():
+                self.assertEqual(result[f'toxicity_{category}'][i], count)
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,169 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+from deployment.hex_integration import HexIntegration
+from src.data_collection.bigquery_reddit import RedditDataCollector
+from src.data_collection.query_runner import ParquetQueryRunner
+from src.utils.instrumentation import PipelineInstrumentation, track_call
+import pandas as pd
+import numpy as np
+
+class FakeTrendsCollector:
+    def collect_trends_data(self):
+        return pd.DataFrame()
+
+class FakeTikTokCollector:
+    def fetch_trending_hashtags(self):
+        return pd.DataFrame()
+
+class FakeStorageManager:
+    def __init__(self):
+        self.exports = {}
+    
+    def export_to_gcs(self, data, filename):
+        with track_call('gcs', 'upload'):
+            self.exports[filename] = data.copy()
+        return True
+
+class TestPipeline(unittest.TestCase):
+    
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        phrases = [
+            'Buy the dip and HOLD, diamond hands!!',
+            'lol this stonk is going to the moon $GME',
+            'pump and dump scam, total fraud',
+            'Rug pull incoming, raid the target',
+            'just a normal discussion about earnings',
+            'haha ape together strong, rocket emoji'
+        ]
+        n = 120
+        self.comments = pd.DataFrame({
+            'date': pd.to_datetime('2024-03-01') + pd.to_timedelta(rng.integers(0, 30, n), unit='D'),
+            'subreddit': rng.choice(['wallstreetbets', 'memes', 'cryptocurrency'], n),
+            'body': [phrases[i] for i in rng.integers(0, len(phrases), n)],
+            'score': rng.integers(0, 500, n),
+            'lookalike_score': rng.random(n),
+            'financial_intent': rng.random(n),
+            'ironic_marker': rng.random(n),
+            'text_length': rng.integers(10, 200, n)
+        })
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.comments_path = os.path.join(self.tmpdir.name, 'comments.parquet')
+        self.comments.to_parquet(self.comments_path)
+        
+    def tearDown(self):
+        self.tmpdir.cleanup()
+        
+    def run_pipeline(self, name, pipeline_config=None, **kwargs):
+        storage = FakeStorageManager()
+        integration = HexIntegration(
+            reddit_collector=RedditDataCollector(query_runner=ParquetQueryRunner(self.comments_path)),
+            trends_collector=FakeTrendsCollector(),
+            tiktok_collector=FakeTikTokCollector(),
+            storage_manager=storage
+        )
+        integration.export_manager.export_config = {'storage_path': os.path.join(self.tmpdir.name, name) + '/'}
+        config = dict({'metrics_dir': os.path.join(self.tmpdir.name, name, 'metrics')}, **(pipeline_config or {}))
+        with mock.patch.dict('config.settings.PIPELINE_CONFIG', config), \
+                mock.patch.dict('config.settings.MODEL_CONFIG', {'artifact_dir': os.path.join(self.tmpdir.name, 'models')}):
+            results = integration.run_full_pipeline(**kwargs)
+        csv = pd.read_csv(os.path.join(self.tmpdir.name, name, 'betting_odds_export.csv'))
+        return results, storage, csv
+        
+    def test_streaming_matches_full_pipeline(self):
+        (full_df, _, _, full_alerts, full_metrics), _, full_csv = self.run_pipeline('full')
+        (rows, _, _, alerts, metrics), storage, csv = self.run_pipeline('streaming', streaming=True, chunk_size=25)
+        
+        self.assertEqual(rows, len(self.comments))
+        self.assertEqual(len(storage.exports), 5)
+        self.assertEqual(metrics, full_metrics)
+        pd.testing.assert_frame_equal(csv, full_csv)
+        
+        # duplicate groups are formed per chunk, so only their ids and sizes depend on chunking
+        streamed = pd.concat(storage.exports[name] for name in sorted(storage.exports))
+        columns = full_df.columns.drop(['duplicate_group', 'duplicate_count'])
+        pd.testing.assert_frame_equal(streamed[columns], full_df[columns])
+        self.assertEqual(full_df['duplicate_count'].tolist(), full_df.groupby('body')['body'].transform('size').tolist())
+        self.assertEqual(len(alerts), len(full_alerts))
+        
+    def test_streaming_training_keeps_no_training_frame(self):
+        (rows, _, _, _, metrics), storage, csv = self.run_pipeline(
+            'incremental', pipeline_config={'incremental_training': True}, streaming=True, chunk_size=40
+        )
+        
+        self.assertEqual(rows, len(self.comments))
+        self.assertEqual(set(metrics), {'train_r2', 'test_r2', 'train_mse', 'test_mse', 'train_mae', 'test_mae'})
+        self.assertEqual(len(csv), len(self.comments))
+        self.assertTrue(all(export['predicted_readiness'].notna().all() for export in storage.exports.values()))
+        
+    def test_predict_only_run_reuses_saved_artifact(self):
+        (trained_df, _, _, _, trained_metrics), _, trained_csv = self.run_pipeline('trained')
+        (loaded_df, _, _, _, loaded_metrics), _, loaded_csv = self.run_pipeline('loaded', pipeline_config={'predictor_mode': 'load'})
+        
+        self.assertEqual(loaded_metrics, trained_metrics)
+        pd.testing.assert_frame_equal(loaded_df[trained_df.columns], trained_df)
+        pd.testing.assert_frame_equal(loaded_csv, trained_csv)
+        
+        artifacts = os.listdir(os.path.join(self.tmpdir.name, 'models'))
+        self.assertIn('LATEST', artifacts)
+        self.assertEqual(len([name for name in artifacts if name.endswith('.joblib')]), 1)
+        
+    def test_dedup_shares_scores_but_keeps_per_row_features(self):
+        df = pd.DataFrame({'body': ['buy now lol', 'BUY NOW LOL!!!', 'to the MOON!!!', 'To the moon 🚀🚀', 'hold']}, index=range(10, 15))
+        integration = HexIntegration(
+            reddit_collector=RedditDataCollector(query_runner=ParquetQueryRunner(self.comments_path)),
+            trends_collector=FakeTrendsCollector(),
+            tiktok_collector=FakeTikTokCollector(),
+            storage_manager=FakeStorageManager()
+        )
+        
+        scored, features = integration.score_semantics(df)
+        integration.deduplicator = None
+        unscored, reference = integration.score_semantics(df)
+        
+        pd.testing.assert_frame_equal(features, reference)
+        self.assertEqual(features['exclamation_count'].tolist(), [0, 3, 3, 0, 0])
+        self.assertEqual(features['uppercase_count'].tolist(), [0, 9, 4, 1, 0])
+        self.assertEqual(scored['duplicate_group'].tolist(), [0, 0, 1, 1, 2])
+        self.assertEqual(scored['duplicate_count'].tolist(), [2, 2, 2, 2, 1])
+        self.assertEqual(unscored['duplicate_count'].tolist(), [1] * 5)
+        self.assertEqual(scored['seriousness_threshold'][11], unscored['seriousness_threshold'][10])
+    
+    def test_stage_rss_delta_is_a_peak_across_chunks(self):
+        instrumentation = PipelineInstrumentation()
+        # peak RSS grows by 100, 50 and 100 bytes over three chunk invocations
+        with mock.patch('src.utils.instrumentation._peak_rss_bytes', side_effect=[0, 100, 100, 150, 150, 250]):
+            for _ in range(3):
+                with instrumentation.stage('semantic_analysis', rows_in=10) as record:
+                    record.rows_out = 10
+        
+        stats = instrumentation.report()['stages']['semantic_analysis']
+        self.assertEqual(stats['peak_rss_delta_bytes'], 100)
+        self.assertEqual((stats['invocations'], stats['rows_in'], stats['rows_out']), (3, 30, 30))
+        
+    def test_run_metrics_report_and_prometheus_file(self):
+        self.run_pipeline('instrumented', streaming=True, chunk_size=50)
+        metrics_dir = os.path.join(self.tmpdir.name, 'instrumented', 'metrics')
+        report_name = next(name for name in os.listdir(metrics_dir) if name.endswith('.json'))
+        with open(os.path.join(metrics_dir, report_name)) as f:
+            report = json.load(f)
+        with open(os.path.join(metrics_dir, 'pipeline_metrics.prom')) as f:
+            prometheus = f.read()
+        
+        semantic = report['stages']['semantic_analysis']
+        self.assertEqual(semantic['invocations'], 3)
+        self.assertEqual(semantic['rows_in'], len(self.comments))
+        self.assertEqual(report['stages']['collect.reddit']['rows_out'], len(self.comments))
+        self.assertGreater(semantic['wall_seconds'], 0)
+        self.assertEqual(report['external_calls'][0]['service'], 'gcs')
+        self.assertEqual(report['external_calls'][0]['count'], 3)
+        self.assertIn('meme_pipeline_stage_wall_seconds{run_id=', prometheus)
+        self.assertIn('stage="export"', prometheus)
+        self.assertEqual(report['counters']['dedup_rows_in'], len(self.comments))
+        self.assertEqual(report['counters']['dedup_rows_collapsed'], len(self.comments) - 3 * 6)
+
+if __name__ == '__main__':
+    unittest.main()
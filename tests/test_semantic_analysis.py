@@ -1,7 +1,57 @@
+import asyncio
+import os
+import tempfile
+import time
 import unittest
+from unittest import mock
 from src.semantic_analysis.semantic_scoring import SemanticScorer
 from src.semantic_analysis.vector_clustering import VectorClusterer
+from src.semantic_analysis.benchmark_index import BenchmarkIndex
+from src.semantic_analysis.text_features import TextFeatureExtractor
+from src.semantic_analysis.sql_rules import SQLRuleCompiler, check_parity
+from src.semantic_analysis.vertex_ai_gemini import GeminiAnalyzer
+from src.semantic_analysis.tiered_scoring import TieredScorer
+from src.semantic_analysis.visual_metaphors import VisualMetaphorDetector
+from src.semantic_analysis.deduplication import NearDuplicateCollapser
+from src.semantic_analysis.online_kmeans import OnlineKMeans
+from src.utils.cache import SQLiteResultCache
+from src.utils.instrumentation import PipelineInstrumentation
+from src.modeling.market_impact_predictor import MarketImpactPredictor
+from src.brand_safety.toxicity_analyzer import ToxicityAnalyzer
+import json
+import re
 import pandas as pd
+import numpy as np
+
+class FakeGeminiModel:
+    """Local stand-in for GenerativeModel: scores by text length, garbling one chosen item in batch responses"""
+    
+    def __init__(self, drop_text=None):
+        self.drop_text = drop_text
+        self.prompts = []
+    
+    @staticmethod
+    def score(text):
+        return {'seriousness_threshold': (len(text) % 10) / 10, 'irony_collapse_index': (len(text) % 7) / 7}
+    
+    def generate_content(self, prompt):
+        self.prompts.append(prompt)
+        items = re.search(r'Items:\n(.*)\n\nReturn', prompt, re.S)
+        if items is None:
+            text = re.search(r'Text: "(.*)"\n\nReturn', prompt, re.S).group(1)
+            return type('Response', (), {'text': json.dumps(self.score(text))})()
+        
+        entries = []
+        for item in json.loads(items.group(1)):
+            if item['text'] == self.drop_text:
+                entries.append({'id': item['id'], 'seriousness_threshold': 'n/a'})
+            else:
+                entries.append(dict(self.score(item['text']), id=item['id']))
+        return type('Response', (), {'text': '```json\n' + json.dumps(entries) + '\n```'})()
+
+class FailingGeminiModel:
+    def generate_content(self, prompt):
+        raise RuntimeError("quota exceeded")
 
 class TestSemanticAnalysis(unittest.TestCase):
     
@@ -19,6 +69,25 @@ class TestSemanticAnalysis(unittest.TestCase):
         self.assertGreaterEqual(ici, 0)
         self.assertLessEqual(ici, 1)
         
+    def test_process_batch_matches_per_text_scores(self):
+        texts = [
+            "Buy HODL diamond hands to the moon!",
+            "lol this is just a joke haha kidding",
+            "hahaha lolol lolong buy buy",
+            "Seriously considering buying and holding long term",
+            "nothing to see here"
+        ]
+        result = self.scorer.process_batch(texts)
+        
+        for i, text in enumerate(texts):
+            text_lower = text.lower()
+            financial = sum(text_lower.count(kw) for kw in self.scorer.financial_keywords)
+            humor = sum(text_lower.count(kw) for kw in self.scorer.humor_keywords)
+            self.assertEqual(result['financial_keywords_count'][i], financial)
+            self.assertEqual(result['humor_keywords_count'][i], humor)
+            self.assertEqual(result['seriousness_threshold'][i], self.scorer.calculate_meme_seriousness_threshold(text))
+            self.assertEqual(result['irony_collapse_index'][i], self.scorer.calculate_irony_collapse_index(text))
+        
     def test_vector_clustering(self):
         df = pd.DataFrame({
             'body': ['HODL moon', 'stonks'],
@@ -29,6 +98,273 @@ class TestSemanticAnalysis(unittest.TestCase):
         
         self.assertIn('best_lookalike', result.columns)
         self.assertIn('lookalike_similarity', result.columns)
+        
+    def test_feature_matrix_matches_per_row_vectors(self):
+        df = pd.DataFrame({
+            'body': ['HODL to the MOON!! $GME', 'Buy the dip stonks, crypto and NFT', '', 'apes hold diamond hands'],
+            'seriousness_threshold': [0.8, 0.7, 0.5, 0.2],
+            'irony_collapse_index': [0.9, 0.6, 0.5, 0.1]
+        })
+        matrix = self.clusterer.build_feature_matrix(df)
+        
+        self.assertEqual(matrix.shape, (4, 20))
+        self.assertEqual(matrix.dtype, np.float32)
+        for i, row in df.iterrows():
+            expected = self.clusterer.create_feature_vector(row['body'], row['seriousness_threshold'], row['irony_collapse_index'])
+            np.testing.assert_array_equal(matrix[i], expected)
+        
+        result = self.clusterer.find_lookalikes(df, feature_matrix=matrix)
+        result = self.clusterer.perform_clustering(result, n_clusters=2, feature_matrix=matrix)
+        self.assertIn('cluster', result.columns)
+        
+    def test_top_k_lookalikes_from_library_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            library_path = os.path.join(tmp, 'benchmarks.csv')
+            index_path = os.path.join(tmp, 'benchmarks.npz')
+            pd.DataFrame({
+                'name': ['DOGE_2021', 'GME_2021', 'NFT_2021', 'SHIB_2021', 'AMC_2021'],
+                'text': [
+                    'DOGE to the moon diamond hands hold the line crypto investment',
+                    'GME stonks ape together strong buy hold wallstreetbets',
+                    'NFT investment mint drop blockchain digital art',
+                    'SHIB shiba inu meme coin hold investment community',
+                    'AMC apes buy and hold the squeeze stock'
+                ],
+                'market_impact': [0.95, 0.98, 0.85, 0.82, 0.9],
+                'category': ['cryptocurrency', 'stocks', 'crypto_art', 'cryptocurrency', 'stocks']
+            }).to_csv(library_path, index=False)
+            
+            self.clusterer.load_benchmark_index(library_path, index_path)
+            self.assertTrue(os.path.exists(index_path))
+            self.assertEqual(len(VectorClusterer().load_benchmark_index(library_path, index_path)), 5)
+            
+            df = pd.DataFrame({'body': ['HODL moon crypto', 'apes buy stonks'], 'seriousness_threshold': [0.8, 0.7], 'irony_collapse_index': [0.9, 0.6]})
+            top = self.clusterer.find_top_lookalikes(df, k=3)
+        
+        self.assertEqual(len(top), 6)
+        for _, group in top.groupby('meme_index'):
+            self.assertEqual(list(group['rank']), [1, 2, 3])
+            self.assertTrue(group['similarity'].is_monotonic_decreasing)
+    
+    def test_lookalikes_fall_back_when_probed_lists_are_empty(self):
+        # the second inverted list has no members, so queries probing only it find nothing
+        index = BenchmarkIndex(['A', 'B'], [[1.0, 0.1], [1.0, 0.3]], [0.9, 0.5], ['x', 'y'],
+                               centroids=np.array([[1.0, 0.0], [0.0, 1.0]], dtype=np.float32), list_ids=np.array([0, 0]))
+        queries = np.array([[1.0, 0.2], [0.05, 1.0]])
+        self.assertEqual(index.search(queries, k=1, n_probe=1)[0][1, 0], -1)
+        
+        clusterer = VectorClusterer()
+        clusterer.benchmark_index = index
+        with mock.patch.dict('config.settings.BENCHMARK_CONFIG', {'ann_probes': 1}):
+            result = clusterer.find_lookalikes(pd.DataFrame(index=[0, 1]), feature_matrix=queries)
+        
+        exact_idx, exact_sim = BenchmarkIndex(['A', 'B'], [[1.0, 0.1], [1.0, 0.3]], [0.9, 0.5], ['x', 'y']).search(queries, k=1)
+        self.assertEqual(result['best_lookalike'].tolist(), ['AB'[i] for i in exact_idx[:, 0]])
+        np.testing.assert_allclose(result['lookalike_similarity'], exact_sim[:, 0])
+        self.assertTrue(np.isfinite(result['estimated_market_impact']).all())
+        
+    def test_shared_feature_table_matches_standalone_scans(self):
+        predictor = MarketImpactPredictor()
+        toxicity = ToxicityAnalyzer()
+        extractor = TextFeatureExtractor.for_components(self.scorer, self.clusterer, predictor, toxicity)
+        df = pd.DataFrame({
+            'body': ['BUY NOW!! pump and dump scam $GME', 'lol haha just a joke', 'HODL diamond hands, hold long calls today', 'Rug pull raid kill'],
+            'score': [10, 3, 25, 1]
+        })
+        features = extractor.extract(df['body'], index=df.index)
+        
+        pd.testing.assert_frame_equal(
+            self.scorer.process_batch(df['body'], features=features), self.scorer.process_batch(df['body'])
+        )
+        
+        scored = df.join(self.scorer.process_batch(df['body']))
+        np.testing.assert_array_equal(
+            self.clusterer.build_feature_matrix(scored, features=features), self.clusterer.build_feature_matrix(scored)
+        )
+        pd.testing.assert_frame_equal(
+            predictor.engineer_features(scored.copy(), features=features), predictor.engineer_features(scored.copy())
+        )
+        pd.testing.assert_frame_equal(
+            toxicity.analyze_batch(df['body'], features=features), toxicity.analyze_batch(df['body'])
+        )
+        
+    def test_sql_rules_match_python_scores(self):
+        texts = [
+            'HODL diamond hands to the moon! Buy the dip!',
+            'lol this is just a joke haha kidding',
+            'hahaha lolol jkjk',
+            "it's BUY buy buy, hold long calls",
+            'Seriously considering buying and holding long term',
+            'nothing to see here',
+            ''
+        ]
+        mismatches = check_parity(texts, self.scorer)
+        
+        self.assertEqual(len(mismatches), 0, mismatches.to_string())
+        self.assertIn("'it\\'s'", SQLRuleCompiler('bigquery').literal("it's"))
+        
+    def test_gemini_batch_scoring_retries_unparsed_items(self):
+        texts = [f"comment {i} " + "moon " * (i % 5) for i in range(25)]
+        model = FakeGeminiModel(drop_text=texts[7])
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            analyzer = GeminiAnalyzer(model=model, cache=SQLiteResultCache(os.path.join(tmp, 'gemini.sqlite'), 3600, 1000))
+            scores = analyzer.analyze_batch(texts, batch_size=10, max_concurrency=3)
+        
+        expected = pd.DataFrame([FakeGeminiModel.score(text) for text in texts])
+        pd.testing.assert_frame_equal(scores[expected.columns], expected)
+        self.assertEqual(scores['gemini_source'].tolist().count('single'), 1)
+        self.assertEqual(scores.loc[7, 'gemini_source'], 'single')
+        self.assertEqual(len(model.prompts), 4)
+        self.assertEqual(analyzer.parse_batch_response('Sure! [{"id": 0, "seriousness_threshold": 1.4, "irony_collapse_index": 0.2}, {"id": 9', [0, 1]),
+                         {0: {'seriousness_threshold': 1.0, 'irony_collapse_index': 0.2}})
+        
+    def test_analyze_batch_inside_running_loop(self):
+        texts = ["buying calls lol haha jk", "buy lol", "just looking at charts"]
+        
+        async def notebook_cell():
+            # Hex/Jupyter cells already run inside an event loop
+            with tempfile.TemporaryDirectory() as tmp:
+                llm = GeminiAnalyzer(model=FakeGeminiModel(), cache=SQLiteResultCache(os.path.join(tmp, 'gemini.sqlite'), 3600, 1000))
+                return llm.analyze_batch(texts), TieredScorer(llm=llm, config={'max_escalation_rate': 1.0}).process_batch(texts)
+        scores, tiered = asyncio.run(notebook_cell())
+        
+        expected = pd.DataFrame([FakeGeminiModel.score(text) for text in texts])
+        pd.testing.assert_frame_equal(scores[expected.columns], expected)
+        self.assertEqual(scores['gemini_source'].tolist(), ['batch'] * 3)
+        self.assertTrue(tiered['score_source'].str.startswith('gemini_').all())
+        
+    def test_gemini_cache_deduplicates_and_persists(self):
+        texts = ["To the MOON  lol", "to the moon lol", "diamond hands", "To the moon lol"]
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'gemini.sqlite')
+            instrumentation = PipelineInstrumentation().activate()
+            try:
+                model = FakeGeminiModel()
+                first = GeminiAnalyzer(model=model, cache=SQLiteResultCache(path, 3600, 1000)).analyze_batch(texts)
+                self.assertEqual(len(model.prompts), 1)
+                self.assertEqual(len(json.loads(re.search(r'Items:\n(.*)\n\nReturn', model.prompts[0], re.S).group(1))), 2)
+                
+                model = FakeGeminiModel()
+                second = GeminiAnalyzer(model=model, cache=SQLiteResultCache(path, 3600, 1000)).analyze_batch(texts + ["new text"])
+            finally:
+                instrumentation.deactivate()
+            
+            self.assertEqual(second['gemini_source'].tolist(), ['cache'] * 4 + ['batch'])
+            pd.testing.assert_frame_equal(first.iloc[:, :2], second.iloc[:4, :2])
+            self.assertEqual(instrumentation.counters, {'gemini_duplicates_removed': 4, 'gemini_cache_hits': 2, 'gemini_cache_misses': 3})
+            
+            bounded = SQLiteResultCache(os.path.join(tmp, 'bounded.sqlite'), 3600, 2)
+            bounded.set_many({'a': 1, 'b': 2})
+            bounded.get('a')
+            time.sleep(0.01)
+            bounded.set('c', 3)
+            self.assertEqual(bounded.get_many(['a', 'b', 'c']), {'a': 1, 'c': 3})
+            bounded.ttl_seconds = -1
+            self.assertEqual(bounded.get('a'), None)
+            self.assertEqual(bounded.evict_expired(), 2)
+        
+    def test_tiered_scorer_escalates_only_ambiguous_texts(self):
+        texts = [
+            "buy and hold, long position",
+            "lol lmao haha",
+            "just looking at charts",
+            "buy lol",
+            "buying calls lol haha jk",
+            "invest in the portfolio"
+        ]
+        model = FakeGeminiModel()
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            llm = GeminiAnalyzer(model=model, cache=SQLiteResultCache(os.path.join(tmp, 'gemini.sqlite'), 3600, 1000))
+            tiered = TieredScorer(llm=llm, config={'max_escalation_rate': 0.5})
+            results = tiered.process_batch(texts)
+        
+        heuristic = self.scorer.process_batch(texts)
+        self.assertEqual(results['escalated'].tolist(), [False, False, True, True, True, False])
+        self.assertEqual(len(model.prompts), 1)
+        for i in range(len(texts)):
+            expected = FakeGeminiModel.score(texts[i]) if results.loc[i, 'escalated'] else heuristic.loc[i]
+            self.assertAlmostEqual(results.loc[i, 'seriousness_threshold'], expected['seriousness_threshold'])
+        self.assertEqual(tiered.last_stats, {'texts': 6, 'uncertain': 3, 'escalated': 3, 'llm_failed': 0, 'escalation_rate': 0.5})
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            broken = GeminiAnalyzer(model=FailingGeminiModel(), cache=SQLiteResultCache(os.path.join(tmp, 'gemini.sqlite'), 3600, 1000))
+            fallback = TieredScorer(llm=broken, config={'max_escalation_rate': 0.5}).process_batch(texts)
+        pd.testing.assert_series_equal(fallback['seriousness_threshold'], heuristic['seriousness_threshold'])
+        pd.testing.assert_series_equal(fallback['irony_collapse_index'], heuristic['irony_collapse_index'])
+        self.assertEqual(set(fallback['score_source']), {'heuristic'})
+        self.assertEqual(fallback['escalated'].sum(), 3)
+        
+        capped = TieredScorer(llm=llm, config={'max_escalation_rate': 0.2}).select_escalations(heuristic)
+        self.assertEqual(capped[0].tolist(), [2])
+        
+    def test_visual_metaphor_detection_is_columnar(self):
+        texts = ["Diamond HANDS to the moon 🚀 rocket", "stonks only go up, check the chart", "nothing here", ""]
+        metaphors = {
+            'rocket': {'trend_category': 'price_surge', 'google_shopping_relevance': 0.6},
+            'moon': {'trend_category': 'extreme_growth', 'google_shopping_relevance': 0.4},
+            'diamond': {'trend_category': 'holding_strength', 'google_shopping_relevance': 0.6},
+            'stonk': {'trend_category': 'stock_reference', 'google_shopping_relevance': 0.8},
+            'chart': {'trend_category': 'technical_analysis', 'google_shopping_relevance': 0.9}
+        }
+        detector = VisualMetaphorDetector(metaphors)
+        
+        detected = detector.detect(texts)
+        self.assertEqual(detected['primary_visual_metaphor'].tolist(), ['rocket', 'chart', 'none', 'none'])
+        self.assertEqual(detected['primary_trend_category'].tolist(), ['price_surge', 'technical_analysis', 'none', 'none'])
+        self.assertEqual(detected['metaphor_count'].tolist(), [3, 2, 0, 0])
+        np.testing.assert_allclose(detected['google_shopping_correlation'], [1.6 / 3, 0.85, 0.0, 0.0])
+        
+        features = TextFeatureExtractor.for_components(detector).extract(texts)
+        pd.testing.assert_frame_equal(detector.detect(texts, features=features), detected)
+        
+    def test_near_duplicates_collapse_and_fan_out(self):
+        texts = [
+            "To the moon 🚀🚀",
+            "diamond hands forever, apes together strong",
+            "to the MOON!!!",
+            "Diamond hands forever apes together strong!!",
+            "earnings call tomorrow, watching the margins",
+            "diamond hands forever apes together strong lol",
+            "ok"
+        ]
+        df = pd.DataFrame({'body': texts}, index=range(100, 107))
+        collapser = NearDuplicateCollapser()
+        
+        self.assertEqual(collapser.group(texts).tolist(), [0, 1, 0, 1, 4, 1, 6])
+        
+        unique_df, inverse = collapser.collapse(df)
+        self.assertEqual(unique_df.index.tolist(), [100, 101, 104, 106])
+        self.assertEqual(unique_df['duplicate_count'].tolist(), [2, 3, 1, 1])
+        
+        scores = self.scorer.process_batch(unique_df['body'].tolist())
+        expanded = collapser.expand(scores, inverse, df.index)
+        self.assertEqual(expanded.index.tolist(), df.index.tolist())
+        self.assertEqual(expanded['seriousness_threshold'].tolist(), scores['seriousness_threshold'].iloc[inverse].tolist())
+        
+    def test_incremental_clustering_warm_starts_with_stable_ids(self):
+        rng = np.random.default_rng(3)
+        centers = np.array([[0.0, 0.0], [5.0, 5.0], [0.0, 5.0]])
+        points = np.vstack([center + rng.normal(0, 0.3, (300, 2)) for center in centers])[rng.permutation(900)]
+        first, second = points[:600], points[600:]
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            state_path = os.path.join(tmp, 'cluster_state.npz')
+            first_labels = VectorClusterer().perform_clustering(pd.DataFrame(index=range(600)), n_clusters=3, feature_matrix=first,
+                                                               incremental=True, state_path=state_path)['cluster'].to_numpy()
+            
+            clusterer = VectorClusterer()
+            second_labels = clusterer.update_clusters(second, n_clusters=3, state_path=state_path)
+            model = OnlineKMeans.load(state_path)
+        
+        self.assertEqual(model.counts.sum(), 900)
+        np.testing.assert_array_equal(model.predict(first), first_labels)
+        for center in centers:
+            nearest = model.predict(center[None, :])[0]
+            self.assertLess(np.linalg.norm(model.centroids[nearest] - center), 0.1)
+            self.assertEqual(len(set(second_labels[np.linalg.norm(second - center, axis=1) < 1.0])), 1)
 
 if __name__ == '__main__':
     unittest.main()